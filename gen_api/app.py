@@ -7,8 +7,15 @@ configurations, and error handlers.
 
 import os
 import logging
-from flask import Flask, jsonify
+import threading
+from flask import Flask, Response, jsonify
 from controllers.media_controller import media_blueprint
+from controllers.jobs_controller import jobs_blueprint
+from services.job_service import JobManager
+from services.audio_service import preload_background_sounds
+from services.model_manager import get_model_manager
+from services.image_service import warm_prompt_embeddings
+from helpers.metrics import render_metrics
 import dotenv
 
 # Load environment variables
@@ -33,6 +40,10 @@ def create_app(config=None):
         'TESTING': os.environ.get('FLASK_TESTING', 'False') == 'True',
         'SECRET_KEY': os.environ.get('SECRET_KEY', 'dev-key-for-development-only'),
         'UPLOAD_FOLDER': os.environ.get('UPLOAD_FOLDER', 'uploads'),
+        'RENDER_WORKERS': int(os.environ.get('RENDER_WORKERS', 2)),
+        'JOB_HISTORY': int(os.environ.get('JOB_HISTORY', 100)),
+        'PRELOAD_BACKGROUND_SOUNDS': os.environ.get('PRELOAD_BACKGROUND_SOUNDS', 'False') == 'True',
+        'PRELOAD_DIFFUSION_MODEL': os.environ.get('PRELOAD_DIFFUSION_MODEL', 'False') == 'True',
     })
     
     # Override with custom config if provided
@@ -48,8 +59,25 @@ def create_app(config=None):
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
     
+    # Background render jobs, stored under the upload folder
+    app.extensions['jobs'] = JobManager(
+        app,
+        root=os.path.join(app.config['UPLOAD_FOLDER'], 'jobs'),
+        workers=app.config['RENDER_WORKERS'],
+        history=app.config['JOB_HISTORY'],
+    )
+    
+    # Decode the background sound library without delaying startup
+    if app.config['PRELOAD_BACKGROUND_SOUNDS'] and not app.config['TESTING']:
+        threading.Thread(target=preload_background_sounds, name='preload-sounds', daemon=True).start()
+    
+    # Load the diffusion model in the background, /ready reports when it is done
+    if app.config['PRELOAD_DIFFUSION_MODEL'] and not app.config['TESTING']:
+        get_model_manager().preload(warm=warm_prompt_embeddings)
+    
     # Register blueprints
     app.register_blueprint(media_blueprint)
+    app.register_blueprint(jobs_blueprint)
     
     # Basic route
     @app.route('/', methods=['GET'])
@@ -57,6 +85,22 @@ def create_app(config=None):
         """Root endpoint to verify the API is running."""
         return "API Media"
     
+    @app.route('/ready', methods=['GET'])
+    def ready():
+        """
+        Readiness probe. With PRELOAD_DIFFUSION_MODEL the service is ready once
+        the model has been loaded; later idle unloads do not make it unready.
+        """
+        manager = get_model_manager()
+        status = manager.status()
+        is_ready = not app.config['PRELOAD_DIFFUSION_MODEL'] or status['loads'] > 0
+        return jsonify({'ready': is_ready, 'model': status}), 200 if is_ready else 503
+    
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Per-stage latency, output size and cache histograms in the Prometheus text format."""
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+    
     # Register error handlers
     register_error_handlers(app)
     
@@ -91,7 +135,7 @@ def register_error_handlers(app):
 app = create_app()
 
 if __name__ == '__main__':
-    # Use threaded=False for better compatibility with some dependencies
+    # Requests render in their own workspace, API_THREADED=False serves them one at a time
     app.run(port=int(os.environ.get('API_PORT', 3333)), 
             debug=app.config['DEBUG'], 
-            threaded=False)
\ No newline at end of file
+            threaded=os.environ.get('API_THREADED', 'True') == 'True')
\ No newline at end of file
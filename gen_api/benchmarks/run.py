@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import shutil
+import time
+import argparse
+import platform
+import statistics
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from helpers.ffmpeg_helpers import get_ffmpeg_binary
+from helpers.workspace import job_workspace
+from services.vignette_service import get_vignette_engine
+from benchmarks.stages import BENCHMARKS
+
+RESULTS_VERSION = 1
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# A stage regresses when its median is this much slower than the baseline
+DEFAULT_TOLERANCE = 0.25
+
+@contextmanager
+def benchmark_environment(root):
+    """
+    Run with private workspaces and without the result caches, so every run
+    does the work. The vignette masks stay cached, as they are in production.
+    """
+    overrides = {
+        'WORKSPACE_ROOT': os.path.join(root, 'workspaces'),
+        'TTS_CACHE_ENABLED': 'False',
+        'IMAGE_CACHE_ENABLED': 'False',
+        'ALIGNMENT_CACHE_ENABLED': 'False',
+    }
+    previous = {name: os.environ.get(name) for name in overrides}
+    os.environ.update(overrides)
+    # The engine is built at import, VIGNETTE_CACHE_SIZE=0 would come too late
+    engine = get_vignette_engine()
+    max_results = engine.max_results
+    engine.max_results = 0
+    engine.clear()
+    try:
+        yield
+    finally:
+        engine.max_results = max_results
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def machine_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+def time_benchmark(bench, repeat=None, warmup=1):
+    """
+    Time one stage in its own workspace.
+
+    Returns:
+        dict: Timings in seconds over `repeat` runs, after `warmup` untimed runs
+    """
+    with job_workspace(prefix=f"bench-{bench.name}-") as workspace:
+        run = bench.setup(workspace.directory)
+        try:
+            for _ in range(warmup):
+                run()
+            timings = []
+            for _ in range(repeat or bench.repeat):
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+        finally:
+            cleanup = getattr(run, 'cleanup', None)
+            if cleanup:
+                cleanup()
+    return {
+        'runs': len(timings),
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'max': max(timings),
+    }
+
+def run_benchmarks(names=None, repeat=None, warmup=1):
+    """
+    Run the selected stages (all by default).
+
+    Returns:
+        dict: Results document with the machine description and the timings per stage
+    """
+    unknown = set(names or []) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    has_ffmpeg = shutil.which(get_ffmpeg_binary()) is not None
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="story-gen-bench-") as root, benchmark_environment(root):
+        for name, bench in BENCHMARKS.items():
+            if names and name not in names:
+                continue
+            if bench.requires_ffmpeg and not has_ffmpeg:
+                results[name] = {'skipped': 'ffmpeg is not installed'}
+                continue
+            results[name] = time_benchmark(bench, repeat, warmup)
+    return {
+        'version': RESULTS_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'machine': machine_info(),
+        'benchmarks': results,
+    }
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Stages whose median is more than `tolerance` slower than in `baseline`.
+
+    Stages skipped or missing on either side are not compared.
+
+    Returns:
+        list: {"name", "baseline", "current", "ratio"} entries
+    """
+    regressions = []
+    for name, current in results['benchmarks'].items():
+        reference = baseline.get('benchmarks', {}).get(name)
+        if 'median' not in current or not reference or 'median' not in reference:
+            continue
+        ratio = current['median'] / reference['median'] if reference['median'] else float('inf')
+        if ratio > 1 + tolerance:
+            regressions.append({'name': name, 'baseline': reference['median'], 'current': current['median'], 'ratio': ratio})
+    return regressions
+
+def load_results(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_results(path, results):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix=".json", dir=directory)
+    with os.fdopen(fd, "w") as f:
+        json.dump(results, f, indent=2)
+    os.replace(temp_path, path)
+
+def format_report(results, baseline=None):
+    lines = [f"{'stage':<16}{'median':>10}{'min':>10}{'baseline':>10}{'change':>9}"]
+    for name, timing in results['benchmarks'].items():
+        if 'skipped' in timing:
+            lines.append(f"{name:<16}  skipped: {timing['skipped']}")
+            continue
+        reference = (baseline or {}).get('benchmarks', {}).get(name) or {}
+        line = f"{name:<16}{timing['median']:>9.3f}s{timing['min']:>9.3f}s"
+        if 'median' in reference:
+            line += f"{reference['median']:>9.3f}s{(timing['median'] / reference['median'] - 1) * 100:>+8.1f}%"
+        lines.append(line)
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the gen_api pipeline stages on synthetic inputs.")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help=f"Stages to run: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, help="Timed runs per stage (default: per stage)")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs before timing")
+    parser.add_argument("--output", help="Write the results JSON to this path")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown, 0.25 for 25%%")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only, args.repeat, args.warmup)
+    if args.output:
+        save_results(args.output, results)
+
+    baseline = load_results(args.baseline) if os.path.exists(args.baseline) else None
+    print(format_report(results, baseline))
+
+    if args.save_baseline:
+        if baseline:
+            # Keep the stages that were not run or were skipped this time
+            timed = {name: timing for name, timing in results['benchmarks'].items() if 'median' in timing}
+            results = dict(results, benchmarks=dict(baseline.get('benchmarks', {}), **timed))
+        save_results(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to record one")
+        return 0
+    if baseline.get('machine') != results['machine']:
+        print("Warning: the baseline was recorded on a different machine")
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression['name']}: {regression['baseline']:.3f}s -> {regression['current']:.3f}s "
+              f"({(regression['ratio'] - 1) * 100:+.1f}%)")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
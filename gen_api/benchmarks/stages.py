@@ -0,0 +1,146 @@
+import os
+import asyncio
+from io import BytesIO
+from types import SimpleNamespace
+from unittest.mock import patch
+import cv2
+import numpy as np
+from PIL import Image
+from pedalboard.io import AudioFile
+from werkzeug.datastructures import FileStorage, MultiDict
+from moviepy.editor import ColorClip
+from helpers import audio_mix
+from helpers.audio_helpers import apply_equalization
+from helpers.encoding_profiles import get_encoding_profile
+from helpers.tts_stand_in import StandInTtsServer
+from services import image_service, tts_client
+from services.audio_service import loop_audio, sanitize_audio_file, narration_to_speech_async
+from services.image_service import apply_vignette, generate_thumbnail
+from services.video_service import render_chapter_with_still_body
+
+# Every input is generated from this seed, so runs are comparable
+SEED = 1234
+
+BENCHMARKS = {}
+
+class Benchmark:
+    """
+    A pipeline stage to time.
+
+    `setup(workdir)` builds the inputs in `workdir` and returns the function
+    that is timed, so input generation is not part of the measurement.
+    """
+
+    def __init__(self, name, setup, repeat, requires_ffmpeg):
+        self.name = name
+        self.setup = setup
+        self.repeat = repeat
+        self.requires_ffmpeg = requires_ffmpeg
+        self.description = (setup.__doc__ or "").strip()
+
+def benchmark(name, repeat=5, requires_ffmpeg=False):
+    def register(setup):
+        BENCHMARKS[name] = Benchmark(name, setup, repeat, requires_ffmpeg)
+        return setup
+    return register
+
+def synthetic_image(width, height):
+    """Gradient with noise, so the encoders and filters see texture."""
+    rng = np.random.default_rng(SEED)
+    gradient = np.linspace(0, 200, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    noise = rng.normal(0, 20, (height, width, 3)).astype(np.float32)
+    return np.clip(gradient + noise, 0, 255).astype(np.uint8)
+
+def synthetic_voice(seconds, samplerate, channels=2):
+    """Noise bursts under a syllable-rate envelope, shaped (channels, frames)."""
+    rng = np.random.default_rng(SEED)
+    t = np.arange(int(seconds * samplerate)) / samplerate
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+    voice = (0.2 * envelope * rng.standard_normal(len(t))).astype(np.float32)
+    return np.repeat(voice[np.newaxis, :], channels, axis=0)
+
+def write_wav(path, audio, samplerate):
+    with AudioFile(path, 'w', samplerate, audio.shape[0]) as f:
+        f.write(audio)
+    return path
+
+@benchmark("vignette")
+def vignette(workdir):
+    """apply_vignette on a 1920x1080 background, with the mask cache warm."""
+    path = os.path.join(workdir, "background.png")
+    cv2.imwrite(path, synthetic_image(1920, 1080))
+    return lambda: apply_vignette(path)
+
+@benchmark("equalization")
+def equalization(workdir):
+    """apply_equalization of a 5 minute 44.1 kHz stereo narration."""
+    path = write_wav(os.path.join(workdir, "narration.wav"), synthetic_voice(300, 44100), 44100)
+    output = os.path.join(workdir, "equalized.wav")
+    return lambda: apply_equalization(path, output)
+
+@benchmark("loop_audio")
+def loop_audio_bed(workdir):
+    """loop_audio of a 20 second background bed to 10 minutes."""
+    bed = synthetic_voice(20, audio_mix.SAMPLE_RATE).T.copy()
+    return lambda: loop_audio(bed, 600)
+
+@benchmark("sanitize_audio", requires_ffmpeg=True)
+def sanitize_audio(workdir):
+    """sanitize_audio_file of a 2 minute 24 kHz mono file to 44.1 kHz stereo PCM."""
+    path = write_wav(os.path.join(workdir, "upload.wav"), synthetic_voice(120, 24000, channels=1), 24000)
+    output = os.path.join(workdir, "sanitized.wav")
+    return lambda: sanitize_audio_file(path, output)
+
+@benchmark("thumbnail")
+def thumbnail(workdir):
+    """generate_thumbnail from a 1920x1080 JPEG upload, with a synthetic wave overlay."""
+    upload = BytesIO()
+    Image.fromarray(synthetic_image(1920, 1080)).save(upload, format="JPEG", quality=90)
+    form = MultiDict({'brand': 'Story Gen', 'title': 'The Old House', 'type': 'Horror'})
+    overlay = os.path.join(workdir, "waves.png")
+    Image.new('RGBA', (800, 200), (255, 0, 0, 160)).save(overlay)
+
+    def run():
+        request = SimpleNamespace(form=form, files={'image': FileStorage(BytesIO(upload.getvalue()), 'background.jpg')})
+        with patch.dict(image_service.AUDIO_IMAGE_PATHS, {'Horror': overlay}):
+            output, error = generate_thumbnail(request)
+        if error:
+            raise RuntimeError(error)
+    return run
+
+@benchmark("chapter_encode", repeat=3, requires_ffmpeg=True)
+def chapter_encode(workdir):
+    """render_chapter_with_still_body of a 3 second intro and a 60 second body, preview profile."""
+    profile, _ = get_encoding_profile("preview")
+    intro_audio = audio_mix.audio_clip(synthetic_voice(3, audio_mix.SAMPLE_RATE).T.copy())
+    body_audio = audio_mix.audio_clip(synthetic_voice(60, audio_mix.SAMPLE_RATE).T.copy())
+    frame = synthetic_image(1920, 1080)
+    output = os.path.join(workdir, "chapter.mp4")
+
+    def run():
+        intro = ColorClip((1920, 1080), (0, 0, 0), duration=3).set_audio(intro_audio)
+        render_chapter_with_still_body(intro, frame, body_audio, output, profile)
+    return run
+
+@benchmark("narration", repeat=3)
+def narration(workdir):
+    """narration_to_speech_async of 600 words against the local stand-in TTS service."""
+    text = " ".join(f"The wind moved through the house number {i}." for i in range(75))
+    output = os.path.join(workdir, "narration.mp3")
+    server = StandInTtsServer(seconds_per_word=0.3).start()
+    client = tts_client.TtsClient(endpoint=server.url)
+
+    def run():
+        previous_client = tts_client._tts_client
+        tts_client._tts_client = client
+        try:
+            asyncio.run(narration_to_speech_async('Horror', text, output))
+        finally:
+            tts_client._tts_client = previous_client
+
+    def cleanup():
+        client.shutdown()
+        server.stop()
+
+    run.cleanup = cleanup
+    return run
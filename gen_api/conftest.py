@@ -20,6 +20,25 @@ def app():
         })
         yield app
 
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    """Point the on-disk caches and job workspaces at a temporary directory for each test."""
+    import services.audio_service as audio_service
+    import services.sound_library as sound_library
+    import services.image_service as image_service
+    import services.alignment_service as alignment_service
+    monkeypatch.setenv('TTS_CACHE_DIR', str(tmp_path / 'cache' / 'tts'))
+    monkeypatch.setenv('SOUND_CACHE_DIR', str(tmp_path / 'cache' / 'sounds'))
+    monkeypatch.setenv('IMAGE_CACHE_DIR', str(tmp_path / 'cache' / 'images'))
+    monkeypatch.setenv('ALIGNMENT_CACHE_DIR', str(tmp_path / 'cache' / 'alignments'))
+    monkeypatch.setenv('WORKSPACE_ROOT', str(tmp_path / 'workspaces'))
+    monkeypatch.setattr(audio_service, '_tts_cache', None)
+    monkeypatch.setattr(sound_library, '_sound_library', None)
+    monkeypatch.setattr(image_service, '_image_cache', None)
+    monkeypatch.setattr(alignment_service, '_alignment_cache', None)
+    monkeypatch.setattr(alignment_service, '_alignment_worker', None)
+    yield
+
 @pytest.fixture
 def client(app):
     """Create test client using the app fixture."""
@@ -100,3 +119,16 @@ def wait_for_stream_response():
             time.sleep(0.1)
         return response
     return _wait
+
+@pytest.fixture
+def wait_for_job():
+    """Helper to poll a render job until it leaves the queued/running states"""
+    def _wait(client, job_id, timeout=5):
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            data = client.get(f'/jobs/{job_id}').get_json()
+            if data['status'] not in ('queued', 'running'):
+                return data
+            time.sleep(0.05)
+        raise AssertionError(f'Job {job_id} did not finish in {timeout}s')
+    return _wait
@@ -0,0 +1,96 @@
+from flask import Blueprint, request, jsonify, current_app, url_for
+from controllers.media_controller import send_file_response
+from services.image_service import generate_thumbnail
+from services.video_service import generate_chapter_video, generate_full_story_video, generate_short
+from services.job_service import RequestSnapshot, JOB_SUCCEEDED, FINISHED_STATES
+from helpers.memory import get_memory_profile_mode
+
+jobs_blueprint = Blueprint('jobs', __name__)
+
+# kind -> (handler, mimetype, required field, default output filename)
+JOB_KINDS = {
+    'chapter': (generate_chapter_video, 'video/mp4', 'chapter', 'output_video.mp4'),
+    'full-story': (generate_full_story_video, 'video/mp4', 'title', 'output_video.mp4'),
+    'short': (generate_short, 'video/mp4', 'text', 'short_video.mp4'),
+    'thumbnail': (generate_thumbnail, 'image/jpeg', 'title', 'thumbnail.jpg'),
+}
+
+def get_job_manager():
+    return current_app.extensions['jobs']
+
+def job_response(job):
+    data = job.to_dict()
+    data['status_url'] = url_for('jobs.get_job_route', job_id=job.id)
+    if job.status == JOB_SUCCEEDED:
+        data['result_url'] = url_for('jobs.get_job_result_route', job_id=job.id)
+    return data
+
+@jobs_blueprint.route('/jobs/<kind>', methods=['POST'])
+def submit_job_route(kind):
+    """
+    Queue a render job and return its id without waiting for the render.
+
+    Takes the same form fields and files as the matching synchronous route
+    (`/generate-chapter`, `/generate-full-story`, `/generate-short`,
+    `/generate-thumbnail`), plus an optional `memory_profile` ("off", "rss"
+    or "tracemalloc", default JOB_MEMORY_PROFILE).
+    """
+    if kind not in JOB_KINDS:
+        return jsonify({'error': f'Unknown job kind: {kind}'}), 404
+
+    handler, mimetype, required_field, default_filename = JOB_KINDS[kind]
+    if required_field not in request.form:
+        return jsonify({'error': 'Missing required fields'}), 400
+    memory_profile, error = get_memory_profile_mode(request.form.get('memory_profile'))
+    if error:
+        return jsonify({'error': error}), 400
+
+    snapshot = RequestSnapshot.from_request(request)
+    filename = request.form.get('filename') or default_filename
+    job = get_job_manager().submit(kind, handler, snapshot, mimetype, filename, memory_profile)
+
+    response = jsonify(job_response(job))
+    response.status_code = 202
+    response.headers['Location'] = url_for('jobs.get_job_route', job_id=job.id)
+    return response
+
+@jobs_blueprint.route('/jobs', methods=['GET'])
+def list_jobs_route():
+    """List the jobs currently known to the service."""
+    return jsonify([job_response(job) for job in get_job_manager().jobs()])
+
+@jobs_blueprint.route('/jobs/stats', methods=['GET'])
+def job_stats_route():
+    """Queue depth and throughput of the render worker pool."""
+    return jsonify(get_job_manager().stats())
+
+@jobs_blueprint.route('/jobs/<job_id>', methods=['GET'])
+def get_job_route(job_id):
+    """Poll the status of a job."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_response(job))
+
+@jobs_blueprint.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job_route(job_id):
+    """Cancel a job that is still waiting for a worker."""
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not manager.cancel(job_id):
+        return jsonify({'error': f'Job is {job.status} and cannot be cancelled'}), 409
+    return jsonify(job_response(job))
+
+@jobs_blueprint.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result_route(job_id):
+    """Download the artifact produced by a finished job."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status not in FINISHED_STATES:
+        return jsonify({'error': 'Job is not finished', 'status': job.status}), 409
+    if job.status != JOB_SUCCEEDED:
+        return jsonify({'error': job.error or f'Job {job.status}', 'status': job.status}), 410
+    return send_file_response(job.result_path, job.mimetype)
@@ -1,10 +1,17 @@
 import asyncio
 import os
 from flask import Blueprint, request, jsonify, send_file
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 from services.tts_service import generate_tts
-from services.image_service import generate_image, generate_thumbnail
+from services.audio_service import get_tts_cache
+from services.alignment_service import get_alignment_cache
+from services.vignette_service import get_vignette_engine
+from services.caption_service import get_caption_renderer
+from services.image_service import generate_image, parse_seed, generate_images, generate_thumbnail, get_image_cache
 from services.video_service import generate_chapter_video, generate_full_story_video, generate_short
+from helpers.workspace import request_workspace
 import json
+import hashlib
 from io import BytesIO
 
 media_blueprint = Blueprint('media', __name__)
@@ -22,20 +29,52 @@ def get_request_data():
         except:
             return None, 'Invalid request data'
 
-def send_file_response(file_obj, mimetype):
-    """Helper function to send file responses"""
+def send_file_response(file_obj, mimetype, download_name=None):
+    """
+    Helper function to send file responses
+
+    Files are streamed in chunks rather than loaded in memory, and answer
+    Range and conditional (If-None-Match, If-Modified-Since) requests
+    whenever their size is known.
+    """
     try:
-        if isinstance(file_obj, str):
-            return send_file(file_obj, mimetype=mimetype, as_attachment=True)
+        # Open files are sent by path so their size and mtime are known
+        path = getattr(file_obj, 'name', None)
+        if not isinstance(file_obj, (str, os.PathLike)) and isinstance(path, str) and os.path.isfile(path):
+            file_obj.close()
+            file_obj = path
+        if isinstance(file_obj, (str, os.PathLike)):
+            return send_file(os.path.abspath(file_obj), mimetype=mimetype, as_attachment=True,
+                             download_name=download_name, conditional=True, etag=True)
+        download_name = download_name or 'download'
         if isinstance(file_obj, BytesIO):
             file_obj.seek(0)
-            return send_file(file_obj, mimetype=mimetype, as_attachment=True)
+            etag = hashlib.sha1(file_obj.getbuffer()).hexdigest()
+            return send_file(file_obj, mimetype=mimetype, as_attachment=True, download_name=download_name,
+                             conditional=True, etag=etag)
         file_obj.seek(0)
-        return send_file(BytesIO(file_obj.read()), mimetype=mimetype, as_attachment=True)
+        return send_file(file_obj, mimetype=mimetype, as_attachment=True, download_name=download_name)
+    except RequestedRangeNotSatisfiable:
+        raise
     except Exception as e:
         return jsonify({'error': f'Failed to send file: {str(e)}'}), 500
 
+@media_blueprint.route('/cache/stats', methods=['GET'])
+def cache_stats_route():
+    """Hit/miss and size statistics of the on-disk caches"""
+    tts_cache = get_tts_cache()
+    image_cache = get_image_cache()
+    alignment_cache = get_alignment_cache()
+    return jsonify({
+        'tts': tts_cache.stats() if tts_cache else None,
+        'images': image_cache.stats() if image_cache else None,
+        'alignments': alignment_cache.stats() if alignment_cache else None,
+        'vignette': get_vignette_engine().stats(),
+        'captions': get_caption_renderer().stats(),
+    })
+
 @media_blueprint.route('/generate-tts', methods=['POST'])
+@request_workspace
 def generate_tts_route():
     """
     Generate text-to-speech audio
@@ -63,6 +102,7 @@ def generate_tts_route():
 
 
 @media_blueprint.route('/generate-image', methods=['POST'])
+@request_workspace
 def generate_image_route():
     """
     Generate an image
@@ -74,6 +114,7 @@ def generate_image_route():
     - type (string): The type of image to generate
     """
     print('Generating image')
+    output_filename = None
     try:
         data, error = get_request_data()
         if error:
@@ -81,6 +122,9 @@ def generate_image_route():
 
         if not data or 'prompt' not in data:
             return jsonify({'error': 'Missing required fields'}), 400
+        _, error = parse_seed(data)
+        if error:
+            return jsonify({'error': error}), 400
             
         output_filename = generate_image(request)
         
@@ -88,10 +132,37 @@ def generate_image_route():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
-        if os.path.exists(output_filename):
+        if output_filename and os.path.exists(output_filename):
             os.remove(output_filename)
 
+@media_blueprint.route('/generate-images', methods=['POST'])
+def generate_images_route():
+    """
+    Generate several images in batched pipeline calls
+    
+    Required body parameters:
+    - items (list): Objects with a prompt and optional width, height, seed,
+      num_inference_steps and filename
+    
+    Optional body parameters:
+    - num_inference_steps (int): Default step count of the items
+    
+    Returns a zip of the images with a manifest.json of the seeds used.
+    """
+    print('Generating images')
+    try:
+        if not request.is_json:
+            return jsonify({'error': 'Invalid JSON request'}), 400
+
+        archive, error = generate_images(request)
+        if error:
+            return jsonify({'error': error}), 400
+        return send_file_response(archive, 'application/zip', 'images.zip')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @media_blueprint.route('/generate-chapter', methods=['POST'])
+@request_workspace
 def generate_chapter_video_route():
     """
     Generate a chapter video
@@ -121,6 +192,7 @@ def generate_chapter_video_route():
         return jsonify({'error': str(e)}), 500
 
 @media_blueprint.route('/generate-full-story', methods=['POST'])
+@request_workspace
 def generate_full_story_video_route():
     """
     Generate a full story video
@@ -169,16 +241,18 @@ def generate_full_story_thumbnail_route():
         if not data or 'title' not in data:
             return jsonify({'error': 'Missing required fields'}), 400
             
-        output_filename, error = generate_thumbnail(request)
+        thumbnail, error = generate_thumbnail(request)
         if error:
             return jsonify({'error': error}), 400
-        if not output_filename:
+        if not thumbnail:
             return jsonify({'error': 'Failed to generate thumbnail'}), 500
-        return send_file_response(output_filename, 'image/jpeg')
+        download_name = os.path.basename(data.get('filename') or 'thumbnail.jpg')
+        return send_file_response(thumbnail, 'image/jpeg', download_name)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @media_blueprint.route('/generate-short', methods=['POST'])
+@request_workspace
 def generate_story_short_route():
     """
     Generate a short-form video
@@ -1,31 +1,113 @@
 from pedalboard import Pedalboard, HighShelfFilter, LowShelfFilter
 from pedalboard.io import AudioFile
+import numpy as np
+import os
+import tempfile
+import threading
 import subprocess
 
-def apply_equalization(input_audio_path, output_audio_path):
+# Bump whenever the equalization chain below changes, so cached audio
+# processed with the previous chain is not reused.
+EQ_CHAIN_VERSION = 1
+
+def build_equalizer():
+    return Pedalboard([
+        LowShelfFilter(gain_db=-23, cutoff_frequency_hz=74),     # To attenuate bass around 74 Hz
+        HighShelfFilter(gain_db=4.6, cutoff_frequency_hz=199),   # To amplify mediums/bass around 199 Hz
+        HighShelfFilter(gain_db=-9.5, cutoff_frequency_hz=890),  # To attenuate mediums around 890 Hz
+        HighShelfFilter(gain_db=0, cutoff_frequency_hz=1200),    # No change for 1200 Hz
+        HighShelfFilter(gain_db=5.4, cutoff_frequency_hz=2780),  # Amplify treble around 2780 Hz
+        HighShelfFilter(gain_db=7, cutoff_frequency_hz=7400),    # Amplify treble around 7400 Hz
+    ])
+
+# Frames equalized per block; filter state is carried from one block to the next
+EQ_BLOCK_FRAMES = 65536
+# Reduce volume to 95% before the filters
+EQ_INPUT_GAIN = 0.95
+
+_equalizers = threading.local()
+
+def get_equalizer():
+    """
+    Equalization board of the calling thread, with its filter state cleared.
+
+    The board is built once per thread and reused for every stream it processes.
+    """
+    board = getattr(_equalizers, "board", None)
+    if board is None:
+        board = _equalizers.board = build_equalizer()
+    board.reset()
+    return board
+
+def equalize_blocks(blocks, samplerate):
+    """
+    Equalize a stream of consecutive blocks, as if they were one buffer.
+
+    Args:
+        blocks (iterable): Audio blocks shaped (channels, frames)
+        samplerate (int): Sample rate of the blocks
+
+    Yields:
+        np.ndarray: Processed blocks, with the same shapes
+    """
+    board = get_equalizer()
+    for block in blocks:
+        yield board.process(block * EQ_INPUT_GAIN, samplerate, reset=False)
+
+def equalize_audio(audio, samplerate, block_frames=EQ_BLOCK_FRAMES):
+    """
+    Apply the voice equalization chain to an in-memory buffer.
+
+    Args:
+        audio (np.ndarray): Audio shaped (channels, frames)
+        samplerate (int): Sample rate of the buffer
+        block_frames (int): Frames processed at a time
+
+    Returns:
+        np.ndarray: Processed float32 audio with the same shape
+    """
+    processed = np.empty(audio.shape, dtype=np.float32)
+    blocks = (audio[:, i:i + block_frames] for i in range(0, audio.shape[1], block_frames))
+    position = 0
+    for block in equalize_blocks(blocks, samplerate):
+        processed[:, position:position + block.shape[1]] = block
+        position += block.shape[1]
+    return processed
+
+def read_blocks(f, block_frames=EQ_BLOCK_FRAMES):
+    """Read an open AudioFile block by block."""
+    while f.tell() < f.frames:
+        yield f.read(block_frames)
+
+def apply_equalization(input_audio_path, output_audio_path, block_frames=EQ_BLOCK_FRAMES):
+    """
+    Equalize an audio file block by block, so memory use does not grow with its length.
+
+    The result is written next to `output_audio_path` and moved over it once
+    complete, which also makes equalizing a file in place safe.
+
+    Returns:
+        bool: Whether the file was equalized; on an error `output_audio_path` is left untouched
+    """
+    directory, name = os.path.split(os.path.abspath(output_audio_path))
+    temp_path = None
     try:
         with AudioFile(input_audio_path) as f:
-            audio = f.read(f.frames)
             samplerate = f.samplerate
-        
-        # Reduce volume to 95%
-        audio *= 0.95
-
-        board = Pedalboard([
-            LowShelfFilter(gain_db=-23, cutoff_frequency_hz=74),     # To attenuate bass around 74 Hz
-            HighShelfFilter(gain_db=4.6, cutoff_frequency_hz=199),   # To amplify mediums/bass around 199 Hz
-            HighShelfFilter(gain_db=-9.5, cutoff_frequency_hz=890),  # To attenuate mediums around 890 Hz
-            HighShelfFilter(gain_db=0, cutoff_frequency_hz=1200),    # No change for 1200 Hz
-            HighShelfFilter(gain_db=5.4, cutoff_frequency_hz=2780),  # Amplify treble around 2780 Hz
-            HighShelfFilter(gain_db=7, cutoff_frequency_hz=7400),    # Amplify treble around 7400 Hz
-        ])
-
-        processed_audio = board(audio, samplerate)
-        
-        with AudioFile(output_audio_path, 'w', samplerate, processed_audio.shape[0]) as f:
-            f.write(processed_audio)
+            fd, temp_path = tempfile.mkstemp(prefix=".eq-", suffix=os.path.splitext(name)[1], dir=directory)
+            os.close(fd)
+            with AudioFile(temp_path, 'w', samplerate, f.num_channels) as out:
+                for block in equalize_blocks(read_blocks(f, block_frames), samplerate):
+                    out.write(block)
+        os.replace(temp_path, output_audio_path)
+        temp_path = None
+        return True
     except Exception as e:
         print(f"Error applying equalization: {e}")
+        return False
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
 
 def slow_audio(input_audio_path, output_audio_path):
     # Run soundstretch synchronously to ensure it completes before continuing
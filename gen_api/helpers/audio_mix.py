@@ -0,0 +1,113 @@
+import numpy as np
+from pedalboard.io import AudioFile
+from moviepy.audio.AudioClip import AudioArrayClip
+
+# Soundtracks are mixed as float32 arrays shaped (frames, channels), the
+# layout of moviepy's AudioArrayClip, at the rate moviepy encodes with
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+def frame_count(seconds, samplerate=SAMPLE_RATE):
+    return int(round(seconds * samplerate))
+
+def duration(audio, samplerate=SAMPLE_RATE):
+    return len(audio) / samplerate
+
+def silence(seconds, samplerate=SAMPLE_RATE):
+    return np.zeros((frame_count(seconds, samplerate), CHANNELS), dtype=np.float32)
+
+def buffer(frames):
+    """Silent (frames, CHANNELS) buffer to mix into in place."""
+    return np.zeros((frames, CHANNELS), dtype=np.float32)
+
+def to_float_pcm(audio):
+    """float32 copy of a (frames, channels) int16 or float array, with CHANNELS channels."""
+    if audio.dtype == np.int16:
+        audio = audio.astype(np.float32) / 32768.0
+    else:
+        audio = audio.astype(np.float32)
+    if audio.shape[1] != CHANNELS:
+        audio = np.repeat(audio[:, :1], CHANNELS, axis=1)
+    return audio
+
+def load_pcm(path, samplerate=SAMPLE_RATE):
+    """Decode an audio file to float32 (frames, CHANNELS) at `samplerate`."""
+    with AudioFile(path).resampled_to(samplerate) as f:
+        audio = f.read(f.frames)
+    return to_float_pcm(audio.T)
+
+def loop(audio, frames, out=None):
+    """Repeat `audio` until it is `frames` long, into `out` when given."""
+    if out is None:
+        out = np.zeros((frames, audio.shape[1]), dtype=np.float32)
+    if len(audio) == 0:
+        out[:] = 0
+        return out
+    for start in range(0, frames, len(audio)):
+        end = min(frames, start + len(audio))
+        out[start:end] = audio[:end - start]
+    return out
+
+def fade_in(audio, seconds, samplerate=SAMPLE_RATE):
+    """Linear fade from silence over the first `seconds`, like afx.audio_fadein. Applied in place."""
+    frames = min(len(audio), int(np.ceil(seconds * samplerate)))
+    audio[:frames] *= (np.arange(frames) / (seconds * samplerate)).astype(np.float32)[:, np.newaxis]
+    return audio
+
+def fade_out(audio, seconds, samplerate=SAMPLE_RATE):
+    """Linear fade to silence over the last `seconds`, like afx.audio_fadeout. Applied in place."""
+    frames = min(len(audio), int(np.ceil(seconds * samplerate)))
+    if frames:
+        audio[-frames:] *= (np.arange(frames, 0, -1) / (seconds * samplerate)).astype(np.float32)[:, np.newaxis]
+    return audio
+
+def concat(*parts):
+    return np.concatenate(parts).astype(np.float32, copy=False)
+
+def mix(tracks, frames=None, samplerate=SAMPLE_RATE):
+    """
+    Sum tracks placed on a timeline, like CompositeAudioClip.
+
+    Args:
+        tracks (list): (audio, start in seconds) pairs
+        frames (int): Length of the result, the end of the last track when None
+
+    Returns:
+        np.ndarray: Mixed float32 audio; samples are not clipped
+    """
+    if frames is None:
+        frames = max(frame_count(start, samplerate) + len(audio) for audio, start in tracks)
+    return mix_into(buffer(frames), tracks, samplerate)
+
+def mix_into(result, tracks, samplerate=SAMPLE_RATE):
+    """Add tracks placed on a timeline to the `result` buffer, cut at its end."""
+    for audio, start in tracks:
+        start = frame_count(start, samplerate)
+        end = min(len(result), start + len(audio))
+        if end > start:
+            result[start:end] += audio[:end - start]
+    return result
+
+def fit(audio, frames):
+    """Trim or pad `audio` with silence to `frames`."""
+    if len(audio) >= frames:
+        return audio[:frames]
+    return concat(audio, np.zeros((frames - len(audio), audio.shape[1]), dtype=np.float32))
+
+def audio_clip(audio, samplerate=SAMPLE_RATE):
+    """moviepy clip playing a mixed buffer."""
+    return AudioArrayClip(audio, fps=samplerate)
+
+def clip_pcm(clip, samplerate=SAMPLE_RATE):
+    """Samples of a moviepy audio clip, without re-evaluating or copying mixed buffers."""
+    if isinstance(clip, AudioArrayClip) and clip.fps == samplerate:
+        array = clip.array
+        if array.dtype == np.float32 and array.shape[1] == CHANNELS:
+            return array
+        return to_float_pcm(array)
+    return to_float_pcm(clip.to_soundarray(fps=samplerate, quantize=False))
+
+def write_pcm(path, audio, samplerate=SAMPLE_RATE):
+    """Write a mixed buffer as 16-bit WAV, clipping it to [-1, 1]."""
+    with AudioFile(path, 'w', samplerate, audio.shape[1], bit_depth=16) as f:
+        f.write(np.clip(audio, -1.0, 1.0).T)
@@ -0,0 +1,182 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class DiskCache:
+    """
+    Size-bounded, content-addressed file cache with LRU eviction.
+
+    Each entry is a single file named after its key, with an optional JSON
+    metadata sidecar. Recency is persisted through the file mtime, so the LRU
+    order survives restarts.
+
+    Args:
+        directory (str): Folder holding the cache entries
+        max_bytes (int): Total size above which least recently used entries are evicted
+    """
+
+    META_SUFFIX = '.meta.json'
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (filename, size)
+        self._bytes = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(**parts):
+        """Stable hash of the given keyword arguments."""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _load_index(self):
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(self.META_SUFFIX) or name.startswith('.') or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            key = name.split('.', 1)[0]
+            self._entries[key] = (name, size)
+            self._bytes += size
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def _lookup(self, key):
+        # Called with the lock held: path of the entry, counted as a hit or a miss
+        entry = self._entries.get(key)
+        if entry is None or not os.path.exists(self._path(entry[0])):
+            if entry is not None:
+                self._forget(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        path = self._path(entry[0])
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def get(self, key):
+        """
+        Return the path of the cached file for `key`, or None on a miss.
+
+        The entry can be evicted as soon as this returns: use copy_to() or
+        read() to use its content.
+        """
+        with self._lock:
+            return self._lookup(key)
+
+    def copy_to(self, key, destination):
+        """
+        Copy the cached file for `key` to `destination`, without letting it be evicted meanwhile.
+
+        Returns:
+            dict: The metadata stored with `key` ({} without any), or None on a miss
+        """
+        with self._lock:
+            path = self._lookup(key)
+            if path is None:
+                return None
+            shutil.copyfile(path, destination)
+            return self.get_meta(key) or {}
+
+    def read(self, key):
+        """Return the content of the cached file for `key`, or None on a miss."""
+        with self._lock:
+            path = self._lookup(key)
+            if path is None:
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+
+    def get_meta(self, key):
+        """Return the metadata stored with `key`, or None."""
+        try:
+            with open(self._path(key + self.META_SUFFIX), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, source_path, meta=None):
+        """
+        Copy `source_path` into the cache under `key`.
+
+        Returns:
+            str: Path of the cached copy
+        """
+        suffix = os.path.splitext(source_path)[1]
+        filename = key + suffix
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        os.close(fd)
+        try:
+            shutil.copyfile(source_path, temp_path)
+            if meta is not None:
+                with open(self._path(key + self.META_SUFFIX), 'w') as f:
+                    json.dump(meta, f)
+            os.replace(temp_path, self._path(filename))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        size = os.path.getsize(self._path(filename))
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries[key][1]
+            self._entries[key] = (filename, size)
+            self._entries.move_to_end(key)
+            self._bytes += size
+            self._evict()
+        return self._path(filename)
+
+    def _forget(self, key):
+        filename, size = self._entries.pop(key)
+        self._bytes -= size
+        for path in (self._path(filename), self._path(key + self.META_SUFFIX)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _evict(self):
+        # Always keep the most recent entry, even if it alone exceeds the budget
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._forget(key)
+            self.evictions += 1
+            logger.debug(f"Evicted {key} from {self.directory}")
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._forget(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            }
@@ -0,0 +1,87 @@
+import os
+import uuid
+from helpers.workspace import scratch_path
+
+# height: output height (None keeps the composition size), bitrate or crf: x264 rate control,
+# threads: encoder threads (None uses ENCODE_THREADS, or every core)
+ENCODING_PROFILES = {
+    "final": {"height": None, "fps": 24, "bitrate": "8000k", "crf": None, "preset": "slow", "audio_bitrate": None, "threads": None},
+    "preview": {"height": 360, "fps": 15, "bitrate": "600k", "crf": None, "preset": "ultrafast", "audio_bitrate": "64k", "threads": 2},
+    "archive": {"height": None, "fps": 24, "bitrate": None, "crf": 14, "preset": "veryslow", "audio_bitrate": "320k", "threads": None},
+    # moviepy defaults, which shorts have always been encoded with
+    "short": {"height": None, "fps": 24, "bitrate": None, "crf": None, "preset": "medium", "audio_bitrate": None, "threads": None},
+}
+
+# Move the mp4 index to the front so players can start before the download ends
+MP4_FASTSTART = ["-movflags", "+faststart"]
+
+def get_encoding_profile(name, default="final"):
+    """
+    Look up an encoding profile by name.
+
+    Args:
+        name (str): Profile name, or None/empty for `default`
+        default (str): Profile used when no name is given
+
+    Returns:
+        tuple: (profile dict including its name, error)
+    """
+    name = name or default
+    if name not in ENCODING_PROFILES:
+        return None, f"Invalid profile: {name}"
+    return dict(ENCODING_PROFILES[name], name=name), None
+
+def get_encode_threads(profile):
+    if profile["threads"]:
+        return profile["threads"]
+    return int(os.environ.get("ENCODE_THREADS") or os.cpu_count() or 1)
+
+def scaled_size(width, height, profile):
+    """Output size for a composition of `width` x `height`, kept even for yuv420p."""
+    if not profile["height"] or profile["height"] >= height:
+        return width, height
+    new_height = profile["height"] - profile["height"] % 2
+    new_width = int(round(width * new_height / height / 2)) * 2
+    return new_width, new_height
+
+def scale_clip(clip, profile):
+    """Resize a moviepy clip to the profile resolution."""
+    size = scaled_size(clip.w, clip.h, profile)
+    if size == (clip.w, clip.h):
+        return clip
+    return clip.resize(newsize=size)
+
+def x264_params(profile):
+    """Rate control arguments, shared by moviepy (ffmpeg_params) and direct ffmpeg calls."""
+    return ["-crf", profile["crf"]] if profile["crf"] is not None else []
+
+def write_videofile_args(profile, **overrides):
+    """Keyword arguments for moviepy write_videofile."""
+    args = {
+        "fps": profile["fps"],
+        "codec": "libx264",
+        "bitrate": profile["bitrate"],
+        "preset": profile["preset"],
+        "threads": get_encode_threads(profile),
+        "audio_codec": "aac",
+        "audio_bitrate": profile["audio_bitrate"],
+        "ffmpeg_params": [str(arg) for arg in x264_params(profile)],
+        # moviepy would otherwise put it in the working directory, named after the output
+        "temp_audiofile": scratch_path(f"{uuid.uuid4().hex}.m4a"),
+    }
+    args.update(overrides)
+    args["ffmpeg_params"] = list(args["ffmpeg_params"]) + MP4_FASTSTART
+    return args
+
+def ffmpeg_video_args(profile):
+    """ffmpeg output arguments encoding video like write_videofile does with this profile."""
+    args = ["-c:v", "libx264", "-preset", profile["preset"], "-pix_fmt", "yuv420p", "-threads", get_encode_threads(profile)]
+    if profile["bitrate"]:
+        args += ["-b:v", profile["bitrate"]]
+    return args + x264_params(profile)
+
+def ffmpeg_audio_args(profile):
+    args = ["-c:a", "aac"]
+    if profile["audio_bitrate"]:
+        args += ["-b:a", profile["audio_bitrate"]]
+    return args
@@ -0,0 +1,22 @@
+import os
+import subprocess
+
+def get_ffmpeg_binary():
+    """Path of the ffmpeg executable, overridable with FFMPEG_BINARY like moviepy."""
+    return os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+
+def run_ffmpeg(args):
+    """
+    Run ffmpeg with the given arguments and raise if it fails.
+
+    Args:
+        args (list): Arguments passed after the executable
+
+    Returns:
+        subprocess.CompletedProcess: The finished process
+    """
+    command = [get_ffmpeg_binary(), "-y", "-hide_banner", "-loglevel", "error"] + [str(arg) for arg in args]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+    return result
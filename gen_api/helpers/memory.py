@@ -0,0 +1,260 @@
+import os
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from helpers.metrics import registry, Histogram, observe_stages
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# "off", "rss" (sampled resident set size) or "tracemalloc" (rss plus the Python heap and its top allocators)
+MEMORY_PROFILE_MODES = ("off", "rss", "tracemalloc")
+MB = 1024 * 1024
+
+JOB_PEAK_RSS = registry.register(Histogram(
+    "story_gen_job_peak_rss_bytes", "Peak resident set size of the process while a profiled job ran.", ("kind",),
+    buckets=tuple(gigabytes * 1024 ** 3 for gigabytes in (0.25, 0.5, 1, 2, 4, 8, 16, 32)),
+))
+
+def current_rss():
+    """Resident set size of the process in bytes, or None when it cannot be read."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def process_peak_rss():
+    """Highest resident set size since the process started, in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+_tracing_lock = threading.Lock()
+_tracing_jobs = 0
+
+def start_tracing():
+    """
+    Start tracemalloc for a profile, unless something else traces already.
+
+    Returns:
+        bool: Whether stop_tracing() must be called when the profile ends
+    """
+    global _tracing_jobs
+    with _tracing_lock:
+        if _tracing_jobs == 0 and tracemalloc.is_tracing():
+            return False
+        if _tracing_jobs == 0:
+            tracemalloc.start()
+        _tracing_jobs += 1
+        return True
+
+def stop_tracing():
+    """Stop tracemalloc when the last profiled job using it ends."""
+    global _tracing_jobs
+    with _tracing_lock:
+        _tracing_jobs -= 1
+        if _tracing_jobs == 0:
+            tracemalloc.stop()
+
+def get_memory_profile_mode(mode=None):
+    """
+    Profiling mode of a job: `mode` when given, otherwise JOB_MEMORY_PROFILE.
+
+    Returns:
+        tuple: (mode, error)
+    """
+    mode = mode or os.environ.get("JOB_MEMORY_PROFILE", "off")
+    if mode not in MEMORY_PROFILE_MODES:
+        return None, f"Invalid memory_profile: {mode}"
+    return mode, None
+
+class MemoryProfile:
+    """
+    Memory use of one job, by stage.
+
+    A sampler thread reads the RSS every `interval` seconds and keeps the
+    peak of the job and of every stage open at the time (stages are the
+    metrics spans). With tracemalloc, the Python heap peak of each stage is
+    recorded too, and the top allocators are taken at the end of the stage
+    that held the most traced memory.
+
+    RSS and the traced heap belong to the whole process: with several
+    workers, the figures include the jobs running alongside.
+
+    Args:
+        tracemalloc_enabled (bool): Trace Python allocations (slows the job down)
+        interval (float): Seconds between RSS samples
+        top_allocators (int): Number of allocation sites to report
+    """
+
+    def __init__(self, tracemalloc_enabled=False, interval=0.1, top_allocators=10):
+        self.tracemalloc_enabled = tracemalloc_enabled
+        self.interval = interval
+        self.top_allocators = top_allocators
+        self.start_rss = None
+        self.end_rss = None
+        self.peak_rss = None
+        self.peak_heap = None
+        self.stages = {}
+        self.allocators = []
+        self._allocators_size = -1
+        self._open = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_tracemalloc = False
+
+    def start(self):
+        self.start_rss = self.peak_rss = current_rss()
+        if self.tracemalloc_enabled:
+            self._started_tracemalloc = start_tracing()
+        if self.start_rss is not None:
+            self._thread = threading.Thread(target=self._sample, name="memory-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.end_rss = current_rss()
+        self._record(self.end_rss)
+        if self.tracemalloc_enabled and tracemalloc.is_tracing():
+            self.peak_heap = max(self.peak_heap or 0, tracemalloc.get_traced_memory()[1])
+        if self._started_tracemalloc:
+            stop_tracing()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._record(current_rss())
+
+    def _record(self, rss):
+        if rss is None:
+            return
+        with self._lock:
+            self.peak_rss = max(self.peak_rss or 0, rss)
+            for entry in self._open:
+                entry["peak"] = max(entry["peak"], rss)
+
+    def enter(self, pipeline, stage):
+        rss = current_rss()
+        entry = {"stage": f"{pipeline}.{stage}", "total": stage == "total", "start": rss, "peak": rss or 0}
+        if self.tracemalloc_enabled and tracemalloc.is_tracing():
+            entry["heap_start"] = tracemalloc.get_traced_memory()[0]
+            entry["heap_peak"] = 0
+            tracemalloc.reset_peak()
+        with self._lock:
+            self._open.append(entry)
+        return entry
+
+    def exit(self, entry):
+        rss = current_rss()
+        self._record(rss)
+        with self._lock:
+            self._open.remove(entry)
+        stats = {
+            "peak_rss_bytes": entry["peak"] or None,
+            "rss_delta_bytes": rss - entry["start"] if rss is not None and entry["start"] is not None else None,
+        }
+        if "heap_start" in entry and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # reset_peak() is global: the stages nested in this one saved their peaks in it
+            peak = max(peak, entry["heap_peak"])
+            with self._lock:
+                for parent in self._open:
+                    parent["heap_peak"] = max(parent.get("heap_peak", 0), peak)
+                self.peak_heap = max(self.peak_heap or 0, peak)
+            stats["peak_python_heap_bytes"] = peak
+            stats["python_heap_delta_bytes"] = current - entry["heap_start"]
+            if not entry["total"] and current > self._allocators_size:
+                self._allocators_size = current
+                self.allocators = self.snapshot_allocators(entry["stage"])
+        previous = self.stages.get(entry["stage"])
+        if previous:
+            # A stage run several times in the job (once per chapter...) keeps its highest figures
+            stats = {name: max(value, previous[name]) if None not in (value, previous.get(name)) else value
+                     for name, value in stats.items()}
+        self.stages[entry["stage"]] = stats
+
+    def snapshot_allocators(self, stage):
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        return [
+            {
+                "stage": stage,
+                "location": f"{statistic.traceback[0].filename}:{statistic.traceback[0].lineno}",
+                "size_bytes": statistic.size,
+                "count": statistic.count,
+            }
+            for statistic in snapshot.statistics("lineno")[:self.top_allocators]
+        ]
+
+    def summary(self):
+        summary = {
+            "mode": "tracemalloc" if self.tracemalloc_enabled else "rss",
+            "start_rss_bytes": self.start_rss,
+            "peak_rss_bytes": self.peak_rss,
+            "end_rss_bytes": self.end_rss,
+            "process_peak_rss_bytes": process_peak_rss(),
+            "stages": self.stages,
+        }
+        if self.tracemalloc_enabled:
+            summary["peak_python_heap_bytes"] = self.peak_heap
+            summary["top_allocators"] = self.allocators
+        return summary
+
+@contextmanager
+def memory_profile(mode, label="job"):
+    """
+    Profile the memory of the block, unless `mode` is "off".
+
+    Yields:
+        MemoryProfile: The running profile, or None
+    """
+    if mode == "off":
+        yield None
+        return
+
+    profile = MemoryProfile(
+        tracemalloc_enabled=mode == "tracemalloc",
+        interval=float(os.environ.get("JOB_MEMORY_SAMPLE_INTERVAL", 0.1)),
+        top_allocators=int(os.environ.get("JOB_MEMORY_TOP_ALLOCATORS", 10)),
+    )
+    profile.start()
+    try:
+        with observe_stages(profile):
+            yield profile
+    finally:
+        profile.stop()
+        log_memory_profile(label, profile)
+
+def log_memory_profile(label, profile):
+    def mb(value):
+        return f"{value / MB:.0f} MB" if value is not None else "n/a"
+
+    message = f"{label} memory: peak RSS {mb(profile.peak_rss)} (started at {mb(profile.start_rss)})"
+    if profile.tracemalloc_enabled:
+        message += f", Python heap peak {mb(profile.peak_heap)}"
+    peaks = sorted(
+        ((stats["peak_rss_bytes"], stage) for stage, stats in profile.stages.items() if stats["peak_rss_bytes"] and not stage.endswith(".total")),
+        reverse=True,
+    )
+    if peaks:
+        message += ", highest stage " + ", ".join(f"{stage} {mb(peak)}" for peak, stage in peaks[:3])
+    logger.info(message, extra={"memory": profile.summary()})
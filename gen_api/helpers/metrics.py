@@ -0,0 +1,215 @@
+import os
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+class Counter:
+    """Monotonic counter per label set."""
+
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, list(zip(self.labelnames, key)), value
+
+class Histogram:
+    """Cumulative histogram per label set, with fixed bucket bounds."""
+
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(tuple(str(labels[name]) for name in self.labelnames), ((), 0))
+        return sum(counts)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", labels + [("le", format_value(bound))], cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.register(Histogram(
+    "story_gen_stage_duration_seconds", "Duration of a pipeline stage.", ("pipeline", "stage")))
+STAGE_BYTES = registry.register(Histogram(
+    "story_gen_stage_output_bytes", "Size of the output of a pipeline stage.", ("pipeline", "stage"), BYTES_BUCKETS))
+STAGE_ERRORS = registry.register(Counter(
+    "story_gen_stage_errors_total", "Pipeline stages that failed.", ("pipeline", "stage")))
+CACHE_LOOKUPS = registry.register(Counter(
+    "story_gen_cache_lookups_total", "Cache lookups made by a pipeline.", ("pipeline", "cache", "result")))
+
+_current_pipeline = contextvars.ContextVar("pipeline", default="none")
+_stage_observer = contextvars.ContextVar("stage_observer", default=None)
+
+def current_pipeline():
+    return _current_pipeline.get()
+
+@contextmanager
+def observe_stages(observer):
+    """
+    Report the stages run in this context to `observer`: `observer.enter(pipeline, stage)`
+    when a stage starts, and `observer.exit(token)` with its return value when it ends.
+    """
+    token = _stage_observer.set(observer)
+    try:
+        yield observer
+    finally:
+        _stage_observer.reset(token)
+
+class Span:
+    """Timing of one stage; the output size and cache outcome are optional."""
+
+    def __init__(self, pipeline, stage):
+        self.pipeline = pipeline
+        self.stage = stage
+        self.bytes = None
+        self.cache_hit = None
+        self.duration = None
+
+    def add_bytes(self, count):
+        self.bytes = (self.bytes or 0) + count
+
+    def add_file(self, path):
+        """Count the size of the file at `path`, when it exists."""
+        if path and os.path.exists(path):
+            self.add_bytes(os.path.getsize(path))
+
+    def set_cache_hit(self, hit):
+        self.cache_hit = hit
+        record_cache_lookup(self.stage, hit)
+
+@contextmanager
+def span(stage, pipeline=None):
+    """
+    Time the block as `stage` of the current pipeline and export it.
+
+    An exception counts as a stage error and is raised again.
+    """
+    current = Span(pipeline or current_pipeline(), stage)
+    observer = _stage_observer.get()
+    observed = observer.enter(current.pipeline, stage) if observer else None
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        STAGE_ERRORS.inc(pipeline=current.pipeline, stage=stage)
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        if observer:
+            observer.exit(observed)
+        STAGE_DURATION.observe(current.duration, pipeline=current.pipeline, stage=stage)
+        if current.bytes is not None:
+            STAGE_BYTES.observe(current.bytes, pipeline=current.pipeline, stage=stage)
+        logger.info(f"{current.pipeline}.{stage} took {current.duration:.3f}s", extra={
+            'pipeline': current.pipeline, 'stage': stage, 'duration': current.duration,
+            'bytes': current.bytes, 'cache_hit': current.cache_hit,
+        })
+
+def record_cache_lookup(cache, hit):
+    CACHE_LOOKUPS.inc(pipeline=current_pipeline(), cache=cache, result="hit" if hit else "miss")
+
+def instrumented(name):
+    """
+    Run a service entry point as pipeline `name`: its stages are labelled
+    with it and the whole call is timed as the "total" stage.
+
+    A returned (result, error) pair with an error counts as a failed call.
+    """
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _current_pipeline.set(name)
+            try:
+                with span("total"):
+                    result = func(*args, **kwargs)
+                if isinstance(result, tuple) and len(result) == 2 and result[1]:
+                    STAGE_ERRORS.inc(pipeline=name, stage="total")
+                return result
+            finally:
+                _current_pipeline.reset(token)
+        return wrapper
+    return decorate
+
+def render_metrics():
+    return registry.render()
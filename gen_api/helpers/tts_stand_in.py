@@ -0,0 +1,161 @@
+import io
+import re
+import json
+import html
+import uuid
+import asyncio
+import argparse
+import threading
+from functools import lru_cache
+import numpy as np
+from aiohttp import web, WSMsgType
+from pedalboard.io import AudioFile
+
+# Format edge-tts asks for: audio-24khz-48kbitrate-mono-mp3
+STAND_IN_SAMPLE_RATE = 24000
+TICKS_PER_SECOND = 10_000_000
+
+@lru_cache(maxsize=64)
+def canned_audio(frames):
+    """MP3 of a quiet 220 Hz tone, `frames` samples long."""
+    t = np.arange(frames) / STAND_IN_SAMPLE_RATE
+    tone = (0.1 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    buffer = io.BytesIO()
+    with AudioFile(buffer, 'w', STAND_IN_SAMPLE_RATE, 1, format='mp3', quality='48') as f:
+        f.write(tone.reshape(1, -1))
+    return buffer.getvalue()
+
+def text_message(path, body=""):
+    return f"X-RequestId:{uuid.uuid4().hex}\r\nContent-Type:application/json; charset=utf-8\r\nPath:{path}\r\n\r\n{body}"
+
+def audio_message(data):
+    # Binary frames start with the length of the header block
+    headers = f"X-RequestId:{uuid.uuid4().hex}\r\nContent-Type:audio/mpeg\r\nPath:audio\r\n".encode()
+    return len(headers).to_bytes(2, "big") + headers + data
+
+def ssml_text(message):
+    match = re.search(r"<prosody[^>]*>(.*)</prosody>", message, re.DOTALL)
+    return html.unescape(match.group(1)) if match else ""
+
+class StandInTtsServer:
+    """
+    Local stand-in for the edge-tts service, for tests and benchmarks.
+
+    Speaks the service's WebSocket protocol and answers every request with
+    canned audio, `seconds_per_word` per word of the text, and the matching
+    WordBoundary messages. Point the TTS client at `url` (TTS_ENDPOINT) to
+    run the narration path offline.
+
+    Args:
+        host (str): Interface to listen on
+        port (int): Port to listen on, 0 for any free port
+        seconds_per_word (float): Audio length of each word
+        latency (float): Seconds to wait before answering, like the real service
+        chunk_bytes (int): Size of the audio messages
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, seconds_per_word=0.3, latency=0.0, chunk_bytes=4096):
+        self.host = host
+        self.port = port
+        self.seconds_per_word = seconds_per_word
+        self.latency = latency
+        self.chunk_bytes = chunk_bytes
+        self.requests = 0
+        self.connections = 0
+        self.peak_connections = 0
+        self._loop = None
+        self._thread = None
+        self._runner = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/edge/v1"
+
+    async def handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        self.peak_connections = max(self.peak_connections, self.connections)
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT or "Path:ssml" not in message.data:
+                    continue
+                self.requests += 1
+                await self.respond(ws, ssml_text(message.data))
+                break
+        finally:
+            self.connections -= 1
+            await ws.close()
+        return ws
+
+    async def respond(self, ws, text):
+        words = text.split()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        await ws.send_str(text_message("turn.start", "{}"))
+        ticks_per_word = int(self.seconds_per_word * TICKS_PER_SECOND)
+        for index, word in enumerate(words):
+            metadata = {"Metadata": [{"Type": "WordBoundary", "Data": {
+                "Offset": index * ticks_per_word,
+                "Duration": int(ticks_per_word * 0.8),
+                "text": {"Text": html.escape(word), "Length": len(word), "BoundaryType": "WordBoundary"},
+            }}]}
+            await ws.send_str(text_message("audio.metadata", json.dumps(metadata)))
+        audio = canned_audio(max(1, round(len(words) * self.seconds_per_word * STAND_IN_SAMPLE_RATE)))
+        for start in range(0, len(audio), self.chunk_bytes):
+            await ws.send_bytes(audio_message(audio[start:start + self.chunk_bytes]))
+        await ws.send_str(text_message("turn.end", "{}"))
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_get("/edge/v1", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def start(self):
+        """Serve on a background thread; returns once the port is bound."""
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start())
+            ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="tts-stand-in", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the edge-tts service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seconds-per-word", type=float, default=0.3)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StandInTtsServer(args.host, args.port, args.seconds_per_word, args.latency).start()
+    print(f"Stand-in TTS service listening, set TTS_ENDPOINT={server.url}")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,187 @@
+import os
+import shutil
+import logging
+import tempfile
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from flask import make_response
+
+logger = logging.getLogger(__name__)
+
+# Shared memory filesystem used when WORKSPACE_TMPFS is enabled
+TMPFS_ROOT = "/dev/shm"
+
+class WorkspaceQuotaExceeded(RuntimeError):
+    pass
+
+class WorkspaceClosed(RuntimeError):
+    pass
+
+def get_workspace_root():
+    """
+    Directory holding the job workspaces.
+
+    WORKSPACE_ROOT when set, otherwise a story-gen folder on tmpfs with
+    WORKSPACE_TMPFS=True (when available), or in the system temp directory.
+    """
+    root = os.environ.get("WORKSPACE_ROOT")
+    if root:
+        return root
+    if os.environ.get("WORKSPACE_TMPFS", "False") == "True":
+        if os.path.isdir(TMPFS_ROOT):
+            return os.path.join(TMPFS_ROOT, "story-gen")
+        logger.warning(f"{TMPFS_ROOT} is not available, using the temp directory for workspaces")
+    return os.path.join(tempfile.gettempdir(), "story-gen")
+
+class Workspace:
+    """
+    Private scratch directory of one job or request.
+
+    Intermediate files are created here instead of the working directory so
+    concurrent renders never share a path, and `cleanup` removes everything.
+
+    The quota (0 for none) is checked every time a path is handed out, and
+    by the callers of check_workspace_quota() after their large writes. It
+    cannot interrupt a write in progress: a workspace can exceed it by the
+    size of one encode before the job fails.
+
+    Args:
+        directory (str): Existing directory owned by the workspace
+        quota_bytes (int): Maximum size of the files in the workspace
+    """
+
+    def __init__(self, directory, quota_bytes=0):
+        self.directory = directory
+        self.quota_bytes = quota_bytes
+        self.closed = False
+
+    @classmethod
+    def create(cls, prefix="job-", root=None, quota_bytes=None):
+        """New workspace under `root` (WORKSPACE_ROOT), limited to WORKSPACE_QUOTA_MB by default."""
+        root = root or get_workspace_root()
+        os.makedirs(root, exist_ok=True)
+        if quota_bytes is None:
+            quota_bytes = int(float(os.environ.get("WORKSPACE_QUOTA_MB", 0)) * 1024 * 1024)
+        return cls(tempfile.mkdtemp(prefix=prefix, dir=root), quota_bytes)
+
+    def usage(self):
+        """Size in bytes of the files in the workspace."""
+        total = 0
+        for directory, _, files in os.walk(self.directory):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(directory, name))
+                except OSError:
+                    pass
+        return total
+
+    def check_quota(self):
+        if self.closed:
+            raise WorkspaceClosed(f"Workspace {self.directory} has already been removed")
+        if self.quota_bytes and self.usage() > self.quota_bytes:
+            raise WorkspaceQuotaExceeded(
+                f"Workspace {self.directory} exceeds its quota of {self.quota_bytes // (1024 * 1024)} MB"
+            )
+
+    def path(self, name):
+        """Path of `name` in the workspace."""
+        self.check_quota()
+        return os.path.join(self.directory, os.path.basename(name))
+
+    def temp_path(self, suffix="", prefix="tmp-"):
+        """New, empty file with a unique name in the workspace."""
+        self.check_quota()
+        fd, path = tempfile.mkstemp(suffix=suffix, prefix=prefix, dir=self.directory)
+        os.close(fd)
+        return path
+
+    def mkdtemp(self, prefix="tmp-"):
+        """New subdirectory with a unique name in the workspace."""
+        self.check_quota()
+        return tempfile.mkdtemp(prefix=prefix, dir=self.directory)
+
+    def cleanup(self):
+        self.closed = True
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+_current_workspace = contextvars.ContextVar("workspace", default=None)
+
+def current_workspace():
+    """Workspace of the running job or request, or None."""
+    return _current_workspace.get()
+
+@contextmanager
+def job_workspace(prefix="job-", reuse=False):
+    """
+    Run the block with a new workspace as the current one, and remove it
+    afterwards whatever happens.
+
+    Args:
+        prefix (str): Prefix of the directory name
+        reuse (bool): Keep the current workspace when there is one
+    """
+    workspace = current_workspace()
+    if reuse and workspace is not None:
+        yield workspace
+        return
+
+    workspace = Workspace.create(prefix)
+    token = _current_workspace.set(workspace)
+    try:
+        yield workspace
+    finally:
+        _current_workspace.reset(token)
+        workspace.cleanup()
+
+def with_workspace(func):
+    """Run `func` in the current workspace, or in its own one when called outside a job."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with job_workspace(prefix=f"{func.__name__}-", reuse=True):
+            return func(*args, **kwargs)
+    return wrapper
+
+def request_workspace(view):
+    """
+    Give a Flask view its own workspace.
+
+    send_file opens the file before the view returns, so the response can be
+    streamed from a workspace that has already been removed.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with job_workspace(prefix="request-"):
+            return make_response(view(*args, **kwargs))
+    return wrapper
+
+def scratch_path(name):
+    """
+    Path of the intermediate file `name` in the current workspace.
+
+    Outside of a workspace `name` is returned unchanged, i.e. relative to the
+    working directory. Raises WorkspaceClosed when the current workspace
+    has been removed (e.g. in a thread that outlived its job).
+    """
+    workspace = current_workspace()
+    return workspace.path(name) if workspace else name
+
+def scratch_temp_path(suffix="", prefix="tmp-"):
+    """Unique file in the current workspace, or in the temp directory outside of one."""
+    workspace = current_workspace()
+    if workspace:
+        return workspace.temp_path(suffix, prefix)
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix=prefix)
+    os.close(fd)
+    return path
+
+def scratch_dir(prefix="tmp-"):
+    """Unique directory in the current workspace, or in the temp directory outside of one."""
+    workspace = current_workspace()
+    return workspace.mkdtemp(prefix) if workspace else tempfile.mkdtemp(prefix=prefix)
+
+def check_workspace_quota():
+    """Raise WorkspaceQuotaExceeded when the current workspace is over its quota."""
+    workspace = current_workspace()
+    if workspace:
+        workspace.check_quota()
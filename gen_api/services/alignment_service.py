@@ -0,0 +1,316 @@
+import os
+import re
+import json
+import queue
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import Future
+import numpy as np
+from pedalboard.io import AudioFile
+from helpers.disk_cache import DiskCache
+from helpers.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+ALIGNMENT_SAMPLE_RATE = 16000
+MFA_ACOUSTIC_MODEL = "english_us_arpa"
+MFA_DICTIONARY = "english_us_arpa"
+MFA_BEAM = 200
+MFA_RETRY_BEAM = 800
+
+_alignment_cache = None
+_alignment_cache_lock = threading.Lock()
+
+def get_alignment_cache():
+    """
+    Return the on-disk cache of word alignments, or None when disabled.
+
+    Configured through ALIGNMENT_CACHE_ENABLED, ALIGNMENT_CACHE_DIR and ALIGNMENT_CACHE_MAX_MB.
+    """
+    global _alignment_cache
+    if os.environ.get('ALIGNMENT_CACHE_ENABLED', 'True') != 'True':
+        return None
+    with _alignment_cache_lock:
+        if _alignment_cache is None:
+            _alignment_cache = DiskCache(
+                os.environ.get('ALIGNMENT_CACHE_DIR', 'cache/alignments'),
+                max_bytes=int(os.environ.get('ALIGNMENT_CACHE_MAX_MB', 64)) * 1024 * 1024,
+            )
+    return _alignment_cache
+
+def alignment_cache_key(text, samples, samplerate):
+    return DiskCache.make_key(
+        text=text,
+        audio=hashlib.sha256(np.ascontiguousarray(samples, dtype=np.float32).tobytes()).hexdigest(),
+        samplerate=samplerate,
+        acoustic_model=MFA_ACOUSTIC_MODEL,
+        dictionary=MFA_DICTIONARY,
+    )
+
+def read_alignment_audio(audio_path):
+    """Decode `audio_path` to the mono 16 kHz float32 PCM the aligner works on."""
+    with AudioFile(audio_path).resampled_to(ALIGNMENT_SAMPLE_RATE) as f:
+        audio = f.read(f.frames)
+    return audio.mean(axis=0).astype(np.float32), ALIGNMENT_SAMPLE_RATE
+
+def write_wav(path, samples, samplerate):
+    with AudioFile(path, 'w', samplerate, 1) as f:
+        f.write(samples.reshape(1, -1))
+
+class MfaCommandBackend:
+    """
+    Aligner running `mfa align` on a one-file corpus per job.
+
+    Every call starts MFA and loads its models again; used when the MFA
+    Python package is not importable in this environment.
+    """
+
+    def __init__(self, workdir):
+        self.workdir = workdir
+
+    def align(self, text, samples, samplerate):
+        corpus_dir = tempfile.mkdtemp(prefix="corpus-", dir=self.workdir)
+        output_dir = os.path.join(corpus_dir, "aligned")
+        try:
+            with open(os.path.join(corpus_dir, "input.txt"), "w") as f:
+                f.write(text)
+            write_wav(os.path.join(corpus_dir, "input.wav"), samples, samplerate)
+            command = [
+                "mfa", "align", corpus_dir, MFA_DICTIONARY, MFA_ACOUSTIC_MODEL, output_dir,
+                "--beam", str(MFA_BEAM),
+                "--retry_beam", str(MFA_RETRY_BEAM),
+                "--output_format", "json",
+                "--single_speaker", "true",
+            ]
+            try:
+                subprocess.run(command, check=True)
+            except subprocess.CalledProcessError as e:
+                raise RuntimeError(f"Montreal Forced Aligner failed: {e}")
+
+            aligned_json_path = os.path.join(output_dir, "input.json")
+            if not os.path.exists(aligned_json_path):
+                raise RuntimeError("Alignment file not generated.")
+            with open(aligned_json_path, "r") as f:
+                alignment_data = json.load(f)
+        finally:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+        return [
+            {"start_time": start, "end_time": end, "text": word}
+            for start, end, word in alignment_data["tiers"]["words"]["entries"]
+            if word
+        ]
+
+class MfaOnlineBackend:
+    """
+    Aligner on MFA's in-process utterance API (the one behind `mfa align_one`).
+
+    The acoustic model and the lexicon are loaded once, then each job only
+    computes features and decodes.
+    """
+
+    def __init__(self, workdir):
+        from kalpy.feat.cmvn import CmvnComputer
+        from kalpy.utterance import Segment, Utterance
+        from montreal_forced_aligner.models import AcousticModel, DictionaryModel
+        from montreal_forced_aligner.online.alignment import align_utterance_online
+
+        self.workdir = workdir
+        self._cmvn_computer = CmvnComputer()
+        self._segment = Segment
+        self._utterance = Utterance
+        self._align_utterance = align_utterance_online
+        self.acoustic_model = AcousticModel(AcousticModel.get_pretrained_path(MFA_ACOUSTIC_MODEL))
+        self.lexicon_compiler = self.acoustic_model.lexicon_compiler
+        self.lexicon_compiler.load_pronunciations(DictionaryModel.get_pretrained_path(MFA_DICTIONARY))
+
+    def normalize(self, words):
+        """Transcript of `words` for the decoder: lowercase, with the unknown words as the OOV symbol."""
+        oov = self.lexicon_compiler.oov_word
+        return " ".join(
+            word if self.lexicon_compiler.word_table.find(word) >= 0 else oov
+            for word in (word.lower() for word in words)
+        )
+
+    def align(self, text, samples, samplerate):
+        fd, wav_path = tempfile.mkstemp(suffix=".wav", dir=self.workdir)
+        os.close(fd)
+        try:
+            write_wav(wav_path, samples, samplerate)
+            words = re.findall(r"[\w']+", text)
+            utterance = self._utterance(self._segment(wav_path, 0, len(samples) / samplerate, 0), self.normalize(words))
+            utterance.generate_mfccs(self.acoustic_model.mfcc_computer)
+            utterance.apply_cmvn(self._cmvn_computer.compute_cmvn_from_features([utterance.mfccs]))
+            ctm = self._align_utterance(
+                self.acoustic_model, utterance, self.lexicon_compiler,
+                beam=MFA_BEAM, retry_beam=MFA_RETRY_BEAM,
+            )
+        finally:
+            os.remove(wav_path)
+        intervals = [interval for interval in ctm.word_intervals if interval.label]
+        if len(intervals) != len(words):
+            raise RuntimeError(f"Aligned {len(intervals)} words of {len(words)}")
+        # The labels are the normalized transcript: caption the words as written
+        return [
+            {"start_time": interval.begin, "end_time": interval.end, "text": word}
+            for interval, word in zip(intervals, words)
+        ]
+
+class FallbackBackend:
+    """
+    Aligner using `primary` until it fails once, then the backend built by
+    `fallback(workdir)` for this job and every following one.
+    """
+
+    def __init__(self, primary, fallback, workdir):
+        self.primary = primary
+        self.fallback = fallback
+        self.workdir = workdir
+        self._fallback_backend = None
+
+    def align(self, text, samples, samplerate):
+        if self.primary is not None:
+            try:
+                return self.primary.align(text, samples, samplerate)
+            except Exception as e:
+                logger.warning(f"{type(self.primary).__name__} failed ({e}), switching to {self.fallback.__name__}")
+                self.primary = None
+        if self._fallback_backend is None:
+            self._fallback_backend = self.fallback(self.workdir)
+        return self._fallback_backend.align(text, samples, samplerate)
+
+def load_mfa_backend(workdir):
+    """The in-process MFA aligner, or the command line one when it cannot be loaded or fails."""
+    try:
+        return FallbackBackend(MfaOnlineBackend(workdir), MfaCommandBackend, workdir)
+    except Exception as e:
+        logger.warning(f"In-process MFA aligner unavailable ({e}), running mfa align per job")
+        return MfaCommandBackend(workdir)
+
+class AlignmentWorker:
+    """
+    Long-lived forced-alignment worker.
+
+    Jobs of (text, PCM) are queued to a single thread that loads the aligner
+    once and keeps it for every following job. Results are cached by text
+    and audio hash, so aligning the same voice-over again is a lookup.
+
+    Args:
+        loader (callable): Function (workdir) -> backend with `align(text, samples, samplerate)`
+        cache (DiskCache): Alignment cache, or None
+    """
+
+    def __init__(self, loader=load_mfa_backend, cache=None):
+        self.loader = loader
+        self.cache = cache
+        self.backend = None
+        self.jobs = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                workdir = tempfile.mkdtemp(prefix="alignment-")
+                self._thread = threading.Thread(target=self._run, args=(workdir,), name='alignment-worker', daemon=True)
+                self._thread.start()
+
+    def submit(self, text, samples, samplerate):
+        """Queue an alignment job and return a Future of its word timings."""
+        self.start()
+        future = Future()
+        self._queue.put((future, text, samples, samplerate))
+        return future
+
+    def align(self, text, samples, samplerate, timeout=None):
+        """
+        Word timings of `text` in the mono PCM `samples`, from the cache when
+        the same text and audio were aligned before.
+
+        Returns:
+            list: {"start_time", "end_time", "text"} entries, in seconds
+        """
+        key = alignment_cache_key(text, samples, samplerate)
+        # Read under the cache lock: an entry evicted meanwhile is a miss, and the text is aligned again
+        cached = self.cache.read(key) if self.cache else None
+        if self.cache:
+            record_cache_lookup("alignments", cached is not None)
+        if cached is not None:
+            return json.loads(cached)
+
+        words = self.submit(text, samples, samplerate).result(timeout)
+        if self.cache:
+            fd, path = tempfile.mkstemp(suffix=".json")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(words, f)
+                self.cache.put(key, path)
+            finally:
+                os.remove(path)
+        return words
+
+    def _run(self, workdir):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            future, text, samples, samplerate = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if self.backend is None:
+                    logger.info("Loading the forced aligner")
+                    self.backend = self.loader(workdir)
+                future.set_result(self.backend.align(text, samples, samplerate))
+                self.jobs += 1
+            except Exception as e:
+                logger.error(f"Alignment failed: {e}")
+                future.set_exception(e)
+        self.backend = None
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            if wait:
+                thread.join()
+
+    def stats(self):
+        return {
+            'loaded': self.backend is not None,
+            'backend': type(self.backend).__name__ if self.backend is not None else None,
+            'queued': self._queue.qsize(),
+            'jobs': self.jobs,
+        }
+
+_alignment_worker = None
+_alignment_worker_lock = threading.Lock()
+
+def get_alignment_worker():
+    """Shared alignment worker, started on first use."""
+    global _alignment_worker
+    with _alignment_worker_lock:
+        if _alignment_worker is None:
+            _alignment_worker = AlignmentWorker(cache=get_alignment_cache())
+    return _alignment_worker
+
+def align_audio_file(text, audio_path, global_offset=0.0):
+    """
+    Align `text` with the audio file `audio_path` on the shared worker.
+
+    Returns:
+        list: {"start_time", "end_time", "text"} entries shifted by `global_offset` seconds
+    """
+    samples, samplerate = read_alignment_audio(audio_path)
+    words = get_alignment_worker().align(text, samples, samplerate)
+    return [
+        dict(word, start_time=max(0, word["start_time"] + global_offset), end_time=max(0, word["end_time"] + global_offset))
+        for word in words
+    ]
@@ -1,65 +1,282 @@
-import edge_tts
 import os
-from helpers.audio_helpers import apply_equalization
+import re
+import shutil
+import threading
+from pedalboard.io import AudioFile
+from helpers.audio_helpers import apply_equalization, equalize_blocks, EQ_CHAIN_VERSION
+from helpers.disk_cache import DiskCache
+from helpers.workspace import scratch_path, scratch_dir
+from helpers.metrics import record_cache_lookup
+from helpers.audio_mix import SAMPLE_RATE, frame_count, loop, fade_in, fade_out
+from services.sound_library import get_sound_library
+from services.tts_client import get_tts_client
 import asyncio
-from moviepy.editor import concatenate_audioclips, AudioFileClip, afx
 
-async def text_to_speech_async(type, text, output_file):
-    text = text.replace("-", ".")
-    voice = "en-US-AndrewMultilingualNeural"
+VOICE_RATE = "-10%"
+VOICE_PITCH = "-8Hz"
+# edge-tts reports boundary offsets and durations in 100 ns units
+TTS_TICKS_PER_SECOND = 10_000_000
+
+_tts_cache = None
+_tts_cache_lock = threading.Lock()
+
+def get_tts_cache():
+    """
+    Return the on-disk cache of equalized voice-overs, or None when disabled.
+
+    Configured through TTS_CACHE_ENABLED, TTS_CACHE_DIR and TTS_CACHE_MAX_MB.
+    """
+    global _tts_cache
+    if os.environ.get('TTS_CACHE_ENABLED', 'True') != 'True':
+        return None
+    with _tts_cache_lock:
+        if _tts_cache is None:
+            _tts_cache = DiskCache(
+                os.environ.get('TTS_CACHE_DIR', 'cache/tts'),
+                max_bytes=int(os.environ.get('TTS_CACHE_MAX_MB', 512)) * 1024 * 1024,
+            )
+    return _tts_cache
+
+def get_voice(type):
     if(type == 'Love'):
-        voice = "en-US-MichelleNeural"
-    communicator = edge_tts.Communicate(
-        text, voice=voice,
-        rate="-10%", pitch="-8Hz",
-        connect_timeout=3000,
-        receive_timeout=18000,
+        return "en-US-MichelleNeural"
+    return "en-US-AndrewMultilingualNeural"
+
+def normalize_tts_text(text):
+    """Normalize text the same way for synthesis and cache lookups."""
+    text = text.replace("-", ".")
+    return re.sub(r"\s+", " ", text).strip()
+
+def tts_cache_key(voice, text, output_file):
+    return DiskCache.make_key(
+        voice=voice,
+        rate=VOICE_RATE,
+        pitch=VOICE_PITCH,
+        text=text,
+        eq=EQ_CHAIN_VERSION,
+        format=os.path.splitext(output_file)[1].lower(),
     )
-    await communicator.save(output_file)
 
-    apply_equalization(output_file, output_file)
-    
+def word_timing(boundary):
+    """Caption entry of an edge-tts WordBoundary message."""
+    start_time = boundary["offset"] / TTS_TICKS_PER_SECOND
+    return {
+        "start_time": start_time,
+        "end_time": start_time + boundary["duration"] / TTS_TICKS_PER_SECOND,
+        "text": boundary["text"],
+    }
+
+async def synthesize_raw_async(voice, text, output_file, words=None):
+    """
+    Synthesize text on the shared TTS client, without any post-processing.
+
+    When `words` is a list, the word boundaries streamed with the audio are
+    appended to it as {"start_time", "end_time", "text"}, in seconds. The
+    voice rate is applied by the service, so they match the audio as written.
+    """
+    boundaries = []
+    await get_tts_client().synthesize(voice, text, output_file, rate=VOICE_RATE, pitch=VOICE_PITCH, words=boundaries)
+    if words is not None:
+        words.extend(word_timing(boundary) for boundary in boundaries)
     return output_file
 
-def get_intro_voice_over(type, text):
-    tmp_filename = "intro_voice_over.wav"
-    asyncio.run(text_to_speech_async(type, text, tmp_filename))
-    return tmp_filename
+def cached_voice_over(cache, key, output_file, word_timings):
+    """
+    Copy a cached voice-over to `output_file`.
 
-def get_horror_background_sound_path(key):
-    sound_paths = {
-        "forest_night": "assets/audio/20575__dobroide__20060706nightforest02.wav",
-        "distant_thunderstorm": "assets/audio/53605__arnaud-coutancier__01storm-orage.wav",
-        "abandoned_basement": "assets/audio/73100__lg__water-basement-04.wav",
-        "eerie_background": "assets/audio/277192__thedweebman__eerie-tone-music-background-loop.wav",
-        "ominous_crickets": "assets/audio/519064__angelkunev__deep-forest.wav",
-        "deep_forest": "assets/audio/653983__garuda1982__distant-dog-barking-at-night-forest-lake-in-summer.mp3",
-        "wind_desert": "assets/audio/697217__dhallcomposer__looping-gentle-wind-ambience-on-an-open-desert-plain.wav",
-        "old_house_creaks": "assets/audio/698824__funky_audio__woodfric_floor-boards-creaking-slowly_funky-audio_fass.wav",
-        "cave_ambience": "assets/audio/705429__newlocknew__ambdsgn_creepy-troll-cavedropsrumblebatssticky-wormsmonk-whispers_em.mp3",
-        "eerie_wind": "assets/audio/715231__newlocknew__ambpark_parksummerpoplars-in-the-windjackdawspigeonscrows.wav",
-        "countryside_village_night": "assets/audio/734747__klankbeeld__dripping-village-731-am-220731_0467.wav",
-        "distant_people": "assets/audio/757825__klankbeeld__park-distant-people-1214-am-240929_0921.wav",
-        "music_box": "assets/audio/eerie_background_music.wav",
-    }
+    Returns:
+        tuple: (hit, stored word timings). Entries cached without timings are
+        a miss when `word_timings` is set.
+    """
+    meta = cache.copy_to(key, output_file) if cache else None
+    words = meta.get("words") if meta is not None else None
+    if meta is None or (word_timings and words is None):
+        if cache:
+            record_cache_lookup("tts", False)
+        return False, None
+    record_cache_lookup("tts", True)
+    return True, words
+
+async def text_to_speech_async(type, text, output_file, word_timings=False):
+    """
+    Synthesize and equalize `text`.
+
+    Returns:
+        str: `output_file`, or (output_file, word timings) with `word_timings`
+    """
+    text = normalize_tts_text(text)
+    voice = get_voice(type)
+
+    cache = get_tts_cache()
+    key = tts_cache_key(voice, text, output_file)
+    hit, words = cached_voice_over(cache, key, output_file, word_timings)
+    if not hit:
+        words = []
+        await synthesize_raw_async(voice, text, output_file, words)
+
+        # Equalize off the event loop so concurrent syntheses keep streaming.
+        # The filters keep the length, so the word timings still apply.
+        equalized = await asyncio.to_thread(apply_equalization, output_file, output_file)
+
+        # An unequalized voice-over is used once, but never cached as the equalized one
+        if cache and equalized:
+            cache.put(key, output_file, meta={"words": words})
 
-    return sound_paths.get(key, "assets/audio/277192__thedweebman__eerie-tone-music-background-loop.wav")
+    return (output_file, words) if word_timings else output_file
+
+def split_into_sentences(text, max_chars):
+    """
+    Split text at sentence boundaries into chunks of at most `max_chars`.
+
+    Consecutive sentences are packed together; a single sentence longer than
+    `max_chars` is split further at the last space that fits.
+    """
+    sentences = [s for s in re.split(r'(?<=[.!?…])\s+', text.strip()) if s]
+    chunks = []
+    current = ""
+    for sentence in sentences:
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+async def narration_to_speech_async(type, text, output_file, concurrency=None, max_chars=None, word_timings=False):
+    """
+    Synthesize a long narration as concurrent sentence-aligned chunks.
+
+    The chunks are decoded and concatenated into one buffer before the
+    equalization pass, so the result is a single seamless file. Short texts
+    fall back to text_to_speech_async.
+
+    Args:
+        type (str): Story type, selects the voice
+        text (str): Narration text
+        output_file (str): Path of the equalized output
+        concurrency (int, optional): Maximum simultaneous edge-tts requests (TTS_CONCURRENCY)
+        max_chars (int, optional): Maximum characters per chunk (TTS_CHUNK_CHARS)
+        word_timings (bool): Also return the word timings of the whole narration
+
+    Returns:
+        str: `output_file`, or (output_file, word timings) with `word_timings`
+    """
+    concurrency = concurrency or int(os.environ.get('TTS_CONCURRENCY', 4))
+    max_chars = max_chars or int(os.environ.get('TTS_CHUNK_CHARS', 1200))
+
+    text = normalize_tts_text(text)
+    chunks = split_into_sentences(text, max_chars)
+    if len(chunks) <= 1:
+        return await text_to_speech_async(type, text, output_file, word_timings)
+
+    voice = get_voice(type)
+    cache = get_tts_cache()
+    key = tts_cache_key(voice, text, output_file)
+    hit, words = cached_voice_over(cache, key, output_file, word_timings)
+    if hit:
+        return (output_file, words) if word_timings else output_file
+
+    semaphore = asyncio.Semaphore(concurrency)
+    temp_dir = scratch_dir(prefix="narration-")
+    chunk_words = [[] for _ in chunks]
+
+    async def synthesize_chunk(index, chunk):
+        async with semaphore:
+            return await synthesize_raw_async(voice, chunk, os.path.join(temp_dir, f"chunk_{index:04d}.mp3"), chunk_words[index])
+
+    try:
+        chunk_paths = await asyncio.gather(*(synthesize_chunk(i, chunk) for i, chunk in enumerate(chunks)))
+
+        pieces = []
+        words = []
+        samplerate = None
+        frames = 0
+        for path, timings in zip(chunk_paths, chunk_words):
+            with AudioFile(path) as f:
+                if samplerate is not None and f.samplerate != samplerate:
+                    raise RuntimeError(f"Unexpected sample rate {f.samplerate} in narration chunk")
+                samplerate = f.samplerate
+                pieces.append(f.read(f.frames))
+            # Chunk timings start at zero, shift them to where the chunk lands
+            offset = frames / samplerate
+            words += [dict(word, start_time=word["start_time"] + offset, end_time=word["end_time"] + offset) for word in timings]
+            frames += pieces[-1].shape[1]
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def write_narration():
+        # The chunks go through the equalizer one after the other, with the
+        # filter state carried over, instead of as one concatenated copy
+        with AudioFile(output_file, 'w', samplerate, pieces[0].shape[0]) as f:
+            for block in equalize_blocks(pieces, samplerate):
+                f.write(block)
+
+    await asyncio.to_thread(write_narration)
+
+    if cache:
+        cache.put(key, output_file, meta={"words": words})
+
+    return (output_file, words) if word_timings else output_file
+
+def get_intro_voice_over(type, text, output_file=None, word_timings=False):
+    output_file = output_file or scratch_path("intro_voice_over.wav")
+    return asyncio.run(text_to_speech_async(type, text, output_file, word_timings))
+
+HORROR_BACKGROUND_SOUNDS = {
+    "forest_night": "assets/audio/20575__dobroide__20060706nightforest02.wav",
+    "distant_thunderstorm": "assets/audio/53605__arnaud-coutancier__01storm-orage.wav",
+    "abandoned_basement": "assets/audio/73100__lg__water-basement-04.wav",
+    "eerie_background": "assets/audio/277192__thedweebman__eerie-tone-music-background-loop.wav",
+    "ominous_crickets": "assets/audio/519064__angelkunev__deep-forest.wav",
+    "deep_forest": "assets/audio/653983__garuda1982__distant-dog-barking-at-night-forest-lake-in-summer.mp3",
+    "wind_desert": "assets/audio/697217__dhallcomposer__looping-gentle-wind-ambience-on-an-open-desert-plain.wav",
+    "old_house_creaks": "assets/audio/698824__funky_audio__woodfric_floor-boards-creaking-slowly_funky-audio_fass.wav",
+    "cave_ambience": "assets/audio/705429__newlocknew__ambdsgn_creepy-troll-cavedropsrumblebatssticky-wormsmonk-whispers_em.mp3",
+    "eerie_wind": "assets/audio/715231__newlocknew__ambpark_parksummerpoplars-in-the-windjackdawspigeonscrows.wav",
+    "countryside_village_night": "assets/audio/734747__klankbeeld__dripping-village-731-am-220731_0467.wav",
+    "distant_people": "assets/audio/757825__klankbeeld__park-distant-people-1214-am-240929_0921.wav",
+    "music_box": "assets/audio/eerie_background_music.wav",
+}
+DEFAULT_HORROR_BACKGROUND_SOUND = "assets/audio/277192__thedweebman__eerie-tone-music-background-loop.wav"
+
+LOVE_BACKGROUND_SOUNDS = {
+    "gentle_piano": "assets/audio/soft_piano.mp3",
+    "soft_guitar": "assets/audio/guitar.mp3",
+    "romantic_strings": "assets/audio/string.mp3",
+    "ocean_waves": "assets/audio/174763__timkahn__pacific-ocean.flac",
+    "fireplace_ambiance": "assets/audio/104124__inchadney__fireplace.wav",
+    "rain_on_window": "assets/audio/346642__inspectorj__rain-on-windows-interior-a.wav",
+    "intimate_jazz": "assets/audio/jazz.mp3",
+    "forest_spring": "assets/audio/628624__klankbeeld__forest-edge-spring-nl-1128am-220414_0336.wav",
+    "sunset_ambiance": "assets/audio/584839__klankbeeld__rural-sunset-may-engelen-nl-160531_0891.wav",
+    "peaceful_meadow": "assets/audio/440807__puzzleaudio__meadow.wav",
+}
+DEFAULT_LOVE_BACKGROUND_SOUND = "assets/audio/soft_piano.mp3"
+
+def get_horror_background_sound_path(key):
+    return HORROR_BACKGROUND_SOUNDS.get(key, DEFAULT_HORROR_BACKGROUND_SOUND)
 
 def get_love_background_sound_path(key):
-    sound_paths = {
-        "gentle_piano": "assets/audio/soft_piano.mp3",
-        "soft_guitar": "assets/audio/guitar.mp3",
-        "romantic_strings": "assets/audio/string.mp3",
-        "ocean_waves": "assets/audio/174763__timkahn__pacific-ocean.flac",
-        "fireplace_ambiance": "assets/audio/104124__inchadney__fireplace.wav",
-        "rain_on_window": "assets/audio/346642__inspectorj__rain-on-windows-interior-a.wav",
-        "intimate_jazz": "assets/audio/jazz.mp3",
-        "forest_spring": "assets/audio/628624__klankbeeld__forest-edge-spring-nl-1128am-220414_0336.wav",
-        "sunset_ambiance": "assets/audio/584839__klankbeeld__rural-sunset-may-engelen-nl-160531_0891.wav",
-        "peaceful_meadow": "assets/audio/440807__puzzleaudio__meadow.wav",
-    }
+    return LOVE_BACKGROUND_SOUNDS.get(key, DEFAULT_LOVE_BACKGROUND_SOUND)
+
+def get_background_sound_path(type, key):
+    return get_horror_background_sound_path(key) if type == "Horror" else get_love_background_sound_path(key)
 
-    return sound_paths.get(key, "assets/audio/soft_piano.mp3")
+def preload_background_sounds():
+    """Decode every known background sound into the sound library."""
+    paths = set(HORROR_BACKGROUND_SOUNDS.values()) | set(LOVE_BACKGROUND_SOUNDS.values())
+    paths |= {DEFAULT_HORROR_BACKGROUND_SOUND, DEFAULT_LOVE_BACKGROUND_SOUND}
+    get_sound_library().warm(sorted(paths))
 
 def sanitize_audio_file(input_path, output_path):
     """
@@ -83,16 +300,15 @@ def sanitize_audio_file(input_path, output_path):
         print(f"Error sanitizing audio file: {e}")
         raise
 
-def loop_audio(audio_clip, duration):
-    clips = []
-    current_duration = 0
-    while current_duration < duration:
-        clips.append(audio_clip)
-        current_duration += audio_clip.duration
-    
-    concatenated_clip = concatenate_audioclips(clips).set_duration(duration)
-    # Apply audio fades using afx - the correct function names in MoviePy 1.0.3
-    final_clip = concatenated_clip
-    final_clip = afx.audio_fadein(final_clip, 2)
-    final_clip = afx.audio_fadeout(final_clip, 2)
-    return final_clip
\ No newline at end of file
+def loop_audio(audio, duration, samplerate=SAMPLE_RATE, gain=1.0, out=None):
+    """
+    Loop a (frames, channels) PCM buffer to `duration` seconds at `gain`,
+    fading it in and out over 2 seconds.
+
+    With `out`, the loop is written into that buffer (its length wins over
+    `duration`) instead of a new one.
+    """
+    looped = loop(audio, len(out) if out is not None else frame_count(duration, samplerate), out)
+    if gain != 1.0:
+        looped *= gain
+    return fade_out(fade_in(looped, 2, samplerate), 2, samplerate)
@@ -0,0 +1,199 @@
+import os
+import bisect
+import threading
+from functools import lru_cache
+from collections import OrderedDict
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from moviepy.editor import ImageClip, VideoClip
+from helpers.metrics import record_cache_lookup
+
+# Extra pixels between wrapped lines, as PIL's multiline_text default
+LINE_SPACING = 4
+
+@lru_cache(maxsize=8)
+def load_font(font_path, font_size):
+    return ImageFont.truetype(font_path, font_size)
+
+def wrap_caption(text, font, width, stroke_width=0):
+    """
+    Split `text` into lines that fit `width` pixels, breaking between words.
+    A single word wider than `width` keeps its own line.
+    """
+    if width is None:
+        return [text]
+    lines = []
+    current = ""
+    for word in text.split():
+        candidate = f"{current} {word}" if current else word
+        if current and font.getlength(candidate) + 2 * stroke_width > width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    return lines + [current] if current else lines
+
+class CaptionSprite:
+    """Rasterized caption: RGB pixels and an alpha mask in [0, 1], both read-only."""
+
+    def __init__(self, rgb, alpha):
+        self.rgb = rgb
+        self.alpha = alpha
+
+    @property
+    def size(self):
+        return self.rgb.shape[1], self.rgb.shape[0]
+
+    def clip(self):
+        """moviepy clip of the sprite, with its mask."""
+        return ImageClip(self.rgb).set_mask(ImageClip(self.alpha, ismask=True))
+
+class CaptionRenderer:
+    """
+    Draws captions in-process with PIL and keeps the sprites in an LRU cache.
+
+    Produces the layout of TextClip(method="caption") without an ImageMagick
+    process per caption: lines wrapped to `width`, centered, with a stroke.
+    Sprites are keyed on the text and every drawing parameter, so repeated
+    words of a short are rasterized once.
+
+    Args:
+        max_sprites (int): Number of sprites to keep
+    """
+
+    def __init__(self, max_sprites=256):
+        self.max_sprites = max_sprites
+        self.hits = 0
+        self.misses = 0
+        self._sprites = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, text, font_path, font_size, color="white", stroke_color="black", stroke_width=2, width=None):
+        """
+        Rasterize a caption.
+
+        Args:
+            text (str): Caption text
+            font_path (str): TrueType font file
+            font_size (int): Font size in pixels
+            color (str): Fill color
+            stroke_color (str): Outline color
+            stroke_width (int): Outline width in pixels
+            width (int): Sprite width the text is wrapped and centered in, None to fit the text
+
+        Returns:
+            CaptionSprite: Shared sprite; do not modify its arrays
+        """
+        key = (text, font_path, font_size, color, stroke_color, stroke_width, width)
+        with self._lock:
+            sprite = self._sprites.get(key)
+            if sprite is not None:
+                self._sprites.move_to_end(key)
+                self.hits += 1
+                record_cache_lookup("captions", True)
+                return sprite
+            self.misses += 1
+        record_cache_lookup("captions", False)
+
+        sprite = self._draw(text, load_font(font_path, font_size), color, stroke_color, stroke_width, width)
+
+        with self._lock:
+            self._sprites[key] = sprite
+            while len(self._sprites) > self.max_sprites:
+                self._sprites.popitem(last=False)
+        return sprite
+
+    @staticmethod
+    def _draw(text, font, color, stroke_color, stroke_width, width):
+        lines = wrap_caption(text, font, width, stroke_width) or [""]
+        ascent, descent = font.getmetrics()
+        line_height = ascent + descent + LINE_SPACING
+        text_width = max(int(np.ceil(font.getlength(line))) for line in lines) + 2 * stroke_width
+        canvas_width = width or text_width
+        canvas_height = line_height * len(lines) - LINE_SPACING + 2 * stroke_width
+
+        image = Image.new("RGBA", (canvas_width, canvas_height), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+        for index, line in enumerate(lines):
+            draw.text(
+                (canvas_width / 2, stroke_width + index * line_height), line,
+                font=font, fill=color, anchor="ma",
+                stroke_width=stroke_width, stroke_fill=stroke_color,
+            )
+
+        pixels = np.asarray(image)
+        rgb = np.ascontiguousarray(pixels[:, :, :3])
+        alpha = pixels[:, :, 3].astype(np.float32) / 255.0
+        rgb.setflags(write=False)
+        alpha.setflags(write=False)
+        return CaptionSprite(rgb, alpha)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._sprites), 'hits': self.hits, 'misses': self.misses}
+
+class CaptionTrack(VideoClip):
+    """
+    Captions over a still background, as one clip.
+
+    Replaces CompositeVideoClip([background] + caption clips), which visits
+    every caption on every frame. Captions are sorted by start time, with a
+    running maximum of the end times, so a frame finds its active captions
+    with a binary search and only walks back while an earlier caption can
+    still be showing. They are alpha-blended onto the background centered,
+    with premultiplied sprites computed once per distinct sprite.
+
+    Args:
+        background (np.ndarray): RGB uint8 frame, shaped (height, width, 3)
+        captions (iterable): (start_time, end_time, CaptionSprite) entries
+        duration (float): Clip duration in seconds
+    """
+
+    def __init__(self, background, captions, duration):
+        self.background = background
+        self.captions = sorted(captions, key=lambda caption: caption[0])
+        self.starts = [caption[0] for caption in self.captions]
+        self.max_ends = list(np.maximum.accumulate([caption[1] for caption in self.captions]))
+        self._layers = {}
+        VideoClip.__init__(self, make_frame=self.render_frame, duration=duration)
+
+    def active(self, t):
+        """Indexes of the captions showing at `t`, in start order."""
+        indexes = []
+        i = bisect.bisect_right(self.starts, t) - 1
+        while i >= 0 and self.max_ends[i] > t:
+            if self.captions[i][1] > t:
+                indexes.append(i)
+            i -= 1
+        return indexes[::-1]
+
+    def _layer(self, sprite):
+        # (top, left, premultiplied color, inverse alpha), cropped to the frame
+        layer = self._layers.get(id(sprite))
+        if layer is None:
+            height, width = self.background.shape[:2]
+            sprite_width, sprite_height = sprite.size
+            top, left = (height - sprite_height) // 2, (width - sprite_width) // 2
+            rows = slice(max(0, -top), min(sprite_height, height - top))
+            columns = slice(max(0, -left), min(sprite_width, width - left))
+            alpha = sprite.alpha[rows, columns, np.newaxis]
+            layer = (max(0, top), max(0, left), sprite.rgb[rows, columns] * alpha, 1.0 - alpha)
+            self._layers[id(sprite)] = layer
+        return layer
+
+    def render_frame(self, t):
+        indexes = self.active(t)
+        if not indexes:
+            return self.background
+        # Only the caption areas are blended, the rest is copied as is
+        frame = self.background.copy()
+        for i in indexes:
+            top, left, color, inverse_alpha = self._layer(self.captions[i][2])
+            region = frame[top:top + color.shape[0], left:left + color.shape[1]]
+            region[:] = region * inverse_alpha + color + 0.5
+        return frame
+
+_caption_renderer = CaptionRenderer(max_sprites=int(os.environ.get('CAPTION_CACHE_SIZE', 256)))
+
+def get_caption_renderer():
+    return _caption_renderer
@@ -1,84 +1,116 @@
 import os
-import tempfile
 import gc
+import json
+import zipfile
+import tempfile
+import threading
+from io import BytesIO
+from contextlib import nullcontext
 from flask import jsonify, send_file, current_app
-from diffusers import DiffusionPipeline, EulerDiscreteScheduler
 import torch
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
-from huggingface_hub import login
+from .vignette_service import apply_vignette_array
+from .model_manager import get_model_manager, empty_device_cache, DIFFUSION_SCHEDULER
+from helpers.disk_cache import DiskCache
+from helpers.workspace import scratch_path
+from helpers.metrics import instrumented, span, record_cache_lookup
 import dotenv
 
 # Load environment variables
 dotenv.load_dotenv()
 
-# Global variables for the diffusion model
-pipe = None
-generator = None
-model_loaded = False
+AUDIO_IMAGE_PATHS = {
+    'Horror': 'assets/images/audio-red.png',
+    'Love': 'assets/images/audio-pink.png',
+}
+
+# Standard negative prompt for better image quality
+NEGATIVE_PROMPT = ("| | Low Quality | | text logos | | watermarks | | signatures | | out of frame | | "
+                   "jpeg artifacts | | ugly | | extra limbs | | extra legs | | partial body | | "
+                   "overlapping bodies | | merged bodies | | extra hands | | extra feet | | "
+                   "backwards limbs | | extra fingers | | extra toes | | bad anatomy | | "
+                   "cut off body pieces | | strange body positions | | impossible body positioning | | "
+                   "Mismatched eyes | | cross eyed | | crooked face | | crooked lips | | unclear | | "
+                   "undefined | | mutations | | deformities | | off center | | poor_composition | | "
+                   "duplicate faces, photo, 3d, plastic, photorealistic, tiny, blurry, blurred, doll")
+
+MAX_BATCH_ITEMS = 64
+# Rough peak device memory per generated pixel with attention and VAE slicing (SDXL, fp32)
+BATCH_BYTES_PER_PIXEL = 1200
+DEFAULT_SEED = 42
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+def get_image_cache():
+    """
+    Return the on-disk cache of generated images, or None when disabled.
+
+    Configured through IMAGE_CACHE_ENABLED, IMAGE_CACHE_DIR and IMAGE_CACHE_MAX_MB.
+    """
+    global _image_cache
+    if os.environ.get('IMAGE_CACHE_ENABLED', 'True') != 'True':
+        return None
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = DiskCache(
+                os.environ.get('IMAGE_CACHE_DIR', 'cache/images'),
+                max_bytes=int(os.environ.get('IMAGE_CACHE_MAX_MB', 1024)) * 1024 * 1024,
+            )
+    return _image_cache
+
+def image_cache_key(model_id, prompt, width, height, num_inference_steps, seed):
+    return DiskCache.make_key(
+        model=model_id,
+        prompt=prompt,
+        negative_prompt=NEGATIVE_PROMPT,
+        width=width,
+        height=height,
+        steps=num_inference_steps,
+        scheduler=DIFFUSION_SCHEDULER,
+        seed=seed,
+        format='png',
+    )
+
+def store_cached_image(cache, key, image, meta):
+    """Add a PIL image to the image cache as a PNG."""
+    fd, temp_path = tempfile.mkstemp(suffix='.png', dir=cache.directory)
+    os.close(fd)
+    try:
+        image.save(temp_path, format='PNG')
+        cache.put(key, temp_path, meta=meta)
+    finally:
+        os.remove(temp_path)
 
 def load_model():
     """
-    Load the diffusion model from Hugging Face with memory optimizations.
+    Load the diffusion model ahead of the first request.
     This function is skipped in testing mode.
     """
-    global pipe, generator, model_loaded
-    
-    # Skip model loading if already loaded or in test mode
-    if model_loaded:
-        print('Model already loaded')
-        return
-        
     if current_app and current_app.config.get('TESTING', False):
         print('Test mode active - skipping model loading')
         return
-    
-    # Get model details from environment variables with defaults
-    model_id = os.environ.get('HF_MODEL_ID', 'SG161222/RealVisXL_V5.0_Lightning')
-    hf_token = os.environ.get('HF_TOKEN', '')
-    
-    print(f"Loading diffusion model: {model_id}")
-    
-    # Log in to Hugging Face if token is provided
-    if hf_token:
-        login(token=hf_token)
-    
+    get_model_manager().load()
+
+def parse_seed(data):
+    """
+    Seed of a /generate-image body, DEFAULT_SEED when it is absent.
+
+    Returns:
+        tuple: (seed, error)
+    """
     try:
-        # Load the model with memory optimizations
-        scheduler = EulerDiscreteScheduler.from_pretrained(model_id, subfolder="scheduler")
-        pipe = DiffusionPipeline.from_pretrained(
-            model_id, 
-            scheduler=scheduler,
-            low_cpu_mem_usage=True,
-        )
-        
-        # Configure the model with memory optimizations
-        pipe.to("mps")
-        pipe.enable_attention_slicing()  # Slice attention into smaller chunks
-        pipe.enable_vae_slicing()  # Slice VAE into smaller chunks
-        pipe.safety_checker = None
-        
-        # Set up the generator for reproducibility
-        generator = torch.Generator(device=pipe.device).manual_seed(42)
-        model_loaded = True
-        print("Model loaded successfully with memory optimizations")
-        
-    except Exception as e:
-        print(f"Error loading model: {str(e)}")
-        # Clean up on error
-        if pipe:
-            del pipe
-        pipe = None
-        model_loaded = False
-        raise
+        return int(data.get('seed', DEFAULT_SEED)), None
+    except (TypeError, ValueError):
+        return None, "Invalid seed"
 
+@instrumented("image")
 def generate_image(request):
     """
     Generate an image using the diffusion model based on the provided prompt.
     """
-    global pipe
-    
     print("Generating image")
     
     data = request.get_json()
@@ -88,7 +120,11 @@ def generate_image(request):
 
     prompt = data.get('prompt')
     width, height = int(data.get('width', 1280)), int(data.get('height', 720))
-    output_filename = data.get('filename', "output_image.png")
+    output_filename = data.get('filename') or scratch_path("output_image.png")
+    # Explicit seed, so identical requests produce identical images
+    seed, error = parse_seed(data)
+    if error:
+        return jsonify({"error": error}), 400
     
     print(f"w: {width}, h: {height}, prompt: {prompt}")
     if not prompt:
@@ -99,7 +135,7 @@ def generate_image(request):
     
     try:
         # Use fewer inference steps in testing mode
-        inference_steps = data.get('num_inference_steps', 15)
+        inference_steps = int(data.get('num_inference_steps', 15))
         if is_test_mode:
             inference_steps = 1
             print('Running in test mode with reduced inference steps')
@@ -114,40 +150,40 @@ def generate_image(request):
             test_image.close()
             return result
         
-        # Load the model if not already loaded - only happens on first call
-        if not model_loaded:
-            load_model()
-        
-        # Standard negative prompt for better image quality
-        negative_prompt = ("| | Low Quality | | text logos | | watermarks | | signatures | | out of frame | | "
-                          "jpeg artifacts | | ugly | | extra limbs | | extra legs | | partial body | | "
-                          "overlapping bodies | | merged bodies | | extra hands | | extra feet | | "
-                          "backwards limbs | | extra fingers | | extra toes | | bad anatomy | | "
-                          "cut off body pieces | | strange body positions | | impossible body positioning | | "
-                          "Mismatched eyes | | cross eyed | | crooked face | | crooked lips | | unclear | | "
-                          "undefined | | mutations | | deformities | | off center | | poor_composition | | "
-                          "duplicate faces, photo, 3d, plastic, photorealistic, tiny, blurry, blurred, doll")
+        # Same parameters as a previous request: no diffusion needed
+        manager = get_model_manager()
+        cache = get_image_cache()
+        key = image_cache_key(manager.model_id, prompt, width, height, inference_steps, seed)
+        hit = cache is not None and cache.copy_to(key, output_filename) is not None
+        if cache:
+            record_cache_lookup("images", hit)
+        if hit:
+            print('Image found in cache')
+            return output_filename
         
-        # Generate the image
+        # Generate the image, loading the model if it is not resident
         print('Generating image')
-        result = pipe(prompt=prompt, 
-                    negative_prompt=negative_prompt,
-                    num_inference_steps=inference_steps, 
-                    width=width, 
-                    height=height,
-                    generator=generator
-                    )
+        # The load, when the model is not resident, is timed by the manager as "model_load"
+        with manager.acquire() as model, model.pipe_lock:
+            with span("inference"):
+                result = model.pipe(**model.prompt_embeddings.pipeline_kwargs([prompt], NEGATIVE_PROMPT),
+                            num_inference_steps=inference_steps, 
+                            width=width, 
+                            height=height,
+                            generator=torch.Generator(device=model.device).manual_seed(seed)
+                            )
         image = result.images[0]
         
         print('Image generated')
-        image.save(output_filename)
+        with span("save") as stage:
+            image.save(output_filename)
+            stage.add_file(output_filename)
         print('Image saved')
+        if cache:
+            cache.put(key, output_filename, meta={'prompt': prompt, 'seed': seed})
 
         # Clear the PyTorch cache after generation
-        if hasattr(torch.mps, 'empty_cache'):
-            torch.mps.empty_cache()
-        
-        gc.collect()  # Run garbage collection
+        empty_device_cache(get_model_manager().device)
         
         # Proper cleanup
         image.close()
@@ -156,11 +192,167 @@ def generate_image(request):
     except Exception as e:
         print(f"Error generating image: {str(e)}")
         # Clear caches even on error
-        if hasattr(torch.mps, 'empty_cache'):
-            torch.mps.empty_cache()
-        gc.collect()
+        empty_device_cache(get_model_manager().device)
         return jsonify({"error": str(e)}), 500
     
+def warm_prompt_embeddings(model):
+    """Encode the negative prompt as soon as a model is loaded."""
+    if model.prompt_embeddings.supported:
+        model.prompt_embeddings.get(NEGATIVE_PROMPT, pin=True)
+
+def get_max_batch_size(device, width, height):
+    """
+    Number of images of `width` x `height` to generate in one pipeline call.
+
+    DIFFUSION_MAX_BATCH sets it explicitly. On CUDA it is derived from the free
+    device memory, elsewhere it defaults to 2.
+    """
+    configured = os.environ.get('DIFFUSION_MAX_BATCH')
+    if configured:
+        return max(1, int(configured))
+    if device.startswith('cuda') and torch.cuda.is_available():
+        free_bytes, _ = torch.cuda.mem_get_info(torch.device(device))
+        return int(max(1, min(8, free_bytes * 0.8 // (width * height * BATCH_BYTES_PER_PIXEL))))
+    return 2
+
+def plan_image_batches(items, max_batch_size):
+    """
+    Group items that can share a pipeline call (same size and steps) into
+    batches of at most `max_batch_size(width, height)` items.
+
+    Returns:
+        list: Lists of item indexes, in request order within each batch
+    """
+    groups = {}
+    for index, item in enumerate(items):
+        groups.setdefault((item['width'], item['height'], item['num_inference_steps']), []).append(index)
+    batches = []
+    for (width, height, _), indexes in groups.items():
+        size = max_batch_size(width, height)
+        batches += [indexes[i:i + size] for i in range(0, len(indexes), size)]
+    return batches
+
+def parse_image_items(data):
+    """
+    Validate the items of a batch image request.
+
+    Returns:
+        tuple: (list of normalized items, error)
+    """
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, "No items provided"
+    if len(items) > MAX_BATCH_ITEMS:
+        return None, f"Too many items (max {MAX_BATCH_ITEMS})"
+
+    default_steps = int(data.get('num_inference_steps', 15))
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('prompt'):
+            return None, f"Item {index} has no prompt"
+        try:
+            seed = item.get('seed')
+            parsed.append({
+                'prompt': item['prompt'],
+                'width': int(item.get('width', 1280)),
+                'height': int(item.get('height', 720)),
+                'num_inference_steps': int(item.get('num_inference_steps', default_steps)),
+                'seed': int(seed) if seed is not None else DEFAULT_SEED,
+                'filename': os.path.basename(item.get('filename') or f"image_{index:03d}.png"),
+            })
+        except (TypeError, ValueError):
+            return None, f"Item {index} has an invalid size, seed or step count"
+    return parsed, None
+
+@instrumented("image_batch")
+def generate_images(request):
+    """
+    Generate several images, batching the prompts that share a size and step count.
+
+    Every item gets its own seeded generator, so an image does not depend on
+    the batch it was generated in. Items without a seed use DEFAULT_SEED,
+    like /generate-image. Items already in the image cache are not
+    generated again, and the model is not loaded if they all are.
+
+    Returns:
+        tuple: (BytesIO zip of the images and a manifest.json, error)
+    """
+    items, error = parse_image_items(request.get_json(silent=True))
+    if error:
+        return None, error
+
+    is_test_mode = current_app.config.get('TESTING', False)
+    images = [None] * len(items)
+    cached = {}
+    try:
+        if is_test_mode:
+            # Return placeholder images for tests
+            for index, item in enumerate(items):
+                image = Image.new('RGB', (item['width'], item['height']), color='gray')
+                ImageDraw.Draw(image).text((item['width'] // 2 - 100, item['height'] // 2), f"Test image - {item['prompt']}", fill='white')
+                images[index] = image
+        else:
+            manager = get_model_manager()
+            cache = get_image_cache()
+            keys = [image_cache_key(manager.model_id, item['prompt'], item['width'], item['height'], item['num_inference_steps'], item['seed']) for item in items]
+            if cache:
+                for index, key in enumerate(keys):
+                    # Read now: storing the generated images may evict these entries
+                    data = cache.read(key)
+                    record_cache_lookup("images", data is not None)
+                    if data is not None:
+                        cached[index] = data
+            missing = [index for index in range(len(items)) if index not in cached]
+            print(f"{len(cached)} images found in cache, {len(missing)} to generate")
+
+            with (manager.acquire() if missing else nullcontext()) as model:
+                batches = plan_image_batches([items[i] for i in missing], lambda width, height: get_max_batch_size(model.device, width, height))
+                for batch in ([missing[i] for i in batch] for batch in batches):
+                    first = items[batch[0]]
+                    print(f"Generating {len(batch)} images at {first['width']}x{first['height']}")
+                    with model.pipe_lock:
+                        result = model.pipe(
+                            **model.prompt_embeddings.pipeline_kwargs([items[i]['prompt'] for i in batch], NEGATIVE_PROMPT),
+                            num_inference_steps=first['num_inference_steps'],
+                            width=first['width'],
+                            height=first['height'],
+                            generator=[torch.Generator(device=model.device).manual_seed(items[i]['seed']) for i in batch],
+                        )
+                    for index, image in zip(batch, result.images):
+                        images[index] = image
+                        if cache:
+                            store_cached_image(cache, keys[index], image, {'prompt': items[index]['prompt'], 'seed': items[index]['seed']})
+                    empty_device_cache(model.device)
+
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            names = set()
+            manifest = []
+            for index, (item, image) in enumerate(zip(items, images)):
+                name = item['filename']
+                if name in names:
+                    name = f"{index:03d}_{name}"
+                names.add(name)
+                if index in cached:
+                    zf.writestr(name, cached[index])
+                else:
+                    buffer = BytesIO()
+                    image.save(buffer, format='PNG')
+                    zf.writestr(name, buffer.getvalue())
+                manifest.append({k: item[k] for k in ('prompt', 'width', 'height', 'num_inference_steps', 'seed')} | {'filename': name})
+            zf.writestr('manifest.json', json.dumps(manifest, indent=2))
+        archive.seek(0)
+        return archive, None
+    except Exception as e:
+        print(f"Error generating images: {str(e)}")
+        empty_device_cache(get_model_manager().device)
+        return None, str(e)
+    finally:
+        for image in images:
+            if image is not None:
+                image.close()
+
+@instrumented("thumbnail")
 def generate_thumbnail(request):
     """
     Generate a thumbnail with overlays and text based on the provided image.
@@ -170,7 +362,7 @@ def generate_thumbnail(request):
     brand = request.form.get('brand')
     title = request.form.get('title')
     story_type = request.form.get('type', 'Horror')
-    filename = request.form.get('filename')
+    filename = request.form.get('filename', 'thumbnail.jpg')
 
     print(f"brand: {brand}, title: {title}, filename: {filename}")
     print(f"image_file: {image_file}")
@@ -180,72 +372,70 @@ def generate_thumbnail(request):
 
     text_color = story_type == 'Horror' and "#FF0000" or "#FF60C2"
     fill_color = story_type == 'Horror' and "black" or "white"
-    audio_image = story_type == 'Horror' and 'assets/images/audio-red.png' or 'assets/images/audio-pink.png'
+    audio_image = AUDIO_IMAGE_PATHS.get(story_type, AUDIO_IMAGE_PATHS['Love'])
 
     if not image_file or not brand or not title:
-        return jsonify({"error": "Missing required parameters"}), 400
+        return None, "Missing required parameters"
 
     image = None
     waves = None
-    temp_image_path = None
-    temp_vignette_path = None
     
     try:
-        # Load the image from the request
-        print("Loading image from request")
-        image = Image.open(image_file)
-        
-        # Apply vignette effect
+        # Decode the upload and apply the vignette without leaving memory
         print("Applying vignette effect")
-        temp_image_path = tempfile.mktemp(suffix=".png")
-        image.save(temp_image_path)
-        temp_vignette_path = apply_vignette(temp_image_path)
-        
-        # Close the first image before opening the new one
-        image.close()
-        image = Image.open(temp_vignette_path)
-
-        # Add waves.png with a light black shadow at the top right corner
-        print("Adding waves image")
-        waves = Image.open(audio_image)
-        waves = waves.resize((400, int(waves.height * (400 / waves.width))))
-        image.paste(waves, (image.width - waves.width - 40, 30), waves)
-        # Close the waves image after pasting
-        waves.close()
-
-        # Add "Audio" text under the waves image
-        print("Adding 'Audio' text")
-        draw = ImageDraw.Draw(image)
-        font_audio = ImageFont.truetype(audio_font_path, 90)
-
-        contour_width = 4
-        for x_offset in range(-contour_width, contour_width + 1):
-            for y_offset in range(-contour_width, contour_width + 1):
-                if x_offset != 0 or y_offset != 0:
-                    draw.text(((image.width - waves.width + 50) + x_offset, (20 + waves.height) + y_offset), "AUDIO", font=font_audio, fill=fill_color)
-        draw.text((image.width - waves.width + 50, 20 + waves.height), "AUDIO", font=font_audio, fill=text_color)
-
-        # Add title text at the bottom left corner
-        print("Adding title text")
-        font_title = ImageFont.truetype(audio_font_path, 150)
-        # Draw the title text with a contour
-        contour_width = 5
-        for x_offset in range(-contour_width, contour_width + 1):
-            for y_offset in range(-contour_width, contour_width + 1):
-                if x_offset != 0 or y_offset != 0:
-                    draw.text((50 + x_offset, image.height-200 + y_offset), title, font=font_title, fill=fill_color)
-        draw.text((50, image.height-200), title, font=font_title, fill=text_color)
+        with span("decode"), Image.open(image_file) as uploaded:
+            pixels = np.asarray(uploaded.convert('RGB'))
+        with span("vignette"):
+            image = Image.fromarray(apply_vignette_array(pixels))
+
+        with span("overlay"):
+            # Add waves.png with a light black shadow at the top right corner
+            print("Adding waves image")
+            waves = Image.open(audio_image)
+            waves = waves.resize((400, int(waves.height * (400 / waves.width))))
+            image.paste(waves, (image.width - waves.width - 40, 30), waves)
+            # Close the waves image after pasting
+            waves.close()
+
+            # Add "Audio" text under the waves image
+            print("Adding 'Audio' text")
+            draw = ImageDraw.Draw(image)
+            font_audio = ImageFont.truetype(audio_font_path, 90)
+
+            contour_width = 4
+            for x_offset in range(-contour_width, contour_width + 1):
+                for y_offset in range(-contour_width, contour_width + 1):
+                    if x_offset != 0 or y_offset != 0:
+                        draw.text(((image.width - waves.width + 50) + x_offset, (20 + waves.height) + y_offset), "AUDIO", font=font_audio, fill=fill_color)
+            draw.text((image.width - waves.width + 50, 20 + waves.height), "AUDIO", font=font_audio, fill=text_color)
+
+            # Add title text at the bottom left corner
+            print("Adding title text")
+            font_title = ImageFont.truetype(audio_font_path, 150)
+            # Draw the title text with a contour
+            contour_width = 5
+            for x_offset in range(-contour_width, contour_width + 1):
+                for y_offset in range(-contour_width, contour_width + 1):
+                    if x_offset != 0 or y_offset != 0:
+                        draw.text((50 + x_offset, image.height-200 + y_offset), title, font=font_title, fill=fill_color)
+            draw.text((50, image.height-200), title, font=font_title, fill=text_color)
 
         # Resize the image to 1280 x 720
         print("Resizing image to 1280x720")
-        image = image.resize((1280, 720))
-        image.save(filename)
-        print('Thumbnail generated and saved')
+        with span("encode") as stage:
+            image = image.resize((1280, 720))
 
-        return filename, None
+            # Encode straight into the response buffer
+            output = BytesIO()
+            image.save(output, format="JPEG")
+            output.seek(0)
+            stage.add_bytes(output.getbuffer().nbytes)
+        print('Thumbnail generated')
+
+        return output, None
     except Exception as e:
         print(f"Error generating thumbnail: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        return None, str(e)
     finally:
         # Clean up PIL Image resources
         if image:
@@ -267,6 +457,8 @@ def apply_vignette(image_path, intensity=0.45, blur_strength=1251):
     """
     Apply a vignette effect to the image at the given path.
     
+    File-based wrapper around services.vignette_service.apply_vignette_array.
+    
     Args:
         image_path: Path to the input image
         intensity: Vignette intensity (0.0-1.0)
@@ -275,45 +467,14 @@ def apply_vignette(image_path, intensity=0.45, blur_strength=1251):
     Returns:
         Path to the processed image with vignette effect
     """
-    # Load the image
-    image = None
-    temp_vignette_path = 'temp_vignette_image.png'
+    temp_vignette_path = scratch_path('vignette_image.png')
     try:
         image = cv2.imread(image_path)
         if image is None:
             raise ValueError(f"Could not load image from {image_path}")
-            
-        rows, cols = image.shape[:2]
-
-        # Create a black mask (the size of the image)
-        mask = np.zeros((rows, cols), dtype=np.uint8)
-
-        # Draw a centered white ellipse
-        center = (cols // 2, rows // 2)
-        axes = (int(cols * intensity), int(rows * intensity))  # Size of the ellipse
-        cv2.ellipse(mask, center, axes, 0, 0, 360, 255, -1)
 
-        # Apply a stronger Gaussian blur to the mask for a more diffuse effect
-        mask = cv2.GaussianBlur(mask, (blur_strength, blur_strength), 0)
-
-        # Apply the blurred mask to each channel (BGR)
-        vignetted = np.copy(image)
-        for i in range(3):
-            vignetted[:, :, i] = vignetted[:, :, i] * (mask / 255)
-        
-        cv2.imwrite(temp_vignette_path, vignetted)
+        cv2.imwrite(temp_vignette_path, apply_vignette_array(image, intensity, blur_strength))
         return temp_vignette_path
     except Exception as e: 
         print(f"Error applying vignette: {str(e)}")
         return None
-    finally:
-        # Explicitly release OpenCV resources
-        if image is not None:
-            del image
-            
-        # Set variables to None to help garbage collection
-        image = None
-        mask = None
-        vignetted = None
-        gc.collect()
-            
\ No newline at end of file
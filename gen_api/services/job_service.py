@@ -0,0 +1,245 @@
+import os
+import time
+import uuid
+import shutil
+import logging
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.datastructures import MultiDict, FileStorage
+from helpers.workspace import job_workspace
+from helpers.memory import memory_profile, JOB_PEAK_RSS
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+
+class RequestSnapshot:
+    """
+    Detached copy of the parts of a Flask request the media services read.
+
+    The services take the request object and read `form`, `files` and
+    `get_json()` from it. Those are only valid while the request is being
+    handled, so the job queue copies them (uploads included) before the
+    response is returned.
+    """
+
+    def __init__(self, form=None, files=None, json=None):
+        self.form = MultiDict(form or {})
+        self.files = MultiDict(files or {})
+        self._json = json
+
+    @classmethod
+    def from_request(cls, request, overrides=None):
+        form = MultiDict(request.form)
+        if overrides:
+            for key, value in overrides.items():
+                form[key] = value
+
+        files = MultiDict()
+        for name, storage in request.files.items(multi=True):
+            files.add(name, FileStorage(
+                stream=BytesIO(storage.read()),
+                filename=storage.filename,
+                name=storage.name,
+                content_type=storage.content_type,
+            ))
+
+        json = request.get_json(silent=True) if request.is_json else None
+        return cls(form, files, json)
+
+    @property
+    def is_json(self):
+        return self._json is not None
+
+    def get_json(self, silent=False):
+        return self._json
+
+
+class Job:
+    """State of a single render job."""
+
+    def __init__(self, kind, workdir, mimetype, memory_profile='off'):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.workdir = workdir
+        self.mimetype = mimetype
+        self.status = JOB_QUEUED
+        self.result_path = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self.memory_profile = memory_profile
+        self.memory = None
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'queue_seconds': _elapsed(self.created_at, self.started_at),
+            'run_seconds': _elapsed(self.started_at, self.finished_at),
+        }
+        if self.memory is not None:
+            data['memory'] = self.memory
+        return data
+
+
+def _elapsed(start, end):
+    if start is None or end is None:
+        return None
+    return round(end - start, 3)
+
+
+class JobManager:
+    """
+    Runs render jobs on a bounded worker pool.
+
+    Jobs are kept in memory. Finished jobs are retained (with their output
+    files) until more than `history` of them exist, oldest first.
+
+    Args:
+        app (Flask): Application whose context the workers run in
+        root (str): Directory under which each job gets its own folder
+        workers (int): Maximum number of jobs rendering at once
+        history (int): Number of finished jobs to retain
+    """
+
+    def __init__(self, app, root, workers=1, history=100):
+        self.app = app
+        self.root = root
+        self.workers = max(1, int(workers))
+        self.history = max(1, int(history))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='render-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._failed = 0
+        self._run_seconds = 0.0
+        self._started_at = time.time()
+        os.makedirs(self.root, exist_ok=True)
+
+    def submit(self, kind, handler, snapshot, mimetype, filename, memory_profile='off'):
+        """
+        Queue `handler(snapshot)` and return the job immediately.
+
+        The output filename in the snapshot is redirected into the job folder
+        so that finished artifacts never overwrite each other. With a
+        `memory_profile` of "rss" or "tracemalloc", the memory peaks of the
+        job are attached to it when it finishes.
+        """
+        job = Job(kind, None, mimetype, memory_profile)
+        job.workdir = os.path.join(self.root, job.id)
+        os.makedirs(job.workdir, exist_ok=True)
+        snapshot.form['filename'] = os.path.join(job.workdir, os.path.basename(filename))
+
+        with self._lock:
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, handler, snapshot)
+        self._prune()
+        logger.info(f"Queued {kind} job {job.id}")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """Cancel a job that has not started yet. Returns True on success."""
+        job = self.get(job_id)
+        if job is None or not job.future.cancel():
+            return False
+        job.status = JOB_CANCELLED
+        job.finished_at = time.time()
+        return True
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+            completed, failed, run_seconds = self._completed, self._failed, self._run_seconds
+        uptime = time.time() - self._started_at
+        return {
+            'workers': self.workers,
+            'queued': sum(1 for job in jobs if job.status == JOB_QUEUED),
+            'running': sum(1 for job in jobs if job.status == JOB_RUNNING),
+            'completed': completed,
+            'failed': failed,
+            'average_run_seconds': round(run_seconds / completed, 3) if completed else None,
+            'jobs_per_hour': round(completed * 3600 / uptime, 3) if uptime > 0 else None,
+        }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job, handler, snapshot):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        logger.info(f"Starting {job.kind} job {job.id}")
+        profile = None
+        status = JOB_FAILED
+        try:
+            # Intermediate files go to a private workspace, removed when the job ends
+            with self.app.app_context(), job_workspace(prefix=f"{job.kind}-{job.id}-"), \
+                    memory_profile(job.memory_profile, f"{job.kind} job {job.id}") as profile:
+                output, error = handler(snapshot)
+            if error:
+                raise RuntimeError(error)
+            if hasattr(output, 'read'):
+                # In-memory artifacts (e.g. thumbnails) are stored in the job folder
+                output = self._save_output(output, snapshot.form['filename'])
+            if not isinstance(output, str) or not os.path.exists(output):
+                raise RuntimeError(f'Failed to generate {job.kind}')
+            job.result_path = output
+            status = JOB_SUCCEEDED
+        except Exception as e:
+            logger.error(f"{job.kind} job {job.id} failed: {e}")
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            if profile is not None:
+                job.memory = profile.summary()
+                if profile.peak_rss is not None:
+                    JOB_PEAK_RSS.observe(profile.peak_rss, kind=job.kind)
+            # Published last, so a finished job always has its memory figures
+            job.status = status
+            with self._lock:
+                if job.status == JOB_SUCCEEDED:
+                    self._completed += 1
+                    self._run_seconds += job.finished_at - job.started_at
+                else:
+                    self._failed += 1
+            self._prune()
+
+    @staticmethod
+    def _save_output(file_obj, path):
+        file_obj.seek(0)
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(file_obj, f)
+        return path
+
+    def _prune(self):
+        with self._lock:
+            finished = [job for job in self._jobs.values() if job.status in FINISHED_STATES]
+            evicted = finished[:max(0, len(finished) - self.history)]
+            for job in evicted:
+                del self._jobs[job.id]
+        for job in evicted:
+            shutil.rmtree(job.workdir, ignore_errors=True)
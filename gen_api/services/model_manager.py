@@ -0,0 +1,256 @@
+import os
+import gc
+import time
+import logging
+import threading
+from contextlib import contextmanager
+import torch
+from diffusers import DiffusionPipeline, EulerDiscreteScheduler
+from huggingface_hub import login
+from .prompt_embeddings import PromptEmbeddingCache
+from helpers.metrics import span
+
+logger = logging.getLogger(__name__)
+
+MODEL_UNLOADED = 'unloaded'
+MODEL_LOADING = 'loading'
+MODEL_READY = 'ready'
+MODEL_FAILED = 'failed'
+
+# Part of the image cache key: changing the scheduler changes the images
+DIFFUSION_SCHEDULER = EulerDiscreteScheduler.__name__
+
+def detect_device(preferred=None):
+    """
+    Torch device for the diffusion pipeline.
+
+    Uses `preferred` or DIFFUSION_DEVICE when set, otherwise the first
+    available of cuda and mps, falling back to cpu.
+    """
+    preferred = preferred or os.environ.get('DIFFUSION_DEVICE')
+    if preferred:
+        return preferred
+    if torch.cuda.is_available():
+        return 'cuda'
+    if hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
+        return 'mps'
+    return 'cpu'
+
+def empty_device_cache(device):
+    """Return cached allocator memory of `device` to the system."""
+    gc.collect()
+    if device.startswith('cuda') and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    elif device == 'mps' and hasattr(torch, 'mps') and hasattr(torch.mps, 'empty_cache'):
+        torch.mps.empty_cache()
+
+def load_diffusion_pipeline(model_id, device):
+    """
+    Load a diffusion pipeline from Hugging Face with memory optimizations.
+
+    Returns:
+        DiffusionPipeline: The pipeline on `device`
+    """
+    # Log in to Hugging Face if token is provided
+    hf_token = os.environ.get('HF_TOKEN', '')
+    if hf_token:
+        login(token=hf_token)
+
+    scheduler = EulerDiscreteScheduler.from_pretrained(model_id, subfolder="scheduler")
+    pipe = DiffusionPipeline.from_pretrained(
+        model_id,
+        scheduler=scheduler,
+        low_cpu_mem_usage=True,
+    )
+    pipe.to(device)
+    pipe.enable_attention_slicing()  # Slice attention into smaller chunks
+    pipe.enable_vae_slicing()  # Slice VAE into smaller chunks
+    pipe.safety_checker = None
+    return pipe
+
+class DiffusionModel:
+    """A loaded pipeline with its device and prompt embeddings."""
+
+    def __init__(self, model_id, device, pipe):
+        self.model_id = model_id
+        self.device = device
+        self.pipe = pipe
+        # Pipelines keep per-call state (scheduler steps), concurrent jobs take turns
+        self.pipe_lock = threading.Lock()
+        self.prompt_embeddings = PromptEmbeddingCache(
+            model_id, pipe, device,
+            max_entries=int(os.environ.get('PROMPT_EMBEDDING_CACHE_SIZE', 64)),
+        )
+
+class ModelManager:
+    """
+    Keeps the diffusion model resident while it is used.
+
+    The model is loaded on first use, or ahead of time with `preload`, and
+    unloaded once nobody has used it for `idle_timeout` seconds. The next
+    `acquire` loads it again, so callers never see the unload.
+
+    Args:
+        model_id (str): Hugging Face model id
+        device (str): Torch device, detected when None
+        idle_timeout (float): Seconds of inactivity before unloading, 0 to keep it loaded
+        loader (callable): Function (model_id, device) -> pipe
+    """
+
+    def __init__(self, model_id, device=None, idle_timeout=0, loader=load_diffusion_pipeline):
+        self.model_id = model_id
+        self.device = device or detect_device()
+        self.idle_timeout = idle_timeout
+        self.loader = loader
+        self.state = MODEL_UNLOADED
+        self.error = None
+        self.loads = 0
+        self.load_seconds = None
+        self._model = None
+        self._in_use = 0
+        self._last_used = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def load(self):
+        """Load the model if it is not resident and return it."""
+        with self._load_lock:
+            with self._lock:
+                if self._model is not None:
+                    return self._model
+                self.state = MODEL_LOADING
+                self.error = None
+
+            logger.info(f"Loading diffusion model {self.model_id} on {self.device}")
+            start = time.monotonic()
+            try:
+                # Timed as a stage of the pipeline that needed the model
+                with span("model_load"):
+                    pipe = self.loader(self.model_id, self.device)
+            except Exception as e:
+                logger.error(f"Error loading model: {e}")
+                with self._lock:
+                    self.state = MODEL_FAILED
+                    self.error = str(e)
+                empty_device_cache(self.device)
+                raise
+
+            with self._lock:
+                self._model = DiffusionModel(self.model_id, self.device, pipe)
+                self._last_used = time.monotonic()
+                self.state = MODEL_READY
+                self.loads += 1
+                self.load_seconds = round(time.monotonic() - start, 3)
+            logger.info(f"Model loaded in {self.load_seconds}s")
+            self._start_watcher()
+            return self._model
+
+    def preload(self, warm=None):
+        """
+        Load the model in a background thread; failures are reported by `status`.
+
+        Args:
+            warm (callable): Called with the loaded model, e.g. to encode constant prompts
+        """
+        def run():
+            try:
+                with self.acquire() as model:
+                    if warm:
+                        warm(model)
+            except Exception as e:
+                logger.error(f"Model preload failed: {e}")
+        thread = threading.Thread(target=run, name='preload-model', daemon=True)
+        thread.start()
+        return thread
+
+    @contextmanager
+    def acquire(self):
+        """Use the model, loading it if needed; it is not unloaded while held."""
+        while True:
+            with self._lock:
+                model = self._model
+                if model is not None:
+                    self._in_use += 1
+                    break
+            # Retry the check, the watcher may unload it again before we hold it
+            self.load()
+        try:
+            yield model
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                self._last_used = time.monotonic()
+
+    def unload(self, idle_for=None):
+        """
+        Release the model unless it is in use, or used within the last
+        `idle_for` seconds. Returns True if it was unloaded.
+        """
+        with self._load_lock:
+            with self._lock:
+                if self._model is None or self._in_use:
+                    return False
+                if idle_for is not None and time.monotonic() - self._last_used < idle_for:
+                    return False
+                model, self._model = self._model, None
+                self.state = MODEL_UNLOADED
+            del model
+            empty_device_cache(self.device)
+            logger.info(f"Unloaded diffusion model {self.model_id}")
+            return True
+
+    def unload_if_idle(self):
+        """Unload the model if it has been idle for longer than `idle_timeout`."""
+        if self.idle_timeout <= 0:
+            return False
+        return self.unload(idle_for=self.idle_timeout)
+
+    def _start_watcher(self):
+        if self.idle_timeout <= 0 or (self._watcher and self._watcher.is_alive()):
+            return
+        interval = min(max(self.idle_timeout / 4, 1), 60)
+
+        def watch():
+            while not self._stop.wait(interval):
+                self.unload_if_idle()
+        self._watcher = threading.Thread(target=watch, name='model-idle-watcher', daemon=True)
+        self._watcher.start()
+
+    def shutdown(self):
+        self._stop.set()
+        self.unload()
+
+    def status(self):
+        with self._lock:
+            idle = None
+            if self._model is not None and not self._in_use:
+                idle = round(time.monotonic() - self._last_used, 3)
+            embeddings = self._model.prompt_embeddings.stats() if self._model is not None else None
+            return {
+                'model_id': self.model_id,
+                'device': self.device,
+                'state': self.state,
+                'error': self.error,
+                'in_use': self._in_use,
+                'idle_seconds': idle,
+                'idle_timeout': self.idle_timeout,
+                'loads': self.loads,
+                'load_seconds': self.load_seconds,
+                'prompt_embeddings': embeddings,
+            }
+
+_model_manager = None
+_model_manager_lock = threading.Lock()
+
+def get_model_manager():
+    """Shared manager of the HF_MODEL_ID pipeline (DIFFUSION_DEVICE, DIFFUSION_IDLE_TIMEOUT)."""
+    global _model_manager
+    with _model_manager_lock:
+        if _model_manager is None:
+            _model_manager = ModelManager(
+                os.environ.get('HF_MODEL_ID', 'SG161222/RealVisXL_V5.0_Lightning'),
+                idle_timeout=float(os.environ.get('DIFFUSION_IDLE_TIMEOUT', 0)),
+            )
+    return _model_manager
@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+import torch
+
+class PromptEmbeddingCache:
+    """
+    LRU cache of text-encoder outputs for one loaded pipeline.
+
+    Entries are keyed by model id and prompt text and hold the keyword
+    arguments the pipeline accepts instead of the text: `prompt_embeds`, plus
+    `pooled_prompt_embeds` for SDXL pipelines. Pinned entries, such as the
+    constant negative prompt, are never evicted. The cache belongs to a model
+    load and is dropped with it.
+
+    Args:
+        model_id (str): Model the embeddings were computed with
+        pipe: Diffusion pipeline providing `encode_prompt`
+        device (str): Device of the text encoders
+        max_entries (int): Number of unpinned prompts to keep
+    """
+
+    def __init__(self, model_id, pipe, device, max_entries=64):
+        self.model_id = model_id
+        self.pipe = pipe
+        self.device = device
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pinned = {}
+        self._lock = threading.Lock()
+
+    @property
+    def supported(self):
+        return hasattr(self.pipe, 'encode_prompt')
+
+    def _encode(self, text):
+        # Without classifier-free guidance the text is encoded exactly as a
+        # positive prompt; negative prompts go through the same encoders
+        with torch.no_grad():
+            output = self.pipe.encode_prompt(
+                prompt=text,
+                device=self.device,
+                num_images_per_prompt=1,
+                do_classifier_free_guidance=False,
+            )
+        if len(output) == 4:
+            # SDXL: (embeds, negative embeds, pooled embeds, negative pooled embeds)
+            return {'prompt_embeds': output[0], 'pooled_prompt_embeds': output[2]}
+        return {'prompt_embeds': output[0]}
+
+    def get(self, text, pin=False):
+        """Embeddings of `text`, encoding it on a miss."""
+        key = (self.model_id, text)
+        with self._lock:
+            entry = self._pinned.get(key) or self._entries.get(key)
+            if entry is not None:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = self._encode(text)
+        with self._lock:
+            if pin:
+                self._pinned[key] = entry
+            else:
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def pipeline_kwargs(self, prompts, negative_prompt):
+        """
+        Prompt arguments for one pipeline call over `prompts`, sharing the
+        pinned embeddings of `negative_prompt`.
+        """
+        if not self.supported:
+            return {'prompt': list(prompts), 'negative_prompt': [negative_prompt] * len(prompts)}
+        positives = [self.get(text) for text in prompts]
+        negative = self.get(negative_prompt, pin=True)
+        kwargs = {name: torch.cat([entry[name] for entry in positives]) for name in positives[0]}
+        for name, value in negative.items():
+            kwargs[f'negative_{name}'] = value.repeat(len(prompts), *([1] * (value.dim() - 1)))
+        return kwargs
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'pinned': len(self._pinned),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,182 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import numpy as np
+from moviepy.audio.AudioClip import AudioClip
+from helpers.ffmpeg_helpers import run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+COPY_BLOCK_FRAMES = 1 << 20
+
+class PcmAudioClip(AudioClip):
+    """
+    moviepy audio clip reading from an int16 (frames, channels) array.
+
+    Unlike AudioArrayClip it scales the samples to [-1, 1] on the fly, so the
+    array can stay a read-only memory map of the decoded file.
+    """
+
+    def __init__(self, array, fps=SAMPLE_RATE):
+        self.array = array
+
+        def make_frame(t):
+            if isinstance(t, np.ndarray):
+                indexes = (fps * t).astype(int)
+                valid = (indexes >= 0) & (indexes < len(array))
+                result = np.zeros((len(t), array.shape[1]))
+                result[valid] = array[indexes[valid]] / 32768.0
+                return result
+            i = int(fps * t)
+            if i < 0 or i >= len(array):
+                return np.zeros(array.shape[1])
+            return array[i] / 32768.0
+
+        AudioClip.__init__(self, make_frame=make_frame, duration=len(array) / fps, fps=fps)
+
+class SoundLibrary:
+    """
+    Background sounds decoded once to 44.1 kHz stereo PCM and kept on disk.
+
+    Each source file is decoded with ffmpeg into an int16 `.npy` array that is
+    memory-mapped on use. Entries are refreshed when the source mtime or size
+    changes and its content hash differs from the one recorded at decode time.
+
+    Args:
+        directory (str): Folder holding the decoded arrays and the manifest
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self._lock = threading.Lock()
+        self._source_locks = {}
+        os.makedirs(directory, exist_ok=True)
+        self._manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.manifest-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._manifest, f, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def _source_lock(self, source_path):
+        with self._lock:
+            return self._source_locks.setdefault(source_path, threading.Lock())
+
+    @staticmethod
+    def _hash_file(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _array_path(self, source_path):
+        name = hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{name}.npy")
+
+    def prepare(self, source_path):
+        """
+        Decode `source_path` if needed and return the path of its PCM array.
+        """
+        if not os.path.exists(source_path):
+            raise FileNotFoundError(f"Background sound not found: {source_path}")
+
+        with self._source_lock(source_path):
+            stat = os.stat(source_path)
+            fingerprint = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+            array_path = self._array_path(source_path)
+            with self._lock:
+                entry = self._manifest.get(source_path)
+
+            if entry and os.path.exists(array_path):
+                if entry['mtime_ns'] == fingerprint['mtime_ns'] and entry['size'] == fingerprint['size']:
+                    return array_path
+                # Touched but possibly unchanged (e.g. a fresh checkout): compare contents
+                source_hash = self._hash_file(source_path)
+                if source_hash == entry['sha256']:
+                    self._record(source_path, dict(fingerprint, sha256=source_hash))
+                    return array_path
+            else:
+                source_hash = self._hash_file(source_path)
+
+            logger.info(f"Decoding background sound {source_path}")
+            self._decode(source_path, array_path)
+            self._record(source_path, dict(fingerprint, sha256=source_hash))
+            return array_path
+
+    def _record(self, source_path, entry):
+        with self._lock:
+            self._manifest[source_path] = entry
+            self._write_manifest()
+
+    def _decode(self, source_path, array_path):
+        fd, raw_path = tempfile.mkstemp(dir=self.directory, prefix='.decode-', suffix='.raw')
+        os.close(fd)
+        temp_array_path = raw_path[:-len('.raw')] + '.npy'
+        try:
+            # Same conversion as sanitize_audio_file, written as raw samples
+            run_ffmpeg([
+                "-i", source_path,
+                "-vn", "-map_metadata", "-1",
+                "-f", "s16le", "-acodec", "pcm_s16le",
+                "-ar", SAMPLE_RATE, "-ac", CHANNELS,
+                raw_path,
+            ])
+            frames = os.path.getsize(raw_path) // (2 * CHANNELS)
+            if frames == 0:
+                raise RuntimeError(f"No audio decoded from {source_path}")
+            raw = np.memmap(raw_path, dtype=np.int16, mode='r', shape=(frames, CHANNELS))
+            array = np.lib.format.open_memmap(temp_array_path, mode='w+', dtype=np.int16, shape=(frames, CHANNELS))
+            for start in range(0, frames, COPY_BLOCK_FRAMES):
+                array[start:start + COPY_BLOCK_FRAMES] = raw[start:start + COPY_BLOCK_FRAMES]
+            array.flush()
+            del array, raw
+            os.replace(temp_array_path, array_path)
+        finally:
+            for path in (raw_path, temp_array_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def load(self, source_path):
+        """Memory-mapped int16 (frames, channels) PCM of a background sound."""
+        return np.load(self.prepare(source_path), mmap_mode='r')
+
+    def clip(self, source_path):
+        """moviepy audio clip of a background sound, without any ffmpeg call on a warm library."""
+        return PcmAudioClip(self.load(source_path))
+
+    def warm(self, source_paths):
+        """Decode every existing source up front; missing files are skipped."""
+        for source_path in source_paths:
+            if not os.path.exists(source_path):
+                logger.warning(f"Skipping missing background sound {source_path}")
+                continue
+            try:
+                self.prepare(source_path)
+            except Exception as e:
+                logger.error(f"Failed to prepare background sound {source_path}: {e}")
+
+_sound_library = None
+_sound_library_lock = threading.Lock()
+
+def get_sound_library():
+    """Shared library of decoded background sounds (SOUND_CACHE_DIR)."""
+    global _sound_library
+    with _sound_library_lock:
+        if _sound_library is None:
+            _sound_library = SoundLibrary(os.environ.get('SOUND_CACHE_DIR', 'cache/sounds'))
+    return _sound_library
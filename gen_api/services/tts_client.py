@@ -0,0 +1,202 @@
+import os
+import asyncio
+import logging
+import threading
+import aiohttp
+import edge_tts
+import edge_tts.communicate
+
+logger = logging.getLogger(__name__)
+
+class SharedConnector(aiohttp.TCPConnector):
+    """
+    TCPConnector that outlives the sessions it is given to.
+
+    edge-tts opens an aiohttp.ClientSession per synthesis with the connector
+    passed to Communicate, and a session closes its connector on exit, so
+    close() does nothing here: the client calls shutdown() when it stops.
+    """
+
+    async def close(self, **kwargs):
+        pass
+
+    async def shutdown(self):
+        await super().close()
+
+_endpoint_lock = threading.Lock()
+_endpoint_clients = []
+_edge_tts_url = edge_tts.communicate.WSS_URL
+
+def use_endpoint(client):
+    """
+    Send every edge-tts request of the process to `client.endpoint` until release_endpoint(client).
+
+    edge-tts has no endpoint option: it reads the module constant WSS_URL
+    when it connects. The stand-in service is for tests and offline runs,
+    so clients with different endpoints cannot run at the same time.
+    """
+    url = client.endpoint if "?" in client.endpoint else f"{client.endpoint}?"
+    with _endpoint_lock:
+        if _endpoint_clients and edge_tts.communicate.WSS_URL != url:
+            raise RuntimeError(f"edge-tts already uses {edge_tts.communicate.WSS_URL}")
+        edge_tts.communicate.WSS_URL = url
+        _endpoint_clients.append(client)
+
+def release_endpoint(client):
+    with _endpoint_lock:
+        if client in _endpoint_clients:
+            _endpoint_clients.remove(client)
+            if not _endpoint_clients:
+                edge_tts.communicate.WSS_URL = _edge_tts_url
+
+class TtsClient:
+    """
+    edge-tts client shared by every request and job of the process.
+
+    Syntheses run on one long-lived event loop thread, whatever loop the
+    caller runs on, so they share a connector (and its DNS cache) instead of
+    building one per `asyncio.run`. edge-tts still opens a new WebSocket for
+    every synthesis. At most `max_in_flight` requests talk to the service at
+    once, the others wait for a slot.
+
+    Args:
+        max_in_flight (int): Concurrent requests to the service
+        connect_timeout (int): Seconds to open the connection
+        receive_timeout (int): Seconds to wait for each message of the response
+        request_timeout (float): Seconds for a whole synthesis, once it has a slot
+        endpoint (str): WebSocket URL of a stand-in service, None for edge-tts (see use_endpoint)
+    """
+
+    def __init__(self, max_in_flight=8, connect_timeout=10, receive_timeout=30, request_timeout=120, endpoint=None):
+        self.max_in_flight = max_in_flight
+        self.connect_timeout = connect_timeout
+        self.receive_timeout = receive_timeout
+        self.request_timeout = request_timeout
+        self.endpoint = endpoint
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self._loop = None
+        self._thread = None
+        self._connector = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                if self.endpoint:
+                    use_endpoint(self)
+                self._loop = asyncio.new_event_loop()
+                ready = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._loop, ready), name='tts-client', daemon=True)
+                self._thread.start()
+                ready.wait()
+        return self._loop
+
+    def _run(self, loop, ready):
+        asyncio.set_event_loop(loop)
+
+        async def setup():
+            # No connection limit: the slots already cap the requests in flight
+            self._connector = SharedConnector(limit=0, ttl_dns_cache=300)
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+
+        loop.run_until_complete(setup())
+        ready.set()
+        loop.run_forever()
+        loop.run_until_complete(self._connector.shutdown())
+        loop.close()
+
+    async def synthesize(self, voice, text, output_file, rate="+0%", pitch="+0Hz", words=None):
+        """
+        Synthesize `text` to `output_file` (MP3 bytes as streamed by the service).
+
+        When `words` is a list, the WordBoundary messages are appended to it.
+        Can be awaited from any event loop.
+        """
+        loop = self.start()
+        future = asyncio.run_coroutine_threadsafe(self._synthesize(voice, text, output_file, rate, pitch, words), loop)
+        return await asyncio.wrap_future(future)
+
+    async def _synthesize(self, voice, text, output_file, rate, pitch, words):
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.requests += 1
+        try:
+            return await asyncio.wait_for(self._stream(voice, text, output_file, rate, pitch, words), self.request_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise TimeoutError(f"Speech synthesis did not complete within {self.request_timeout} seconds")
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def communicator(self, text, **kwargs):
+        return edge_tts.Communicate(text, **kwargs)
+
+    async def _stream(self, voice, text, output_file, rate, pitch, words):
+        communicator = self.communicator(
+            text, voice=voice,
+            rate=rate, pitch=pitch,
+            boundary="WordBoundary",
+            connector=self._connector,
+            connect_timeout=self.connect_timeout,
+            receive_timeout=self.receive_timeout,
+        )
+        with open(output_file, "wb") as f:
+            async for message in communicator.stream():
+                if message["type"] == "audio":
+                    f.write(message["data"])
+                elif message["type"] == "WordBoundary" and words is not None:
+                    words.append(message)
+        return output_file
+
+    def shutdown(self):
+        with self._lock:
+            thread, loop, self._thread = self._thread, self._loop, None
+        if thread is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            release_endpoint(self)
+
+    def stats(self):
+        return {
+            'max_in_flight': self.max_in_flight,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'requests': self.requests,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+        }
+
+_tts_client = None
+_tts_client_lock = threading.Lock()
+
+def get_tts_client():
+    """
+    Shared TTS client, started on first use.
+
+    Configured through TTS_MAX_IN_FLIGHT, TTS_CONNECT_TIMEOUT, TTS_RECEIVE_TIMEOUT,
+    TTS_REQUEST_TIMEOUT and TTS_ENDPOINT.
+    """
+    global _tts_client
+    with _tts_client_lock:
+        if _tts_client is None:
+            _tts_client = TtsClient(
+                max_in_flight=int(os.environ.get('TTS_MAX_IN_FLIGHT', 8)),
+                connect_timeout=int(os.environ.get('TTS_CONNECT_TIMEOUT', 10)),
+                receive_timeout=int(os.environ.get('TTS_RECEIVE_TIMEOUT', 30)),
+                request_timeout=float(os.environ.get('TTS_REQUEST_TIMEOUT', 120)),
+                endpoint=os.environ.get('TTS_ENDPOINT') or None,
+            )
+    return _tts_client
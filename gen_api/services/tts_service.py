@@ -1,6 +1,7 @@
 import asyncio
 from flask import jsonify, send_file
 from .audio_service import text_to_speech_async
+from helpers.workspace import scratch_path
 
 async def generate_tts(request):
     try:
@@ -10,7 +11,7 @@ async def generate_tts(request):
             
         text = data.get('text')
         type = data.get('type')
-        output_filename = data.get('filename', "output.wav")
+        output_filename = data.get('filename') or scratch_path("output.wav")
         
         if not text:
             return jsonify({"error": "No text provided"}), 400
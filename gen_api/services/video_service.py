@@ -1,14 +1,22 @@
 import os
 import json
-import tempfile
 import asyncio
 import logging
 from flask import jsonify, send_file
-from moviepy.editor import TextClip, CompositeVideoClip, concatenate_videoclips, AudioFileClip, ImageClip, vfx, afx, concatenate_audioclips, CompositeAudioClip, VideoFileClip
-from pydub import AudioSegment
-from .image_service import apply_vignette
-from .audio_service import get_intro_voice_over, loop_audio, sanitize_audio_file, text_to_speech_async, get_horror_background_sound_path, get_love_background_sound_path
-import subprocess
+from moviepy.editor import TextClip, CompositeVideoClip, concatenate_videoclips, AudioFileClip, ImageClip, vfx, CompositeAudioClip, VideoFileClip
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from .vignette_service import apply_vignette_array
+from .audio_service import get_intro_voice_over, loop_audio, text_to_speech_async, narration_to_speech_async, get_background_sound_path
+from .sound_library import get_sound_library
+from .alignment_service import align_audio_file
+from .caption_service import get_caption_renderer, CaptionTrack
+from helpers.ffmpeg_helpers import run_ffmpeg
+from helpers import audio_mix
+from helpers.encoding_profiles import get_encoding_profile, scale_clip, scaled_size, write_videofile_args, ffmpeg_video_args, ffmpeg_audio_args, x264_params, MP4_FASTSTART
+from helpers.workspace import with_workspace, scratch_path, scratch_temp_path, scratch_dir, check_workspace_quota
+from helpers.metrics import instrumented, span
+import shutil
+import cv2
 from unittest.mock import MagicMock
 import dotenv
 import moviepy
@@ -30,6 +38,23 @@ logger = logging.getLogger(__name__)
 title_font_path = "assets/fonts/Caveat_Brush/CaveatBrush-Regular.ttf"
 chapter_font_path = "assets/fonts/Caveat_Brush/CaveatBrush-Regular.ttf"
 
+CHAPTER_RENDER_MODES = ("still", "composite")
+CHAPTER_FADE_DURATION = 1
+# Headers identical across encodes, so the ffmpeg concat demuxer can copy the streams
+STITCHABLE_X264_PARAMS = ["-x264-params", "stitchable=1"]
+# Still-body segments: also tuned for static images
+STILL_X264_PARAMS = ["-tune", "stillimage"] + STITCHABLE_X264_PARAMS
+STILL_BLOCK_FRAMES = 48
+
+def load_rgb_image(image_path):
+    """Read an image file as an RGB uint8 array, the layout moviepy expects."""
+    image = cv2.imread(image_path)
+    if image is None:
+        raise ValueError(f"Could not load image from {image_path}")
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+@instrumented("chapter")
+@with_workspace
 def generate_chapter_video(request):
     logger.info("Starting chapter video generation.")
     
@@ -40,7 +65,15 @@ def generate_chapter_video(request):
     content = request.form.get('content')
     background_sound_key = request.form.get('background_sound')
     font_size = int(request.form.get('font_size', default_font_size))
-    output_filename = request.form.get("filename", "output_video.mp4")
+    output_filename = request.form.get("filename") or scratch_path("output_video.mp4")
+
+    # "still" encodes the static body with ffmpeg, "composite" renders every frame with moviepy
+    render_mode = request.form.get('render_mode') or os.environ.get('CHAPTER_RENDER_MODE', 'still')
+    if render_mode not in CHAPTER_RENDER_MODES:
+        return None, f"Invalid render_mode: {render_mode}"
+    profile, error = get_encoding_profile(request.form.get('profile'))
+    if error:
+        return None, error
 
     # Log received data
     logger.info(f"Type: {story_type}, Title: {title}, Chapter: {chapter}, Content: {len(content)} characters, Background sound: {background_sound_key}")
@@ -49,42 +82,54 @@ def generate_chapter_video(request):
     background_image_file = request.files.get('background_image')
     if background_image_file:
         # Temporarily save the image for use
-        temp_image_path = tempfile.mktemp(suffix=".jpg")
+        temp_image_path = scratch_path("background.jpg")
         background_image_file.save(temp_image_path)
         logger.info(f"Background image temporarily saved at: {temp_image_path}")
     else:
         logger.error("Missing background image in the request.")
         return None, "Missing background image"
 
+    # Synthesize the title, the chapter name and the narration concurrently
+    intro_title_path = scratch_path("intro_title_voice_over.wav")
+    intro_chapter_path = scratch_path("intro_chapter_voice_over.wav")
+    content_voiceover_path = scratch_path("content_voiceover.wav")
+    try:
+        logger.info("Generating voice-overs.")
+        with span("voice_overs") as stage:
+            asyncio.run(generate_chapter_voice_overs(story_type, title, chapter, content, intro_title_path, intro_chapter_path, content_voiceover_path))
+            for path in (intro_title_path, intro_chapter_path, content_voiceover_path):
+                stage.add_file(path)
+        check_workspace_quota()
+    except Exception as e:
+        logger.error(f"Error generating the voice-overs: {e}")
+        return None, str(e)
+
     # Chapter introduction with voice-over of "chapter"
     try:
-        logger.info("Creating the first part of the video.")
-        silence = AudioSegment.silent(duration=2000)  # 2000 ms = 2 seconds
-        temp_silence_path = tempfile.mktemp(suffix=".wav")
-        silence.export(temp_silence_path, format="wav")
-
-        logger.info(f"Creating TextClip with chapter={chapter}, fontsize={font_size}, font={chapter_font_path}")
-        chapter_clip = TextClip(txt=chapter, fontsize=font_size, color='white', font=chapter_font_path).set_duration(6)
-        chapter_clip = vfx.fadein(chapter_clip, 2.5)
-        chapter_clip = chapter_clip.set_position(("center", "center")).set_start(4)
+        with span("intro"):
+            logger.info("Creating the first part of the video.")
+            silence = audio_mix.silence(2)
+
+            logger.info(f"Creating TextClip with chapter={chapter}, fontsize={font_size}, font={chapter_font_path}")
+            chapter_clip = TextClip(txt=chapter, fontsize=font_size, color='white', font=chapter_font_path).set_duration(6)
+            chapter_clip = vfx.fadein(chapter_clip, 2.5)
+            chapter_clip = chapter_clip.set_position(("center", "center")).set_start(4)
         
-        logger.info(f"Creating TextClip with title={title}, fontsize={font_size}, font={title_font_path}")
-        title_clip = TextClip(txt=title, fontsize=font_size, color='white', font=title_font_path).set_duration(10)
-        title_clip = vfx.fadein(title_clip, 5)
-        title_clip = title_clip.set_position(("center", chapter_clip.size[1] + 100))
-
-        # Configure the voice-over to start exactly at 2 seconds
-        silence_clip = AudioFileClip(temp_silence_path)
-        voice_over_intro_title = AudioFileClip(get_intro_voice_over(story_type, title))
-        voice_over_intro_chapter = AudioFileClip(get_intro_voice_over(story_type, chapter))
-        voice_over_with_silence = concatenate_audioclips([silence_clip, voice_over_intro_title, silence_clip, voice_over_intro_chapter])
-
-        # Create video composite with audio set to start at 2 seconds
-        video_intro = CompositeVideoClip([title_clip, chapter_clip], size=(1920, 1080), bg_color=(0, 0, 0))
-        video_intro = video_intro.set_audio(voice_over_with_silence)
-
-        # Apply fade out using vfx
-        video_intro = vfx.fadeout(video_intro, 2) # 2 seconds fade out
+            logger.info(f"Creating TextClip with title={title}, fontsize={font_size}, font={title_font_path}")
+            title_clip = TextClip(txt=title, fontsize=font_size, color='white', font=title_font_path).set_duration(10)
+            title_clip = vfx.fadein(title_clip, 5)
+            title_clip = title_clip.set_position(("center", chapter_clip.size[1] + 100))
+
+            # Configure the voice-over to start exactly at 2 seconds
+            voice_over_with_silence = audio_mix.audio_clip(audio_mix.concat(
+                silence, audio_mix.load_pcm(intro_title_path), silence, audio_mix.load_pcm(intro_chapter_path)))
+
+            # Create video composite with audio set to start at 2 seconds
+            video_intro = CompositeVideoClip([title_clip, chapter_clip], size=(1920, 1080), bg_color=(0, 0, 0))
+            video_intro = video_intro.set_audio(voice_over_with_silence)
+
+            # Apply fade out using vfx
+            video_intro = vfx.fadeout(video_intro, 2) # 2 seconds fade out
         logger.info("First part of the video created successfully.")
     except Exception as e:
         logger.error(f"Error creating the first part of the video: {e}")
@@ -92,50 +137,65 @@ def generate_chapter_video(request):
 
     # Chapter reading with voice-over of "content"
     try:
-        # Generate voice-over for "content"
-        content_voiceover_path = "content_voiceover.wav"
-        asyncio.run(text_to_speech_async(story_type, content, content_voiceover_path))
-        content_voice_over = AudioFileClip(content_voiceover_path)
-
         logger.info("Creating the second part of the video.")
-        
-        # Load background sound based on the key
-        background_sound_path = get_horror_background_sound_path(background_sound_key) if story_type == "Horror" else get_love_background_sound_path(background_sound_key)
 
-        # Sanitize the audio file to avoid metadata issues
-        sanitized_audio_path = tempfile.mktemp(suffix=".wav")
-        sanitize_audio_file(background_sound_path, sanitized_audio_path)
+        with span("soundtrack") as stage:
+            content_voice_over = audio_mix.load_pcm(content_voiceover_path)
+            content_duration = audio_mix.duration(content_voice_over)
 
-        # Load the sanitized audio file
-        background_sound_clip = AudioFileClip(sanitized_audio_path).volumex(0.25)
-        
-        # Create looped background with fade
-        background_sound = loop_audio(background_sound_clip, duration=content_voice_over.duration + 5)
-        background_sound = background_sound.volumex(0.25)
-        
-        logger.info(f"Background sound loaded from: {background_sound_path}")
-        
-        # Create composite audio with content voice over
-        composite_audio_content = CompositeAudioClip([background_sound, content_voice_over]).set_duration(background_sound.duration)
-        # Apply fade out to the final audio
-        composite_audio_content = afx.audio_fadeout(composite_audio_content, 2)
-        chapter_voice_over_with_silence = concatenate_audioclips([silence_clip, composite_audio_content])
+            # Load the pre-decoded background sound based on the key
+            background_sound_path = get_background_sound_path(story_type, background_sound_key)
+            background_sound = audio_mix.to_float_pcm(get_sound_library().load(background_sound_path))
+            logger.info(f"Background sound loaded from: {background_sound_path}")
+
+            # One buffer for the whole soundtrack: 2 seconds of silence, then the body
+            lead = len(silence)
+            soundtrack = audio_mix.buffer(lead + audio_mix.frame_count(content_duration + 5))
+            body = soundtrack[lead:]
+
+            # Looped background with fade, at 0.25 * 0.25 volume, the voice over on top, then fade out the result
+            loop_audio(background_sound, duration=content_duration + 5, gain=0.0625, out=body)
+            audio_mix.mix_into(body, [(content_voice_over, 0)])
+            audio_mix.fade_out(body, 2)
+            del content_voice_over, background_sound, body
+
+            chapter_voice_over_with_silence = audio_mix.audio_clip(soundtrack)
+            stage.add_bytes(soundtrack.nbytes)
+            del soundtrack
 
-        temp_vignette_image_path = apply_vignette(temp_image_path)
-        print("Duration of content voice over:", content_voice_over.duration)
-        background_image_clip = ImageClip(temp_vignette_image_path, duration=chapter_voice_over_with_silence.duration).resize(height=1080)
+        with span("vignette"):
+            background_image = load_rgb_image(temp_image_path)
+            vignetted_image = apply_vignette_array(background_image)
+        print("Duration of content voice over:", content_duration)
+        background_image_clip = ImageClip(vignetted_image, duration=chapter_voice_over_with_silence.duration).resize(height=1080)
 
         video_content = CompositeVideoClip([background_image_clip], size=(1920, 1080), bg_color=(0, 0, 0))
-        video_content = video_content.set_audio(chapter_voice_over_with_silence)
+        if render_mode == "composite":
+            video_content = video_content.set_audio(chapter_voice_over_with_silence)
 
-        # Apply fade in/out using vfx
-        video_content = vfx.fadein(video_content, 1)
-        video_content = vfx.fadeout(video_content, 1)  # 1 second fade out
+            # Apply fade in/out using vfx
+            video_content = vfx.fadein(video_content, 1)
+            video_content = vfx.fadeout(video_content, 1)  # 1 second fade out
         logger.info("Second part of the video created successfully.")
     except Exception as e:
         logger.error(f"Error creating the second part of the video: {e}")
         return None, str(e)
 
+    if render_mode == "still":
+        try:
+            logger.info("Exporting the video with the still-image body.")
+            with span("encode") as stage:
+                render_chapter_with_still_body(video_intro, video_content.get_frame(0), chapter_voice_over_with_silence, output_filename, profile)
+                stage.add_file(output_filename)
+            check_workspace_quota()
+            logger.info(f"Final video exported to: {output_filename}")
+        except Exception as e:
+            logger.error(f"Error exporting the video: {e}")
+            return None, str(e)
+        finally:
+            video_intro.close()
+        return output_filename, None
+
     # Concatenate the two parts of the video
     try:
         logger.info("Concatenating the two parts of the video.")
@@ -146,88 +206,186 @@ def generate_chapter_video(request):
         return None, str(e)
     
     try:
-        logger.info("Exporting the video.")
-        final_video.write_videofile(output_filename, fps=24, bitrate="8000k", preset="slow", codec="libx264", audio_codec="aac")
+        logger.info(f"Exporting the video with the {profile['name']} profile.")
+        with span("encode") as stage:
+            scale_clip(final_video, profile).write_videofile(output_filename, **write_videofile_args(profile))
+            stage.add_file(output_filename)
+        check_workspace_quota()
         logger.info(f"Final video exported to: {output_filename}")
     except Exception as e:
         logger.error(f"Error exporting the video: {e}")
         logger.error(f"video_intro duration: {video_intro.duration}, video_content duration: {video_content.duration}")
         return None, str(e)
     finally:
-        # Delete the temporary image file after use
+        # Intermediate files are removed with the workspace
         final_video.close()
-        os.remove(temp_image_path)
-        os.remove(temp_silence_path)
-        os.remove(content_voiceover_path)
-        os.remove(temp_vignette_image_path)
-        logger.info("Temporary files deleted")
 
     return output_filename, None
 
-def generate_full_story_video(request):
-    # Parse request, get the 3 videos then concatenate all of them in one video to return
-    logger.info("Generating full story video")
-    
-    story_type = request.form.get('type', 'Horror')
-    output_filename = request.form.get("filename", "output_video.mp4")
-    
+def encode_still_frames(frame_path, frames, output_path, profile):
+    """Encode `frames` copies of an image, decoded once, with the still-body x264 settings."""
+    fps = profile["fps"]
+    run_ffmpeg(
+        ["-i", frame_path,
+         "-vf", f"format=yuv420p,loop=loop={frames - 1}:size=1:start=0,setpts=N/({fps}*TB)",
+         "-r", fps, "-frames:v", frames]
+        + ffmpeg_video_args(profile) + STILL_X264_PARAMS + [output_path]
+    )
+
+def render_chapter_with_still_body(video_intro, body_frame, body_audio, output_filename, profile=None, fade_duration=CHAPTER_FADE_DURATION):
+    """
+    Encode a chapter whose body is a single still frame held for the narration.
+
+    Only the intro and the body fades go through moviepy. The static middle is
+    one still-image GOP of at most STILL_BLOCK_FRAMES frames, encoded once by
+    ffmpeg and repeated by the concat demuxer, so the encoding work does not
+    grow with the narration. Every segment uses the same stitchable x264
+    settings so they can be joined by stream copy; the audio is mixed once to
+    PCM and encoded during the join.
+
+    Args:
+        video_intro (VideoClip): Title and chapter intro, with its audio
+        body_frame (np.ndarray): RGB frame of the body at the output size
+        body_audio (AudioClip): Audio of the body, starting with the body
+        output_filename (str): Path of the mp4 to write
+        profile (dict): Encoding profile, "final" by default
+        fade_duration (float): Length of the body fade-in and fade-out
+    """
+    if profile is None:
+        profile, _ = get_encoding_profile("final")
+    video_intro = scale_clip(video_intro, profile)
+    size = scaled_size(body_frame.shape[1], body_frame.shape[0], profile)
+    if size != (body_frame.shape[1], body_frame.shape[0]):
+        body_frame = cv2.resize(body_frame, size, interpolation=cv2.INTER_AREA)
+
+    fps = profile["fps"]
+    body_duration = body_audio.duration
+    fade_frames = int(round(fade_duration * fps))
+    middle_frames = int(round(body_duration * fps)) - 2 * fade_frames
+
+    temp_dir = scratch_dir(prefix="chapter-")
+    try:
+        def write_segment(name, clip):
+            path = os.path.join(temp_dir, name)
+            clip.write_videofile(path, **write_videofile_args(
+                profile, audio=False, logger=None,
+                ffmpeg_params=[str(arg) for arg in x264_params(profile) + STILL_X264_PARAMS]))
+            check_workspace_quota()
+            return path
+
+        if middle_frames > 0:
+            fade_in = vfx.fadein(ImageClip(body_frame, duration=fade_frames / fps), fade_duration)
+            fade_out = vfx.fadeout(ImageClip(body_frame, duration=fade_frames / fps), fade_duration)
+            segments = [write_segment("head.mp4", concatenate_videoclips([video_intro.without_audio(), fade_in]))]
+
+            frame_path = os.path.join(temp_dir, "body.png")
+            cv2.imwrite(frame_path, cv2.cvtColor(body_frame, cv2.COLOR_RGB2BGR))
+            blocks, remainder = divmod(middle_frames, STILL_BLOCK_FRAMES)
+            logger.info(f"Encoding {middle_frames} still frames as {blocks} repeated blocks and {remainder} frames.")
+            if blocks:
+                block_path = os.path.join(temp_dir, "block.mp4")
+                encode_still_frames(frame_path, STILL_BLOCK_FRAMES, block_path, profile)
+                segments += [block_path] * blocks
+            if remainder:
+                remainder_path = os.path.join(temp_dir, "remainder.mp4")
+                encode_still_frames(frame_path, remainder, remainder_path, profile)
+                segments.append(remainder_path)
+            check_workspace_quota()
+            segments.append(write_segment("tail.mp4", fade_out))
+        else:
+            # Too short for a static middle: composite the whole body
+            body = ImageClip(body_frame, duration=body_duration)
+            body = vfx.fadeout(vfx.fadein(body, fade_duration), fade_duration)
+            segments = [write_segment("head.mp4", concatenate_videoclips([video_intro.without_audio(), body]))]
+
+        # Same audio layout as concatenate_videoclips: the body starts when the intro ends
+        audio_path = os.path.join(temp_dir, "audio.wav")
+        audio = audio_mix.mix(
+            [(audio_mix.clip_pcm(video_intro.audio), 0), (audio_mix.clip_pcm(body_audio), video_intro.duration)],
+            frames=audio_mix.frame_count(video_intro.duration + body_duration),
+        )
+        audio_mix.write_pcm(audio_path, audio)
+        check_workspace_quota()
+
+        list_path = os.path.join(temp_dir, "concat.txt")
+        with open(list_path, "w") as f:
+            for path in segments:
+                f.write(f"file '{path}'\n")
+
+        logger.info("Joining the chapter segments and the audio track.")
+        run_ffmpeg([
+            "-f", "concat", "-safe", "0", "-i", list_path, "-i", audio_path,
+            "-map", "0:v", "-map", "1:a", "-c:v", "copy",
+        ] + ffmpeg_audio_args(profile) + MP4_FASTSTART + [output_filename])
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+async def generate_chapter_voice_overs(story_type, title, chapter, content, title_path, chapter_path, content_path):
+    """Run the two intro voice-overs in parallel with the chunked narration."""
+    await asyncio.gather(
+        text_to_speech_async(story_type, title, title_path),
+        text_to_speech_async(story_type, chapter, chapter_path),
+        narration_to_speech_async(story_type, content, content_path),
+    )
+
+CONCAT_MODES = ("reencode", "copy")
+
+GENERIQUE_PATHS = {
+    "Horror": "assets/generique_short.mov",
+    "Love": "assets/gen_hot_diaries.mov",
+}
+
+def get_story_chapter_paths(request):
+    """
+    Resolve the chapter videos of a full story request.
+
+    Returns:
+        tuple: (chapter paths, temporary paths to delete afterwards, error)
+    """
     # Check if we have a JSON string of chapter files
     chapter_files_json = request.form.get('chapter_files')
     if chapter_files_json:
         try:
             chapter_files = json.loads(chapter_files_json)
-            if not isinstance(chapter_files, list) or not chapter_files:
-                logger.error("Invalid chapter files format in request.")
-                return None, "Invalid chapter files format"
-                
-            # Load each video file
-            video_clips = []
-            for chapter in chapter_files:
-                if not os.path.exists(chapter['path']):
-                    logger.error(f"Video file not found: {chapter['path']}")
-                    return None, f"Video file not found: {chapter['path']}"
-                clip = VideoFileClip(chapter['path'])
-                video_clips.append(clip)
         except json.JSONDecodeError:
             logger.error("Invalid JSON format for chapter_files")
-            return None, "Invalid JSON format for chapter_files"
-    else:
-        # Get individual chapter files
-        chapter_1_file = request.files.get('chapter_1')
-        chapter_2_file = request.files.get('chapter_2')
-        chapter_3_file = request.files.get('chapter_3')
-        
-        if not chapter_1_file or not chapter_2_file or not chapter_3_file:
-            logger.error("Missing chapter files in the request.")
-            return None, "Missing chapter files in the request."
-        
-        # Save the files
-        temp_chapter_1_path = tempfile.mktemp(suffix=".mp4")
-        temp_chapter_2_path = tempfile.mktemp(suffix=".mp4")
-        temp_chapter_3_path = tempfile.mktemp(suffix=".mp4")
-        chapter_1_file.save(temp_chapter_1_path)
-        chapter_2_file.save(temp_chapter_2_path)
-        chapter_3_file.save(temp_chapter_3_path)
-        
-        logger.info(f"Chapter files saved to temporary locations")
-        
-        # Load the video clips
-        video_clips = [
-            VideoFileClip(temp_chapter_1_path),
-            VideoFileClip(temp_chapter_2_path),
-            VideoFileClip(temp_chapter_3_path)
-        ]
-    
-    # Load the generic video
-    generique_filename = "assets/generique_short.mov" if story_type == "Horror" else "assets/gen_hot_diaries.mov"
-    generique_clip = VideoFileClip(generique_filename)
+            return None, [], "Invalid JSON format for chapter_files"
+        if not isinstance(chapter_files, list) or not chapter_files:
+            logger.error("Invalid chapter files format in request.")
+            return None, [], "Invalid chapter files format"
+
+        for chapter in chapter_files:
+            if not os.path.exists(chapter['path']):
+                logger.error(f"Video file not found: {chapter['path']}")
+                return None, [], f"Video file not found: {chapter['path']}"
+        return [chapter['path'] for chapter in chapter_files], [], None
+
+    # Get individual chapter files
+    chapter_files = [request.files.get(f'chapter_{i}') for i in (1, 2, 3)]
+    if not all(chapter_files):
+        logger.error("Missing chapter files in the request.")
+        return None, [], "Missing chapter files in the request."
+
+    # Save the files
+    temp_paths = []
+    for chapter_file in chapter_files:
+        temp_path = scratch_temp_path(suffix=".mp4", prefix="chapter-")
+        chapter_file.save(temp_path)
+        temp_paths.append(temp_path)
+    logger.info(f"Chapter files saved to temporary locations")
+    return temp_paths, temp_paths, None
+
+def build_generique_clip(story_type, title, title_voiceover_path, height=1080):
+    """
+    Story intro: the generique with the title voice-over, cut and faded out.
+
+    Returns:
+        tuple: (clip, time at which the title appears in the generique)
+    """
+    generique_clip = VideoFileClip(GENERIQUE_PATHS["Horror"] if story_type == "Horror" else GENERIQUE_PATHS["Love"])
     generique_base_time = 5 if story_type == "Horror" else 8
-    
-    # Generate voice-over for the title
-    title = request.form.get('title', '')
+
     if title:
-        title_voiceover_path = "title_voiceover.wav"
-        asyncio.run(text_to_speech_async(story_type, title, title_voiceover_path))
         title_voice_over = AudioFileClip(title_voiceover_path).set_start(generique_base_time + 2)
         
         # Composite the title text and voice-over onto the generic video
@@ -237,49 +395,132 @@ def generate_full_story_video(request):
     else:
         generique_video = generique_clip.set_end(generique_base_time + 5)
     
-    generique_video = generique_video.resize(height=1080)
+    generique_video = generique_video.resize(height=height)
     # Apply fade out using vfx
     generique_video = vfx.fadeout(generique_video, 2)
-    
-    # Concatenate the generic video with the chapter videos
-    # try:
-    if True:
+    return generique_video, generique_base_time
+
+def build_title_clip(title, width, generique_base_time):
+    text_clip = TextClip(
+        txt=title,
+        font=title_font_path,
+        fontsize=default_font_size,
+        color="white",
+        stroke_color="black",
+        stroke_width=2,
+        size=(width, None),
+        method="label"
+    ).set_position(("center", "center")).set_start(generique_base_time + 1).set_end(generique_base_time + 5)
+    # Apply fade in using vfx
+    return vfx.fadein(text_clip, 2)
+
+def concat_story_reencode(generique_video, generique_base_time, title, chapter_paths, output_filename, profile):
+    """Composite the intro and every chapter into one clip and encode it all."""
+    video_clips = [VideoFileClip(path) for path in chapter_paths]
+    try:
         logger.info("Concatenating the generic video with the three parts of the video.")
-        final_video = concatenate_videoclips([
-            generique_video,
-            video_clips[0],
-            video_clips[1],
-            video_clips[2]
-        ])
-
-        text_clip = TextClip(
-            txt=title,
-            font=title_font_path,
-            fontsize=default_font_size,
-            color="white",
-            stroke_color="black",
-            stroke_width=2,
-            size=(final_video.w, None),
-            method="label"
-        ).set_position(("center", "center")).set_start(generique_base_time + 1).set_end(generique_base_time + 5)
-        # Apply fade in using vfx
-        text_clip = vfx.fadein(text_clip, 2)
-
-        print(final_video.duration)
-        print(text_clip.duration)
-        final_video = CompositeVideoClip([final_video, text_clip])    # except Exception as e:
-    #     logger.error(f"Error concatenating the video: {e}")
-    #     return jsonify({"error": str(e)}), 500
+        final_video = concatenate_videoclips([generique_video] + video_clips)
+
+        text_clip = build_title_clip(title, final_video.w, generique_base_time)
+        final_video = CompositeVideoClip([final_video, text_clip])
+
+        scale_clip(final_video, profile).write_videofile(output_filename, **write_videofile_args(profile))
+        final_video.close()
+    finally:
+        for clip in video_clips:
+            clip.close()
+
+def concat_story_stream_copy(generique_video, generique_base_time, title, chapter_paths, output_filename, profile):
+    """
+    Encode only the intro, then join it and the chapters without re-encoding.
+
+    The intro is encoded with the chapter stream parameters (size, frame rate,
+    pixel format, audio rate) and the x264/AAC settings of `profile`, with the
+    stitchable headers of generate_chapter_video, so the ffmpeg concat demuxer
+    can copy every stream; unlike the still bodies, the moving intro is not
+    tuned for still images. Chapters should be rendered with the same profile.
+    """
+    infos = ffmpeg_parse_infos(chapter_paths[0])
+    width, height = infos['video_size']
+    fps = infos['video_fps']
+    audio_fps = infos.get('audio_fps') or 44100
+
+    temp_dir = scratch_dir(prefix="story-")
+    try:
+        intro_path = os.path.join(temp_dir, "intro.mp4")
+        layers = [generique_video.resize(height=height).set_position("center")]
+        if title:
+            layers.append(build_title_clip(title, width, generique_base_time))
+        intro = CompositeVideoClip(layers, size=(width, height), bg_color=(0, 0, 0)).set_duration(generique_video.duration)
+        logger.info(f"Encoding the story intro at {width}x{height}, {fps} fps.")
+        intro.write_videofile(intro_path, **write_videofile_args(
+            profile, fps=fps, audio_fps=audio_fps,
+            ffmpeg_params=[str(arg) for arg in x264_params(profile) + STITCHABLE_X264_PARAMS]))
+        intro.close()
+        check_workspace_quota()
+
+        list_path = os.path.join(temp_dir, "concat.txt")
+        with open(list_path, "w") as f:
+            for path in [intro_path] + list(chapter_paths):
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        logger.info("Joining the intro and the chapters by stream copy.")
+        run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy"] + MP4_FASTSTART + [output_filename])
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+@instrumented("full_story")
+@with_workspace
+def generate_full_story_video(request):
+    # Parse request, get the 3 videos then concatenate all of them in one video to return
+    logger.info("Generating full story video")
     
+    story_type = request.form.get('type', 'Horror')
+    output_filename = request.form.get("filename") or scratch_path("output_video.mp4")
+    title = request.form.get('title', '')
+
+    # "copy" joins the chapters without re-encoding them
+    concat_mode = request.form.get('concat_mode') or os.environ.get('FULL_STORY_CONCAT_MODE', 'reencode')
+    if concat_mode not in CONCAT_MODES:
+        return None, f"Invalid concat_mode: {concat_mode}"
+    profile, error = get_encoding_profile(request.form.get('profile'))
+    if error:
+        return None, error
+
+    chapter_paths, temp_paths, error = get_story_chapter_paths(request)
+    if error:
+        return None, error
+
+    title_voiceover_path = scratch_path("title_voiceover.wav")
     try:
-        final_video.write_videofile(output_filename, fps=24, bitrate="8000k", preset="slow", codec="libx264", audio_codec="aac")
-        final_video.close()
+        # Generate voice-over for the title
+        if title:
+            with span("voice_overs") as stage:
+                asyncio.run(text_to_speech_async(story_type, title, title_voiceover_path))
+                stage.add_file(title_voiceover_path)
+            check_workspace_quota()
+        generique_video, generique_base_time = build_generique_clip(story_type, title, title_voiceover_path)
+
+        with span(f"encode_{concat_mode}") as stage:
+            if concat_mode == "copy":
+                concat_story_stream_copy(generique_video, generique_base_time, title, chapter_paths, output_filename, profile)
+            else:
+                concat_story_reencode(generique_video, generique_base_time, title, chapter_paths, output_filename, profile)
+            stage.add_file(output_filename)
+        check_workspace_quota()
         logger.info(f"Final video exported to: {output_filename}")
         return output_filename, None
     except Exception as e:
         logger.error(f"Error exporting the video: {e}")
         return None, str(e)
+    finally:
+        for path in temp_paths + [title_voiceover_path]:
+            if os.path.exists(path):
+                os.remove(path)
 
+@instrumented("short")
+@with_workspace
 def generate_short(request):
     logger.info("Starting chapter short generation.")
 
@@ -287,31 +528,42 @@ def generate_short(request):
     background_image_file = request.files.get('background_image')
     text = request.form.get("text")
     story_type = request.form.get('type', 'Horror')
-    output_filename = request.form.get("filename", "short_video.mp4")
+    output_filename = request.form.get("filename") or scratch_path("short_video.mp4")
 
     if not background_image_file or not text:
         return None, "Missing required parameters"
+    profile, error = get_encoding_profile(request.form.get('profile'), default="short")
+    if error:
+        return None, error
 
     # Temporarily save the background image
-    temp_image_path = "temp_background.jpg"
+    temp_image_path = scratch_path("background.jpg")
     background_image_file.save(temp_image_path)
 
-    temp_audio_path = "temp_audio.mp3"
-    voice_over_raw = AudioFileClip(get_intro_voice_over(story_type, text))
-    voice_over = voice_over_raw.copy()
-    voice_over_raw.write_audiofile(temp_audio_path)
-    alignment = align_text_with_audio(text, temp_audio_path)
+    # Captions follow the word boundaries reported during synthesis
+    with span("voice_overs") as stage:
+        voice_over_path, alignment = get_intro_voice_over(story_type, text, word_timings=True)
+        stage.add_file(voice_over_path)
+    check_workspace_quota()
+    voice_over = audio_mix.load_pcm(voice_over_path)
+    if not alignment:
+        logger.warning("No word timings from the TTS service, aligning the voice-over with MFA.")
+        with span("alignment"):
+            alignment = align_text_with_audio(text, voice_over_path)
 
     # Log alignment data
     logger.info(f"Alignment data: {alignment}")
 
-    background_sound_key = "default"
-    background_sound_path = get_horror_background_sound_path(background_sound_key) if story_type == "Horror" else get_love_background_sound_path(background_sound_key)
-    sanitized_audio_path = tempfile.mktemp(suffix=".wav")
-    sanitize_audio_file(background_sound_path, sanitized_audio_path)
-    background_sound_clip = AudioFileClip(sanitized_audio_path).volumex(0.25)
+    with span("soundtrack") as stage:
+        background_sound_key = "default"
+        background_sound_path = get_background_sound_path(story_type, background_sound_key)
+        background_sound = audio_mix.to_float_pcm(get_sound_library().load(background_sound_path))
+        background_sound *= 0.25
 
-    composite_audio_content = CompositeAudioClip([voice_over, background_sound_clip]).set_duration(voice_over.duration + 2).fx(afx.audio_fadeout, 1)
+        # Voice over on the background, 2 seconds longer than the voice, fading out over the last one
+        composite_audio_content = audio_mix.mix([(voice_over, 0), (background_sound, 0)], frames=len(voice_over) + audio_mix.frame_count(2))
+        composite_audio_content = audio_mix.audio_clip(audio_mix.fade_out(composite_audio_content, 1))
+        stage.add_bytes(composite_audio_content.array.nbytes)
 
     video_width = 1080
     video_height = 1920
@@ -330,34 +582,38 @@ def generate_short(request):
         y_center=y_center
     ).resize(height=video_height)
 
-    text_clips = []
-    for segment in alignment:
-        start_time = segment["start_time"]
-        end_time = segment["end_time"]
-        segment_text = segment["text"]
-
-        logger.info(f"Creating TextClip for word '{segment_text}' from {start_time:.2f}s to {end_time:.2f}s")
-
-        # Create a text clip for each word
-        text_clip = TextClip(
-            txt=segment_text,
-            font=chapter_font_path,
-            fontsize=default_font_size,
-            color="white",
-            stroke_color="black",
-            stroke_width=2,
-            size=(video_width, None),
-            method="caption"
-        ).set_position(("center", "center")).set_start(start_time).set_duration(end_time - start_time)
-
-        text_clips.append(text_clip)
-
-    # Combine text segments with the video clip
-    final_video = CompositeVideoClip([video_clip] + text_clips, size=(video_width, video_height)).set_audio(composite_audio_content).fx(vfx.fadeout, 1)
+    with span("captions"):
+        captions = []
+        for segment in alignment:
+            start_time = segment["start_time"]
+            end_time = segment["end_time"]
+            segment_text = segment["text"]
+
+            logger.info(f"Creating caption for word '{segment_text}' from {start_time:.2f}s to {end_time:.2f}s")
+
+            # Each distinct word is drawn once
+            sprite = get_caption_renderer().render(
+                segment_text,
+                chapter_font_path,
+                default_font_size,
+                color="white",
+                stroke_color="black",
+                stroke_width=2,
+                width=video_width,
+            )
+            captions.append((start_time, end_time, sprite))
+
+    # The background is still: compose it once, then blend only the captions showing on each frame
+    with span("background"):
+        background_frame = CompositeVideoClip([video_clip], size=(video_width, video_height)).get_frame(0)
+    final_video = CaptionTrack(background_frame, captions, composite_audio_content.duration).set_audio(composite_audio_content).fx(vfx.fadeout, 1)
 
     # Export the video
     try:
-        final_video.write_videofile(output_filename, fps=24, codec="libx264", audio_codec="aac")
+        with span("encode") as stage:
+            scale_clip(final_video, profile).write_videofile(output_filename, **write_videofile_args(profile))
+            stage.add_file(output_filename)
+        check_workspace_quota()
         return output_filename, None
     except Exception as e:
         logger.error(f"Error exporting the video: {e}")
@@ -365,86 +621,20 @@ def generate_short(request):
     finally:
         # Clean up temporary files
         os.remove(temp_image_path)
-        os.remove(temp_audio_path)
-        os.remove(sanitized_audio_path)
 
 def align_text_with_audio(text, audio_path, global_offset=0.0):
     """
     Utilise Montreal Forced Aligner (MFA) pour aligner un texte avec un fichier audio.
 
+    L'alignement est fait par le worker persistant de services.alignment_service,
+    qui garde les modèles chargés et met les résultats en cache.
+
     Args:
         text (str): Texte à aligner.
-        audio_path (str): Chemin vers le fichier audio (WAV 16kHz mono).
+        audio_path (str): Chemin vers le fichier audio.
         global_offset (float): Décalage global à appliquer à tous les timecodes (en secondes).
 
     Returns:
         list: Liste de dictionnaires contenant les mots et leurs timecodes.
     """
-    # Prepare temporary paths
-    temp_dir = tempfile.mkdtemp()
-    temp_text_path = os.path.join(temp_dir, "input.txt")
-    temp_audio_path = os.path.join(temp_dir, "input.wav")
-    output_dir = os.path.join(temp_dir, "aligned")
-
-    # Save the text in a temporary file
-    with open(temp_text_path, "w") as f:
-        f.write(text)
-
-    # Copy or convert the audio to the required format
-    os.system(f"cp {audio_path} {temp_audio_path}")
-
-    # Paths for MFA models
-    mfa_path = "mfa"  # Ensure mfa is installed and accessible via command line
-    model_path = "english_us_arpa"  # Acoustic model
-    lexicon_path = "english_us_arpa"  # Phonetic lexicon
-
-    # MFA command for alignment
-    command = [
-        mfa_path,
-        "align",
-        temp_dir,  # Directory containing audio and text files
-        lexicon_path,  # Phonetic dictionary
-        model_path,  # Acoustic model
-        output_dir,  # Output directory
-        "--beam", "200",
-        "--retry_beam", "800",
-        "--output_format", "json",
-        "--single_speaker", "true"
-    ]
-
-    # Execute MFA
-    try:
-        subprocess.run(command, check=True)
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Montreal Forced Aligner failed: {e}")
-
-    # Load aligned results
-    aligned_json_path = os.path.join(output_dir, "input.json")
-    if not os.path.exists(aligned_json_path):
-        raise RuntimeError("Alignment file not generated.")
-
-    with open(aligned_json_path, "r") as f:
-        alignment_data = json.load(f)
-
-    # Clean up temporary files
-    os.remove(temp_text_path)
-    os.remove(temp_audio_path)
-    os.remove(temp_dir + '/aligned/input.json')
-    os.rmdir(temp_dir + '/aligned')
-    os.rmdir(temp_dir)
-
-    # Extract word alignments
-    aligned_segments = []
-    words_data = alignment_data["tiers"]["words"]["entries"]  # Access aligned words
-    for word_entry in words_data:
-        start_time = word_entry[0] + global_offset
-        end_time = word_entry[1] + global_offset
-        text = word_entry[2]
-        if text:  # Ensure there is text
-            aligned_segments.append({
-                "start_time": max(0, start_time),
-                "end_time": max(0, end_time),
-                "text": text
-            })
-
-    return aligned_segments
+    return align_audio_file(text, audio_path, global_offset)
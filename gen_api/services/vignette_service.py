@@ -0,0 +1,118 @@
+import os
+import hashlib
+import threading
+from functools import lru_cache
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+DEFAULT_INTENSITY = 0.45
+DEFAULT_BLUR_STRENGTH = 1251
+
+@lru_cache(maxsize=16)
+def get_vignette_mask(width, height, intensity=DEFAULT_INTENSITY, blur_strength=DEFAULT_BLUR_STRENGTH, scale=None):
+    """
+    Blurred elliptical mask in [0, 1], shaped (height, width, 1) for broadcasting.
+
+    The blur of a full-resolution mask with a 1251px kernel takes seconds, so
+    it is computed on a copy downscaled by `scale` (VIGNETTE_MASK_SCALE,
+    default 4) with an equivalent sigma and upscaled back. At 720p the result
+    stays within 2/255 of the full-resolution blur; use a scale of 1 for the
+    exact one. Masks are cached per size and parameters and returned read-only.
+    """
+    if scale is None:
+        scale = int(os.environ.get('VIGNETTE_MASK_SCALE', 4))
+
+    # Draw a centered white ellipse on a black mask the size of the image
+    mask = np.zeros((height, width), dtype=np.uint8)
+    center = (width // 2, height // 2)
+    axes = (int(width * intensity), int(height * intensity))
+    cv2.ellipse(mask, center, axes, 0, 0, 360, 255, -1)
+
+    if scale > 1:
+        # Same sigma OpenCV derives from the kernel size when sigma is 0
+        sigma = 0.3 * ((blur_strength - 1) * 0.5 - 1) + 0.8
+        small = cv2.resize(mask.astype(np.float32), ((width + scale - 1) // scale, (height + scale - 1) // scale), interpolation=cv2.INTER_AREA)
+        small = cv2.GaussianBlur(small, (int(blur_strength // scale) | 1,) * 2, sigma / scale)
+        blurred = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+    else:
+        blurred = cv2.GaussianBlur(mask, (blur_strength, blur_strength), 0).astype(np.float32)
+
+    mask = (blurred / 255.0).astype(np.float32)[:, :, np.newaxis]
+    mask.setflags(write=False)
+    return mask
+
+class VignetteEngine:
+    """
+    Applies the vignette to in-memory images and memoizes the results.
+
+    Results are keyed on a hash of the pixels plus the vignette parameters, so
+    a chapter background and the thumbnail made from the same image share the
+    work. Returned arrays are read-only; copy them before drawing on them.
+
+    Args:
+        max_results (int): Number of vignetted images to keep, 0 to disable the memo
+    """
+
+    def __init__(self, max_results=8):
+        self.max_results = max_results
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def image_key(image, intensity, blur_strength):
+        digest = hashlib.sha1(np.ascontiguousarray(image).data).hexdigest()
+        return (digest, image.shape, image.dtype.str, intensity, blur_strength)
+
+    def apply(self, image, intensity=DEFAULT_INTENSITY, blur_strength=DEFAULT_BLUR_STRENGTH):
+        """
+        Darken the edges of an image.
+
+        Args:
+            image (np.ndarray): uint8 image shaped (height, width) or (height, width, channels)
+            intensity (float): Size of the bright ellipse relative to the image (0.0-1.0)
+            blur_strength (int): Gaussian kernel size of the vignette edges (odd)
+
+        Returns:
+            np.ndarray: Vignetted uint8 image with the same shape
+        """
+        key = self.image_key(image, intensity, blur_strength)
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        rows, cols = image.shape[:2]
+        mask = get_vignette_mask(cols, rows, intensity, blur_strength)
+        if image.ndim == 2:
+            mask = mask[:, :, 0]
+        result = (image * mask).astype(np.uint8)
+        result.setflags(write=False)
+
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._results), 'hits': self.hits, 'misses': self.misses}
+
+_vignette_engine = VignetteEngine(max_results=int(os.environ.get('VIGNETTE_CACHE_SIZE', 8)))
+
+def get_vignette_engine():
+    return _vignette_engine
+
+def apply_vignette_array(image, intensity=DEFAULT_INTENSITY, blur_strength=DEFAULT_BLUR_STRENGTH):
+    """Vignette an in-memory uint8 image through the shared engine."""
+    return _vignette_engine.apply(image, intensity, blur_strength)
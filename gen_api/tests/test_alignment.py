@@ -0,0 +1,119 @@
+"""
+Tests for the persistent forced-alignment worker.
+"""
+import threading
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import numpy as np
+import pytest
+from pedalboard.io import AudioFile
+from services import alignment_service
+from services.alignment_service import AlignmentWorker, FallbackBackend, MfaOnlineBackend, align_audio_file, get_alignment_cache
+
+class FakeAligner:
+    """One word per 0.5 seconds of audio, in text order."""
+    loads = 0
+
+    def __init__(self, workdir):
+        FakeAligner.loads += 1
+        self.calls = 0
+        self.thread = threading.current_thread().name
+
+    def align(self, text, samples, samplerate):
+        self.calls += 1
+        return [
+            {'start_time': i * 0.5, 'end_time': i * 0.5 + 0.4, 'text': word}
+            for i, word in enumerate(text.split())
+        ]
+
+@pytest.fixture
+def worker():
+    FakeAligner.loads = 0
+    worker = AlignmentWorker(loader=FakeAligner, cache=get_alignment_cache())
+    yield worker
+    worker.shutdown()
+
+def samples(seconds, value=0.1):
+    return np.full(int(16000 * seconds), value, dtype=np.float32)
+
+def test_aligner_is_loaded_once(worker):
+    futures = [worker.submit(f'word {i}', samples(1), 16000) for i in range(3)]
+    assert [f.result(5)[1]['text'] for f in futures] == ['0', '1', '2']
+    assert FakeAligner.loads == 1
+    assert worker.backend.calls == 3
+    assert worker.backend.thread == 'alignment-worker'
+    assert worker.stats()['jobs'] == 3
+
+def test_alignments_are_cached_by_text_and_audio(worker):
+    first = worker.align('the old house', samples(2), 16000)
+    assert worker.align('the old house', samples(2), 16000) == first
+    assert worker.backend.calls == 1
+
+    worker.align('the old house', samples(2, value=0.2), 16000)
+    worker.align('the new house', samples(2), 16000)
+    assert worker.backend.calls == 3
+
+def test_evicted_alignment_is_aligned_again(worker):
+    worker.align('the old house', samples(2), 16000)
+    worker.cache.clear()
+    assert worker.align('the old house', samples(2), 16000)[0]['text'] == 'the'
+    assert worker.backend.calls == 2
+
+def test_errors_reach_the_caller(worker):
+    def fail(text, samples, samplerate):
+        raise RuntimeError('Alignment file not generated.')
+    worker.align('warm up', samples(1), 16000)
+    worker.backend.align = fail
+    with pytest.raises(RuntimeError, match='not generated'):
+        worker.align('another text', samples(1), 16000)
+    # The worker keeps serving jobs
+    assert worker.submit('x', samples(1), 16000).exception(5) is not None
+
+def test_align_audio_file(tmp_path, monkeypatch, worker):
+    """Files are decoded to mono 16 kHz and the offset is applied."""
+    path = str(tmp_path / 'voice.wav')
+    with AudioFile(path, 'w', 24000, 2) as f:
+        f.write(np.zeros((2, 24000), dtype=np.float32))
+    received = {}
+    def align(text, samples, samplerate, timeout=None):
+        received.update(samples=samples, samplerate=samplerate)
+        return [{'start_time': 0.2, 'end_time': 0.4, 'text': 'Hello'}]
+    monkeypatch.setattr(worker, 'align', align)
+    monkeypatch.setattr(alignment_service, '_alignment_worker', worker)
+
+    words = align_audio_file('Hello', path, global_offset=-0.3)
+    assert words == [{'start_time': 0, 'end_time': pytest.approx(0.1), 'text': 'Hello'}]
+    assert received['samplerate'] == 16000
+    assert received['samples'].ndim == 1 and abs(len(received['samples']) - 16000) < 100
+
+def test_online_backend_captions_the_words_as_written(tmp_path):
+    """The decoder sees lowercase dictionary words, the captions keep the original text."""
+    backend = MfaOnlineBackend.__new__(MfaOnlineBackend)
+    backend.workdir = str(tmp_path)
+    backend.lexicon_compiler = SimpleNamespace(
+        oov_word='<unk>', word_table=SimpleNamespace(find=lambda word: 0 if word in ('the', 'house') else -1))
+    backend.acoustic_model = MagicMock()
+    backend._cmvn_computer = MagicMock()
+    backend._segment = lambda *args: args
+    transcripts = []
+    backend._utterance = lambda segment, transcript: transcripts.append(transcript) or MagicMock()
+    labels = ['', 'the', '<unk>', '', 'house']
+    backend._align_utterance = lambda *args, **kwargs: SimpleNamespace(word_intervals=[
+        SimpleNamespace(begin=i * 0.5, end=i * 0.5 + 0.4, label=label) for i, label in enumerate(labels)
+    ])
+
+    words = backend.align("The Blackwood house.", samples(2), 16000)
+    assert transcripts == ['the <unk> house']
+    assert [word['text'] for word in words] == ['The', 'Blackwood', 'house']
+    assert [word['start_time'] for word in words] == [0.5, 1.0, 2.0]
+
+def test_fallback_backend_switches_after_the_first_failure(tmp_path):
+    primary = MagicMock()
+    primary.align.side_effect = RuntimeError('online API mismatch')
+    FakeAligner.loads = 0
+    backend = FallbackBackend(primary, FakeAligner, str(tmp_path))
+
+    assert backend.align('the old house', samples(2), 16000)[2]['text'] == 'house'
+    backend.align('the old house', samples(2), 16000)
+    assert primary.align.call_count == 1
+    assert FakeAligner.loads == 1
@@ -1,7 +1,7 @@
 import pytest
 import os
 import numpy as np
-from helpers.audio_helpers import apply_equalization, slow_audio
+from helpers.audio_helpers import apply_equalization, slow_audio, build_equalizer, equalize_audio, equalize_blocks
 from pedalboard.io import AudioFile
 
 @pytest.fixture
@@ -64,6 +64,38 @@ def test_apply_equalization_with_invalid_output():
     # Clean up
     os.remove("input.wav")
 
+def test_equalize_audio_in_blocks_matches_whole_buffer():
+    """Filter state carries across blocks, so block boundaries leave no trace."""
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, (2, 10000)).astype(np.float32)
+    expected = build_equalizer()(audio * 0.95, 44100)
+    np.testing.assert_allclose(equalize_audio(audio, 44100, block_frames=999), expected, atol=1e-6)
+    # A following stream starts from a clean state
+    np.testing.assert_allclose(equalize_audio(audio, 44100, block_frames=4096), expected, atol=1e-6)
+
+def test_equalize_blocks_keeps_block_shapes():
+    blocks = [np.ones((2, n), dtype=np.float32) for n in (10, 0, 25)]
+    assert [block.shape for block in equalize_blocks(blocks, 44100)] == [(2, 10), (2, 0), (2, 25)]
+
+def test_apply_equalization_in_place_streams_blocks(sample_audio_file):
+    with AudioFile(sample_audio_file) as f:
+        audio = f.read(f.frames)
+    apply_equalization(sample_audio_file, sample_audio_file, block_frames=1000)
+
+    with AudioFile(sample_audio_file) as f:
+        processed = f.read(f.frames)
+    assert processed.shape == audio.shape
+    # The 16-bit file clips the boosted full-scale sine
+    np.testing.assert_allclose(processed, np.clip(equalize_audio(audio, 44100), -1, 1), atol=1e-3)
+    # No temporary output is left behind
+    assert os.listdir(os.path.dirname(sample_audio_file)) == ["input.wav"]
+
+def test_apply_equalization_keeps_output_on_failure(tmp_path, output_audio_path):
+    with open(output_audio_path, "wb") as f:
+        f.write(b"previous")
+    apply_equalization(str(tmp_path / "missing.wav"), output_audio_path)
+    with open(output_audio_path, "rb") as f:
+        assert f.read() == b"previous"
+
 def test_slow_audio(sample_audio_file, output_audio_path):
     """Test the slow_audio function"""
     # Slow down the audio
@@ -0,0 +1,83 @@
+"""
+Tests for the NumPy soundtrack mixing helpers.
+"""
+import numpy as np
+from moviepy.editor import afx, concatenate_audioclips, CompositeAudioClip
+from moviepy.audio.AudioClip import AudioArrayClip
+from pedalboard.io import AudioFile
+from helpers import audio_mix
+from services.audio_service import loop_audio
+
+RATE = 1000
+
+def tone(seconds, hz=3, phase=0.0):
+    """Slow stereo sine, so moviepy's float time rounding stays within tolerance."""
+    t = np.arange(int(seconds * RATE)) / RATE
+    left = 0.5 * np.sin(2 * np.pi * hz * t + phase)
+    return np.stack([left, -left], axis=1).astype(np.float32)
+
+def moviepy_samples(clip):
+    return clip.to_soundarray(fps=RATE, quantize=False)
+
+def test_loop_matches_moviepy():
+    """Tiled loop with 2 second fades, as the concatenate_audioclips version did."""
+    bed = tone(1.5)
+    clip = AudioArrayClip(bed, fps=RATE)
+    expected = concatenate_audioclips([clip] * 4).set_duration(5)
+    expected = afx.audio_fadeout(afx.audio_fadein(expected, 2), 2)
+
+    looped = loop_audio(bed, 5, samplerate=RATE)
+    assert looped.shape == (5000, 2)
+    # The loop restarts mid-wave, allow for one sample of timing difference there
+    np.testing.assert_allclose(looped, moviepy_samples(expected), atol=0.03)
+
+def test_loop_into_a_buffer_in_place():
+    """The soundtrack body is looped, scaled and faded inside one preallocated buffer."""
+    bed = tone(1.5)
+    soundtrack = audio_mix.buffer(7000)
+    body = soundtrack[2000:]
+    assert loop_audio(bed, 5, samplerate=RATE, gain=0.5, out=body) is body
+    np.testing.assert_allclose(body, loop_audio(bed, 5, samplerate=RATE) * 0.5, atol=1e-6)
+    assert not soundtrack[:2000].any()
+
+    audio_mix.mix_into(body, [(np.ones((100, 2), np.float32), 2)], samplerate=RATE)
+    np.testing.assert_allclose(soundtrack[4000:4100], loop_audio(bed, 5, samplerate=RATE)[2000:2100] * 0.5 + 1, atol=1e-6)
+
+def test_mix_matches_composite_audio_clip():
+    voice, bed = tone(2, hz=2), tone(3, hz=1, phase=1.0)
+    expected = CompositeAudioClip([
+        AudioArrayClip(bed, fps=RATE),
+        AudioArrayClip(voice, fps=RATE).set_start(0.5),
+    ]).set_duration(3)
+    mixed = audio_mix.mix([(bed, 0), (voice, 0.5)], frames=3000, samplerate=RATE)
+    # moviepy's composite returns silence for its very first sample
+    np.testing.assert_allclose(mixed[1:], moviepy_samples(expected)[1:], atol=0.03)
+
+def test_mix_pads_and_trims():
+    mixed = audio_mix.mix([(np.ones((10, 2), np.float32), 0), (np.ones((10, 2), np.float32), 0.005)], samplerate=RATE)
+    assert len(mixed) == 15
+    np.testing.assert_array_equal(mixed[:, 0], [1] * 5 + [2] * 5 + [1] * 5)
+    assert len(audio_mix.mix([(tone(1), 0)], frames=100, samplerate=RATE)) == 100
+
+def test_fade_out_ends_silent():
+    faded = audio_mix.fade_out(np.ones((1000, 2), np.float32), 0.5, samplerate=RATE)
+    assert faded[0, 0] == 1 and faded[499, 0] == 1
+    assert faded[-1, 0] < 0.01
+    np.testing.assert_allclose(faded[500:, 0], np.arange(500, 0, -1) / 500)
+
+def test_int16_and_mono_sources():
+    pcm = np.array([[16384], [-32768]], dtype=np.int16)
+    np.testing.assert_allclose(audio_mix.to_float_pcm(pcm), [[0.5, 0.5], [-1, -1]])
+
+def test_write_and_load_round_trip(tmp_path):
+    audio = tone(1) * 3
+    path = str(tmp_path / 'mix.wav')
+    audio_mix.write_pcm(path, audio, samplerate=RATE)
+    loaded = audio_mix.load_pcm(path, samplerate=RATE)
+    np.testing.assert_allclose(loaded, np.clip(audio, -1, 1), atol=1e-4)
+    with AudioFile(path) as f:
+        assert f.samplerate == RATE and f.num_channels == 2
+
+def test_clip_pcm_reuses_mixed_buffers():
+    audio = tone(1)
+    np.testing.assert_array_equal(audio_mix.clip_pcm(audio_mix.audio_clip(audio, RATE), RATE), audio)
@@ -0,0 +1,68 @@
+"""
+Tests for the stage benchmark runner.
+"""
+import json
+import pytest
+from benchmarks import run, stages
+from benchmarks.stages import Benchmark
+from services.vignette_service import get_vignette_engine
+
+def results(**medians):
+    return {'benchmarks': {name: {'median': median} for name, median in medians.items()}}
+
+@pytest.fixture
+def fake_benchmarks(monkeypatch):
+    calls = []
+    def setup(workdir):
+        return lambda: calls.append(workdir)
+    monkeypatch.setattr(run, 'BENCHMARKS', {
+        'fast': Benchmark('fast', setup, repeat=3, requires_ffmpeg=False),
+        'encode': Benchmark('encode', setup, repeat=1, requires_ffmpeg=True),
+    })
+    monkeypatch.setenv('FFMPEG_BINARY', 'missing-ffmpeg-binary')
+    return calls
+
+def test_compare_flags_stages_over_tolerance():
+    baseline = results(a=1.0, b=1.0, c=1.0)
+    current = results(a=1.2, b=1.3, d=5.0)
+    current['benchmarks']['c'] = {'skipped': 'ffmpeg is not installed'}
+    regressions = run.compare(current, baseline, tolerance=0.25)
+    assert [(r['name'], round(r['ratio'], 2)) for r in regressions] == [('b', 1.3)]
+
+def test_runs_stages_in_workspaces_and_skips_without_ffmpeg(fake_benchmarks):
+    document = run.run_benchmarks(warmup=1)
+    assert document['benchmarks']['encode'] == {'skipped': 'ffmpeg is not installed'}
+    timing = document['benchmarks']['fast']
+    assert timing['runs'] == 3 and timing['min'] <= timing['median'] <= timing['max']
+    # One warmup and three timed runs, in the stage's workspace
+    assert len(fake_benchmarks) == 4 and 'bench-fast-' in fake_benchmarks[0]
+    assert document['machine']['cpus']
+
+def test_unknown_stage_is_rejected(fake_benchmarks):
+    with pytest.raises(ValueError):
+        run.run_benchmarks(['nope'])
+
+def test_main_saves_and_compares_with_the_baseline(tmp_path, fake_benchmarks, monkeypatch):
+    baseline_path = str(tmp_path / 'baseline.json')
+    output_path = str(tmp_path / 'results.json')
+    assert run.main(['--baseline', baseline_path, '--save-baseline']) == 0
+    with open(baseline_path) as f:
+        assert 'fast' in json.load(f)['benchmarks']
+
+    assert run.main(['--baseline', baseline_path, '--output', output_path]) == 0
+    with open(output_path) as f:
+        assert json.load(f)['version'] == run.RESULTS_VERSION
+
+    # Any slowdown over the baseline fails the run
+    monkeypatch.setattr(run, 'compare', lambda *args: [{'name': 'fast', 'baseline': 1.0, 'current': 2.0, 'ratio': 2.0}])
+    assert run.main(['--baseline', baseline_path]) == 1
+
+def test_vignette_stage_runs():
+    engine = get_vignette_engine()
+    hits, max_results = engine.hits, engine.max_results
+    document = run.run_benchmarks(['vignette'], repeat=2, warmup=1)
+    assert document['benchmarks']['vignette']['runs'] == 2
+    # Every run vignettes the image, instead of returning the memoized result
+    assert engine.hits == hits
+    assert engine.max_results == max_results
+    assert set(stages.BENCHMARKS) >= {'vignette', 'equalization', 'loop_audio', 'sanitize_audio', 'thumbnail', 'chapter_encode', 'narration'}
@@ -0,0 +1,86 @@
+"""
+Tests for the in-process caption renderer.
+"""
+import numpy as np
+import pytest
+from moviepy.editor import CompositeVideoClip, ImageClip
+from services.caption_service import CaptionRenderer, CaptionSprite, CaptionTrack, load_font, wrap_caption
+
+FONT_PATH = "assets/fonts/Caveat_Brush/CaveatBrush-Regular.ttf"
+
+@pytest.fixture
+def renderer():
+    return CaptionRenderer(max_sprites=2)
+
+def test_caption_is_centered_in_the_width(renderer):
+    sprite = renderer.render("Hello", FONT_PATH, 100, width=1080)
+    width, height = sprite.size
+    assert width == 1080
+    assert sprite.alpha.shape == (height, 1080)
+    columns = np.nonzero(sprite.alpha.max(axis=0))[0]
+    # Ink is centered within a few pixels
+    assert abs((columns[0] + columns[-1]) / 2 - 540) < 5
+    # White fill inside a black stroke
+    assert sprite.rgb[sprite.alpha > 0.99].max() == 255
+    assert sprite.rgb[sprite.alpha > 0.99].min() == 0
+
+def test_long_captions_wrap_to_the_width(renderer):
+    font = load_font(FONT_PATH, 100)
+    text = "the house at the end of the road was never empty"
+    lines = wrap_caption(text, font, 1080, 2)
+    assert len(lines) > 1
+    assert " ".join(lines) == text
+    assert all(font.getlength(line) + 4 <= 1080 for line in lines)
+
+    one_line = renderer.render("road", FONT_PATH, 100, width=1080)
+    wrapped = renderer.render(text, FONT_PATH, 100, width=1080)
+    assert wrapped.size[1] > len(lines) * 0.9 * one_line.size[1]
+
+def test_sprites_are_cached(renderer):
+    first = renderer.render("Hello", FONT_PATH, 100, width=1080)
+    assert renderer.render("Hello", FONT_PATH, 100, width=1080) is first
+    assert renderer.render("Hello", FONT_PATH, 100, stroke_width=4, width=1080) is not first
+    renderer.render("World", FONT_PATH, 100, width=1080)
+    # Least recently used sprite evicted
+    assert renderer.render("Hello", FONT_PATH, 100, width=1080) is not first
+    assert renderer.stats() == {'entries': 2, 'hits': 1, 'misses': 4}
+    with pytest.raises(ValueError):
+        first.rgb[0, 0, 0] = 1
+
+def test_clip_carries_the_mask(renderer):
+    sprite = renderer.render("Hello", FONT_PATH, 100, width=1080)
+    clip = sprite.clip().set_duration(1)
+    assert clip.size == sprite.size
+    assert clip.mask is not None
+    np.testing.assert_array_equal(clip.get_frame(0), sprite.rgb)
+    np.testing.assert_array_equal(clip.mask.get_frame(0), sprite.alpha)
+
+def make_sprite(value, size=(4, 2)):
+    rgb = np.full((size[1], size[0], 3), value, dtype=np.uint8)
+    return CaptionSprite(rgb, np.ones((size[1], size[0]), dtype=np.float32))
+
+def test_track_finds_active_captions():
+    captions = [(i * 0.5, i * 0.5 + 0.4, make_sprite(i)) for i in range(200)]
+    # A long caption spanning many words
+    captions.append((10.0, 30.0, make_sprite(255)))
+    track = CaptionTrack(np.zeros((10, 10, 3), dtype=np.uint8), captions[::-1], duration=100)
+    assert track.active(0.2) == [0]
+    assert track.active(0.45) == []
+    assert [track.captions[i][0] for i in track.active(20.1)] == [10.0, 20.0]
+    assert track.active(-1) == [] and track.active(99.9) == []
+
+def test_track_blends_like_composite_video_clip():
+    """Same pixels as compositing the caption clips with moviepy."""
+    background = (np.arange(40 * 60 * 3) % 251).astype(np.uint8).reshape(40, 60, 3)
+    renderer = CaptionRenderer()
+    sprite = renderer.render("Hi", FONT_PATH, 20, width=50)
+    track = CaptionTrack(background, [(1.0, 2.0, sprite)], duration=3)
+
+    composite = CompositeVideoClip([
+        ImageClip(background).set_duration(3),
+        sprite.clip().set_position(("center", "center")).set_start(1.0).set_duration(1.0),
+    ], size=(60, 40))
+    np.testing.assert_array_equal(track.get_frame(0.5), background)
+    diff = np.abs(track.get_frame(1.5).astype(int) - composite.get_frame(1.5).astype(int))
+    assert diff.max() <= 1
+    assert (track.get_frame(1.5) != background).any()
@@ -0,0 +1,48 @@
+"""
+Tests for the named encoding profiles.
+"""
+import pytest
+from helpers.encoding_profiles import get_encoding_profile, scaled_size, write_videofile_args, ffmpeg_video_args
+
+def test_final_profile_matches_chapter_settings():
+    """The default profile keeps the historical chapter encode."""
+    profile, error = get_encoding_profile(None)
+    assert error is None
+    assert profile['name'] == 'final'
+    args = write_videofile_args(profile)
+    assert (args['fps'], args['bitrate'], args['preset'], args['codec']) == (24, '8000k', 'slow', 'libx264')
+    assert args['threads'] >= 1
+
+def test_unknown_profile_is_an_error():
+    profile, error = get_encoding_profile('cinema')
+    assert profile is None
+    assert error == 'Invalid profile: cinema'
+
+@pytest.mark.parametrize('size, expected', [
+    ((1920, 1080), (640, 360)),
+    ((1080, 1920), (202, 360)),
+    ((320, 180), (320, 180)),
+])
+def test_preview_size_is_even(size, expected):
+    profile, _ = get_encoding_profile('preview')
+    assert scaled_size(*size, profile) == expected
+
+def test_explicit_threads_and_crf(monkeypatch):
+    monkeypatch.setenv('ENCODE_THREADS', '3')
+    archive, _ = get_encoding_profile('archive')
+    args = ffmpeg_video_args(archive)
+    assert args[args.index('-threads') + 1] == 3
+    assert args[args.index('-crf') + 1] == 14
+    assert '-b:v' not in args
+
+    preview, _ = get_encoding_profile('preview')
+    assert write_videofile_args(preview)['threads'] == 2
+
+def test_chapter_route_rejects_unknown_profile(client):
+    response = client.post('/generate-chapter', data={
+        'chapter': 'Chapter 1',
+        'content': 'Once upon a time.',
+        'profile': 'cinema',
+    })
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid profile: cinema'
@@ -0,0 +1,75 @@
+"""
+Tests for batched multi-prompt image generation.
+"""
+import io
+import json
+import zipfile
+from PIL import Image
+from services.image_service import plan_image_batches, parse_image_items, DEFAULT_SEED
+
+def test_batches_group_compatible_items():
+    """Items sharing a size and step count share calls, capped by the batch size."""
+    items, error = parse_image_items({'items': [
+        {'prompt': 'a', 'width': 512, 'height': 512},
+        {'prompt': 'b', 'width': 1280, 'height': 720},
+        {'prompt': 'c', 'width': 512, 'height': 512},
+        {'prompt': 'd', 'width': 512, 'height': 512},
+        {'prompt': 'e', 'width': 512, 'height': 512, 'num_inference_steps': 4},
+    ]})
+    assert error is None
+    batches = plan_image_batches(items, lambda width, height: 2)
+    assert batches == [[0, 2], [3], [1], [4]]
+
+def test_items_are_validated():
+    assert parse_image_items({'items': []}) == (None, 'No items provided')
+    assert parse_image_items({'items': [{'width': 10}]}) == (None, 'Item 0 has no prompt')
+    assert parse_image_items({'items': [{'prompt': 'a', 'seed': 'x'}]})[1] is not None
+
+def test_missing_seeds_use_the_default():
+    items, _ = parse_image_items({'items': [{'prompt': 'a', 'seed': 7}, {'prompt': 'b'}]})
+    assert items[0]['seed'] == 7
+    assert items[1]['seed'] == DEFAULT_SEED
+
+def test_generate_images_route_returns_zip(client):
+    response = client.post('/generate-images', json={'items': [
+        {'prompt': 'a castle', 'width': 64, 'height': 32, 'seed': 1, 'filename': 'castle.png'},
+        {'prompt': 'a forest', 'width': 32, 'height': 32},
+    ]})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        manifest = json.loads(archive.read('manifest.json'))
+        assert [entry['filename'] for entry in manifest] == ['castle.png', 'image_001.png']
+        assert manifest[0]['seed'] == 1
+        with Image.open(io.BytesIO(archive.read('castle.png'))) as image:
+            assert image.size == (64, 32)
+
+def test_generate_images_route_rejects_bad_items(client):
+    response = client.post('/generate-images', json={'items': [{'width': 64}]})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Item 0 has no prompt'
+
+def test_pipeline_is_called_once_per_batch(app, monkeypatch):
+    """Each batch is one pipeline call with one seeded generator per prompt."""
+    from services import model_manager
+    from services.model_manager import ModelManager
+
+    calls = []
+
+    def fake_pipe(prompt, negative_prompt, num_inference_steps, width, height, generator):
+        calls.append({'prompt': prompt, 'seeds': [g.initial_seed() for g in generator], 'size': (width, height)})
+        return type('Result', (), {'images': [Image.new('RGB', (width, height)) for _ in prompt]})()
+
+    manager = ModelManager('model', device='cpu', loader=lambda model_id, device: fake_pipe)
+    monkeypatch.setattr(model_manager, '_model_manager', manager)
+    monkeypatch.setenv('DIFFUSION_MAX_BATCH', '2')
+    app.config['TESTING'] = False
+
+    response = app.test_client().post('/generate-images', json={'items': [
+        {'prompt': p, 'width': 32, 'height': 32, 'seed': i} for i, p in enumerate('abc')
+    ]})
+    assert response.status_code == 200
+    assert calls == [
+        {'prompt': ['a', 'b'], 'seeds': [0, 1], 'size': (32, 32)},
+        {'prompt': ['c'], 'seeds': [2], 'size': (32, 32)},
+    ]
@@ -0,0 +1,108 @@
+"""
+Tests for seeded image generation and the image result cache.
+"""
+import io
+import json
+import zipfile
+import pytest
+from PIL import Image
+from helpers import metrics
+from services import model_manager
+from services.model_manager import ModelManager
+
+class FakePipeline:
+    """Paints the image with a color derived from the generator seed."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, prompt, negative_prompt, num_inference_steps, width, height, generator):
+        generators = generator if isinstance(generator, list) else [generator]
+        self.calls.append([g.initial_seed() for g in generators])
+        return type('Result', (), {'images': [
+            Image.new('RGB', (width, height), (g.initial_seed() % 256, 0, 0)) for g in generators
+        ]})()
+
+@pytest.fixture
+def pipe(app, monkeypatch):
+    pipe = FakePipeline()
+    manager = ModelManager('model', device='cpu', loader=lambda model_id, device: pipe)
+    monkeypatch.setattr(model_manager, '_model_manager', manager)
+    app.config['TESTING'] = False
+    return pipe
+
+def post_image(client, tmp_path, **fields):
+    data = dict({'prompt': 'a castle', 'width': 32, 'height': 32, 'filename': str(tmp_path / 'out.png')}, **fields)
+    return client.post('/generate-image', json=data)
+
+def test_identical_requests_hit_the_cache(client, pipe, tmp_path):
+    first = post_image(client, tmp_path, seed=7)
+    assert first.status_code == 200
+    model_manager._model_manager.unload()
+
+    second = post_image(client, tmp_path, seed=7)
+    assert second.data == first.data
+    assert pipe.calls == [[7]]
+    # Served without loading the model again
+    assert model_manager._model_manager.status()['loads'] == 1
+
+    post_image(client, tmp_path, seed=8)
+    post_image(client, tmp_path, seed=8, num_inference_steps=4)
+    assert pipe.calls == [[7], [8], [8]]
+
+def test_model_load_is_timed_only_when_the_model_loads(client, pipe, tmp_path):
+    loads = metrics.STAGE_DURATION.count(pipeline='image', stage='model_load')
+    inferences = metrics.STAGE_DURATION.count(pipeline='image', stage='inference')
+    post_image(client, tmp_path, seed=3)
+    post_image(client, tmp_path, seed=4)
+    assert metrics.STAGE_DURATION.count(pipeline='image', stage='model_load') == loads + 1
+    assert metrics.STAGE_DURATION.count(pipeline='image', stage='inference') == inferences + 2
+
+def test_default_seed_is_fixed(client, pipe, tmp_path):
+    post_image(client, tmp_path)
+    post_image(client, tmp_path, prompt='a forest')
+    assert pipe.calls == [[42], [42]]
+
+@pytest.mark.parametrize('seed', [None, 'abc'])
+def test_invalid_seed_is_rejected(client, pipe, tmp_path, seed):
+    response = post_image(client, tmp_path, seed=seed)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid seed'}
+    assert pipe.calls == []
+
+def test_batch_only_generates_missing_items(client, pipe, tmp_path):
+    post_image(client, tmp_path, seed=1)
+    hits = metrics.CACHE_LOOKUPS.value(pipeline='image_batch', cache='images', result='hit')
+    misses = metrics.CACHE_LOOKUPS.value(pipeline='image_batch', cache='images', result='miss')
+    response = client.post('/generate-images', json={'items': [
+        {'prompt': 'a castle', 'width': 32, 'height': 32, 'seed': 1},
+        {'prompt': 'a castle', 'width': 32, 'height': 32, 'seed': 2},
+    ]})
+    assert response.status_code == 200
+    assert pipe.calls == [[1], [2]]
+    assert metrics.CACHE_LOOKUPS.value(pipeline='image_batch', cache='images', result='hit') == hits + 1
+    assert metrics.CACHE_LOOKUPS.value(pipeline='image_batch', cache='images', result='miss') == misses + 1
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert [entry['seed'] for entry in json.loads(archive.read('manifest.json'))] == [1, 2]
+        with Image.open(io.BytesIO(archive.read('image_000.png'))) as image:
+            assert image.getpixel((0, 0)) == (1, 0, 0)
+
+def test_batch_keeps_cached_items_evicted_while_it_runs(client, pipe, tmp_path, monkeypatch):
+    # A zero budget keeps only the last image stored: the new one evicts the cached one
+    monkeypatch.setenv('IMAGE_CACHE_MAX_MB', '0')
+    post_image(client, tmp_path, seed=1)
+    response = client.post('/generate-images', json={'items': [
+        {'prompt': 'a castle', 'width': 32, 'height': 32, 'seed': 1},
+        {'prompt': 'a castle', 'width': 32, 'height': 32, 'seed': 2},
+    ]})
+    assert response.status_code == 200
+    assert pipe.calls == [[1], [2]]
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        with Image.open(io.BytesIO(archive.read('image_000.png'))) as image:
+            assert image.getpixel((0, 0)) == (1, 0, 0)
+
+def test_cache_can_be_disabled(client, pipe, tmp_path, monkeypatch):
+    monkeypatch.setenv('IMAGE_CACHE_ENABLED', 'False')
+    post_image(client, tmp_path)
+    post_image(client, tmp_path)
+    assert pipe.calls == [[42], [42]]
@@ -0,0 +1,81 @@
+"""
+Tests for the asynchronous render job routes.
+"""
+import io
+import threading
+import pytest
+from unittest.mock import patch
+from controllers.jobs_controller import JOB_KINDS
+
+def fake_chapter(request):
+    """Stand-in for generate_chapter_video that writes a small file."""
+    image = request.files.get('background_image').read()
+    with open(request.form['filename'], 'wb') as f:
+        f.write(image + request.form['chapter'].encode())
+    return request.form['filename'], None
+
+def test_submit_chapter_job(client, wait_for_job):
+    """A submitted job returns immediately and its result can be downloaded."""
+    with patch.dict(JOB_KINDS, {'chapter': (fake_chapter, 'video/mp4', 'chapter', 'output_video.mp4')}):
+        response = client.post('/jobs/chapter', data={
+            'chapter': 'Chapter 1',
+            'filename': 'test_output.mp4',
+            'background_image': (io.BytesIO(b'image-bytes'), 'background.png', 'image/png'),
+        }, content_type='multipart/form-data')
+
+        assert response.status_code == 202
+        job_id = response.get_json()['id']
+        assert response.headers['Location'].endswith(f'/jobs/{job_id}')
+
+        data = wait_for_job(client, job_id)
+        assert data['status'] == 'succeeded'
+
+        result = client.get(data['result_url'])
+        assert result.status_code == 200
+        assert result.mimetype == 'video/mp4'
+        assert result.data == b'image-bytesChapter 1'
+
+def test_failed_job_reports_error(client, wait_for_job):
+    """Errors returned by the service are surfaced on the job."""
+    failing = lambda request: (None, 'Missing background image')
+    with patch.dict(JOB_KINDS, {'chapter': (failing, 'video/mp4', 'chapter', 'output_video.mp4')}):
+        job_id = client.post('/jobs/chapter', data={'chapter': 'Chapter 1'}).get_json()['id']
+
+        data = wait_for_job(client, job_id)
+        assert data['status'] == 'failed'
+        assert data['error'] == 'Missing background image'
+        assert client.get(f'/jobs/{job_id}/result').status_code == 410
+
+def test_pending_job_can_be_cancelled(client, wait_for_job):
+    """A job waiting behind busy workers can be cancelled and has no result yet."""
+    release = threading.Event()
+    def blocking(request):
+        release.wait(5)
+        return None, 'released'
+
+    workers = client.application.extensions['jobs'].workers
+    with patch.dict(JOB_KINDS, {'chapter': (blocking, 'video/mp4', 'chapter', 'output_video.mp4')}):
+        running_ids = [client.post('/jobs/chapter', data={'chapter': f'Chapter {i}'}).get_json()['id'] for i in range(workers)]
+        queued_id = client.post('/jobs/chapter', data={'chapter': 'Queued chapter'}).get_json()['id']
+
+        assert client.get(f'/jobs/{queued_id}/result').status_code == 409
+        response = client.delete(f'/jobs/{queued_id}')
+        assert response.status_code == 200
+        assert response.get_json()['status'] == 'cancelled'
+
+        release.set()
+        for running_id in running_ids:
+            wait_for_job(client, running_id)
+        assert client.get('/jobs/stats').get_json()['failed'] == workers
+
+@pytest.mark.parametrize('kind', ['chapter', 'full-story', 'short', 'thumbnail'])
+def test_submit_job_missing_fields(client, kind):
+    """Jobs are validated before they are queued."""
+    response = client.post(f'/jobs/{kind}', data={})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Missing required fields'
+
+def test_unknown_job(client):
+    """Unknown kinds and ids return 404."""
+    assert client.post('/jobs/podcast', data={'text': 'x'}).status_code == 404
+    assert client.get('/jobs/does-not-exist').status_code == 404
@@ -0,0 +1,87 @@
+"""
+Tests for the per-job memory profiles.
+"""
+import time
+import pytest
+import tracemalloc
+import numpy as np
+from unittest.mock import patch
+from controllers.jobs_controller import JOB_KINDS
+from helpers.memory import memory_profile, get_memory_profile_mode, current_rss
+from helpers.metrics import span, instrumented
+
+@pytest.fixture(autouse=True)
+def fast_sampling(monkeypatch):
+    monkeypatch.setenv('JOB_MEMORY_SAMPLE_INTERVAL', '0.01')
+
+@instrumented('unit_memory')
+def allocate(megabytes):
+    with span('allocate'):
+        buffer = np.ones(megabytes * 1024 * 1024, dtype=np.uint8)
+        chunks = [bytearray(1024) for _ in range(2048)]
+        # Let the sampler see the buffer before it is released
+        time.sleep(0.1)
+        del buffer, chunks
+    with span('idle'):
+        pass
+    return 'ok', None
+
+def test_rss_profile_records_stage_peaks():
+    with memory_profile('rss') as profile:
+        allocate(64)
+    summary = profile.summary()
+
+    assert summary['mode'] == 'rss'
+    assert 'top_allocators' not in summary
+    assert summary['peak_rss_bytes'] >= summary['start_rss_bytes']
+    stage = summary['stages']['unit_memory.allocate']
+    # The buffer is released by the end of the stage, but the peak saw it
+    assert stage['peak_rss_bytes'] - summary['start_rss_bytes'] >= 32 * 1024 * 1024
+    assert summary['stages']['unit_memory.total']['peak_rss_bytes'] >= stage['peak_rss_bytes']
+
+def test_tracemalloc_profile_reports_heap_and_allocators():
+    with memory_profile('tracemalloc') as profile:
+        allocate(16)
+    summary = profile.summary()
+
+    assert not tracemalloc.is_tracing()
+    allocate_stage = summary['stages']['unit_memory.allocate']
+    assert allocate_stage['peak_python_heap_bytes'] >= 16 * 1024 * 1024
+    # The outer stage keeps the peak of the stages nested in it
+    assert summary['stages']['unit_memory.total']['peak_python_heap_bytes'] >= allocate_stage['peak_python_heap_bytes']
+    assert summary['peak_python_heap_bytes'] >= allocate_stage['peak_python_heap_bytes']
+    assert summary['top_allocators']
+    assert all(set(entry) == {'stage', 'location', 'size_bytes', 'count'} for entry in summary['top_allocators'])
+
+def test_off_profile_does_nothing():
+    with memory_profile('off') as profile:
+        allocate(1)
+    assert profile is None
+
+def test_profile_mode_comes_from_the_environment(monkeypatch):
+    monkeypatch.setenv('JOB_MEMORY_PROFILE', 'rss')
+    assert get_memory_profile_mode() == ('rss', None)
+    assert get_memory_profile_mode('tracemalloc') == ('tracemalloc', None)
+    assert get_memory_profile_mode('everything') == (None, 'Invalid memory_profile: everything')
+    assert current_rss() > 0
+
+def test_job_result_includes_memory_peaks(client, wait_for_job):
+    def fake_chapter(request):
+        allocate(8)
+        with open(request.form['filename'], 'wb') as f:
+            f.write(b'video')
+        return request.form['filename'], None
+
+    with patch.dict(JOB_KINDS, {'chapter': (fake_chapter, 'video/mp4', 'chapter', 'output_video.mp4')}):
+        job_id = client.post('/jobs/chapter', data={'chapter': 'Chapter 1', 'memory_profile': 'rss'}).get_json()['id']
+        data = wait_for_job(client, job_id)
+        assert data['status'] == 'succeeded'
+        assert data['memory']['peak_rss_bytes'] > 0
+        assert 'unit_memory.allocate' in data['memory']['stages']
+
+        # Off by default
+        job_id = client.post('/jobs/chapter', data={'chapter': 'Chapter 1'}).get_json()['id']
+        assert 'memory' not in wait_for_job(client, job_id)
+
+        response = client.post('/jobs/chapter', data={'chapter': 'Chapter 1', 'memory_profile': 'all'})
+        assert response.status_code == 400
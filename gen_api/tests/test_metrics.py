@@ -0,0 +1,83 @@
+"""
+Tests for the stage timing metrics and the /metrics endpoint.
+"""
+import io
+import re
+import pytest
+from unittest.mock import patch
+from PIL import Image
+from helpers import metrics
+from helpers.metrics import Histogram, Counter, MetricsRegistry, span, instrumented, record_cache_lookup
+from services import image_service
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.register(Histogram("demo_seconds", "Demo.", ("stage",), buckets=(0.1, 1)))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value, stage='encode')
+    text = registry.render()
+
+    assert "# TYPE demo_seconds histogram" in text
+    assert 'demo_seconds_bucket{stage="encode",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="encode",le="1"} 3' in text
+    assert 'demo_seconds_bucket{stage="encode",le="+Inf"} 4' in text
+    assert 'demo_seconds_count{stage="encode"} 4' in text
+    assert re.search(r'demo_seconds_sum\{stage="encode"\} 4\.25\d*', text)
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("demo_total", "Demo.", ("name",)))
+    counter.inc(name='a "b"\\c')
+    assert 'demo_total{name="a \\"b\\"\\\\c"} 1' in registry.render()
+
+def test_span_records_duration_bytes_and_errors():
+    labels = dict(pipeline='unit', stage='work')
+    count = metrics.STAGE_DURATION.count(**labels)
+    errors = metrics.STAGE_ERRORS.value(**labels)
+
+    with span('work', pipeline='unit') as stage:
+        stage.add_bytes(2048)
+    with pytest.raises(ValueError):
+        with span('work', pipeline='unit'):
+            raise ValueError()
+
+    assert metrics.STAGE_DURATION.count(**labels) == count + 2
+    assert metrics.STAGE_BYTES.count(**labels) >= 1
+    assert metrics.STAGE_ERRORS.value(**labels) == errors + 1
+
+def test_instrumented_labels_stages_and_counts_failed_calls():
+    @instrumented('unit_pipeline')
+    def run(fail):
+        with span('step'):
+            record_cache_lookup('things', True)
+        return (None, "boom") if fail else ("ok", None)
+
+    run(False)
+    run(True)
+    assert metrics.STAGE_DURATION.count(pipeline='unit_pipeline', stage='step') == 2
+    assert metrics.STAGE_DURATION.count(pipeline='unit_pipeline', stage='total') == 2
+    assert metrics.STAGE_ERRORS.value(pipeline='unit_pipeline', stage='total') == 1
+    assert metrics.CACHE_LOOKUPS.value(pipeline='unit_pipeline', cache='things', result='hit') == 2
+    # Outside a pipeline, spans are labelled "none"
+    assert metrics.current_pipeline() == 'none'
+
+def test_metrics_endpoint_exports_thumbnail_stages(client, tmp_path):
+    overlay = tmp_path / 'audio.png'
+    Image.new('RGBA', (200, 50), (255, 0, 0, 128)).save(overlay)
+    upload = io.BytesIO()
+    Image.new('RGB', (640, 360), (200, 180, 160)).save(upload, format='PNG')
+    upload.seek(0)
+    with patch.dict(image_service.AUDIO_IMAGE_PATHS, {'Horror': str(overlay)}):
+        response = client.post('/generate-thumbnail', data={
+            'title': 'Test', 'brand': 'Brand', 'type': 'Horror',
+            'image': (upload, 'image.png', 'image/png'),
+        }, content_type='multipart/form-data')
+    assert response.status_code == 200
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    for stage in ('decode', 'vignette', 'overlay', 'encode', 'total'):
+        assert f'story_gen_stage_duration_seconds_count{{pipeline="thumbnail",stage="{stage}"}}' in text
+    assert 'story_gen_stage_output_bytes_count{pipeline="thumbnail",stage="encode"}' in text
@@ -0,0 +1,90 @@
+"""
+Tests for the diffusion model residency manager.
+"""
+import threading
+import pytest
+from unittest.mock import patch
+from services import model_manager
+from services.model_manager import ModelManager, detect_device, MODEL_READY, MODEL_UNLOADED, MODEL_FAILED
+
+class FakeLoader:
+    def __init__(self, fail=False, gate=None):
+        self.calls = 0
+        self.fail = fail
+        self.gate = gate
+
+    def __call__(self, model_id, device):
+        self.calls += 1
+        if self.gate:
+            self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError('no weights')
+        return f'pipe-{self.calls}'
+
+def test_detect_device_falls_back_to_cpu(monkeypatch):
+    monkeypatch.delenv('DIFFUSION_DEVICE', raising=False)
+    with patch('torch.cuda.is_available', return_value=False), \
+            patch('torch.backends.mps.is_available', return_value=False):
+        assert detect_device() == 'cpu'
+    monkeypatch.setenv('DIFFUSION_DEVICE', 'cuda:1')
+    assert detect_device() == 'cuda:1'
+
+def test_loads_lazily_once():
+    loader = FakeLoader()
+    manager = ModelManager('model', device='cpu', loader=loader)
+    assert manager.status()['state'] == MODEL_UNLOADED
+    with manager.acquire() as model:
+        assert model.pipe == 'pipe-1'
+        assert manager.status()['in_use'] == 1
+    with manager.acquire() as model:
+        assert model.pipe == 'pipe-1'
+    assert loader.calls == 1
+    assert manager.status()['state'] == MODEL_READY
+
+def test_preload_in_background():
+    gate = threading.Event()
+    manager = ModelManager('model', device='cpu', loader=FakeLoader(gate=gate))
+    thread = manager.preload()
+    gate.set()
+    thread.join(5)
+    assert manager.status()['state'] == MODEL_READY
+
+def test_idle_unload_and_transparent_reload():
+    loader = FakeLoader()
+    manager = ModelManager('model', device='cpu', idle_timeout=60, loader=loader)
+    with manager.acquire():
+        # Never unloaded while in use
+        assert not manager.unload(idle_for=0)
+    assert not manager.unload_if_idle()
+
+    manager._last_used -= 61
+    assert manager.unload_if_idle()
+    assert manager.status()['state'] == MODEL_UNLOADED
+
+    with manager.acquire() as model:
+        assert model.pipe == 'pipe-2'
+    assert manager.status()['loads'] == 2
+    manager.shutdown()
+
+def test_failed_load_is_reported():
+    manager = ModelManager('model', device='cpu', loader=FakeLoader(fail=True))
+    with pytest.raises(RuntimeError):
+        with manager.acquire():
+            pass
+    status = manager.status()
+    assert status['state'] == MODEL_FAILED
+    assert status['error'] == 'no weights'
+
+def test_ready_route(app, monkeypatch):
+    manager = ModelManager('model', device='cpu', loader=FakeLoader())
+    monkeypatch.setattr(model_manager, '_model_manager', manager)
+    client = app.test_client()
+    assert client.get('/ready').status_code == 200
+
+    app.config['PRELOAD_DIFFUSION_MODEL'] = True
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert response.get_json()['model']['state'] == MODEL_UNLOADED
+
+    manager.load()
+    assert client.get('/ready').status_code == 200
@@ -0,0 +1,80 @@
+"""
+Tests for chunked, concurrent narration synthesis.
+"""
+import os
+import asyncio
+import numpy as np
+from unittest.mock import patch
+from pedalboard.io import AudioFile
+from services import audio_service
+from services.audio_service import split_into_sentences, narration_to_speech_async
+
+SAMPLE_RATE = 24000
+
+def test_split_packs_sentences_up_to_limit():
+    """Whole sentences are packed together without exceeding the limit."""
+    text = "One two. Three four! Five six? Seven eight."
+    assert split_into_sentences(text, 20) == ["One two. Three four!", "Five six?", "Seven eight."]
+
+def test_split_breaks_long_sentence_at_spaces():
+    """A sentence longer than the limit is split on whitespace."""
+    chunks = split_into_sentences("alpha beta gamma delta epsilon", 12)
+    assert chunks == ["alpha beta", "gamma delta", "epsilon"]
+
+def test_split_short_text_is_single_chunk():
+    assert split_into_sentences("Chapter 1", 100) == ["Chapter 1"]
+
+def test_narration_is_stitched_in_order(tmp_path):
+    """Chunks are synthesized concurrently (bounded) and concatenated in text order."""
+    active = 0
+    peak = 0
+
+    async def fake_synthesize(voice, text, output_file, words=None):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        # 100 frames per character, valued by chunk length so the order can be checked
+        samples = np.full((1, len(text) * 100), len(text) / 100, dtype=np.float32)
+        wav_path = output_file + '.wav'
+        with AudioFile(wav_path, 'w', SAMPLE_RATE, 1) as f:
+            f.write(samples)
+        os.replace(wav_path, output_file)
+        return output_file
+
+    text = "A. Bb. Ccc. Dddd. Eeeee."
+    output = str(tmp_path / "narration.wav")
+    with patch.object(audio_service, 'synthesize_raw_async', side_effect=fake_synthesize), \
+         patch.object(audio_service, 'equalize_blocks', side_effect=lambda blocks, samplerate: iter(blocks)):
+        asyncio.run(narration_to_speech_async('Horror', text, output, concurrency=2, max_chars=5))
+
+    assert peak == 2
+    with AudioFile(output) as f:
+        assert f.samplerate == SAMPLE_RATE
+        audio = f.read(f.frames)[0]
+
+    chunks = split_into_sentences(text, 5)
+    expected = np.concatenate([np.full(len(chunk) * 100, len(chunk) / 100) for chunk in chunks])
+    assert len(audio) == len(expected)
+    np.testing.assert_allclose(audio, expected, atol=1e-3)
+
+def test_narration_word_timings_follow_chunk_offsets(tmp_path):
+    """Timings of each chunk are shifted by the audio of the chunks before it."""
+    async def fake_synthesize(voice, text, output_file, words=None):
+        with AudioFile(output_file + '.wav', 'w', SAMPLE_RATE, 1) as f:
+            f.write(np.zeros((1, len(text) * 2400), dtype=np.float32))
+        os.replace(output_file + '.wav', output_file)
+        words.append({'start_time': 0.05, 'end_time': 0.1, 'text': text})
+        return output_file
+
+    text = "A. Bb. Ccc."
+    with patch.object(audio_service, 'synthesize_raw_async', side_effect=fake_synthesize), \
+         patch.object(audio_service, 'equalize_blocks', side_effect=lambda blocks, samplerate: iter(blocks)):
+        _, words = asyncio.run(narration_to_speech_async(
+            'Horror', text, str(tmp_path / "narration.wav"), max_chars=5, word_timings=True))
+
+    # Chunks last 0.2, 0.3 and 0.4 seconds
+    assert [word['text'] for word in words] == ["A.", "Bb.", "Ccc."]
+    np.testing.assert_allclose([word['start_time'] for word in words], [0.05, 0.25, 0.55])
+    np.testing.assert_allclose([word['end_time'] for word in words], [0.1, 0.3, 0.6])
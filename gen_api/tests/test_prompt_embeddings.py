@@ -0,0 +1,50 @@
+"""
+Tests for the prompt embedding cache.
+"""
+import torch
+from services.prompt_embeddings import PromptEmbeddingCache
+
+class FakeSDXLPipeline:
+    """Returns embeddings derived from the text length, counting encoder calls."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode_prompt(self, prompt, device=None, num_images_per_prompt=1, do_classifier_free_guidance=True):
+        assert not do_classifier_free_guidance
+        self.encoded.append(prompt)
+        embeds = torch.full((1, 77, 8), float(len(prompt)))
+        pooled = torch.full((1, 4), float(len(prompt)))
+        return embeds, None, pooled, None
+
+def test_repeated_prompts_are_encoded_once():
+    pipe = FakeSDXLPipeline()
+    cache = PromptEmbeddingCache('model', pipe, 'cpu')
+    first = cache.pipeline_kwargs(['a castle'], 'ugly')
+    second = cache.pipeline_kwargs(['a castle', 'a forest'], 'ugly')
+    assert pipe.encoded == ['a castle', 'ugly', 'a forest']
+    assert set(first) == {'prompt_embeds', 'pooled_prompt_embeds', 'negative_prompt_embeds', 'negative_pooled_prompt_embeds'}
+    assert second['prompt_embeds'].shape == (2, 77, 8)
+    assert second['negative_pooled_prompt_embeds'].shape == (2, 4)
+    assert second['prompt_embeds'][1, 0, 0] == len('a forest')
+    assert cache.stats() == {'entries': 2, 'pinned': 1, 'hits': 2, 'misses': 3}
+
+def test_negative_prompt_is_never_evicted():
+    pipe = FakeSDXLPipeline()
+    cache = PromptEmbeddingCache('model', pipe, 'cpu', max_entries=1)
+    cache.pipeline_kwargs(['one'], 'ugly')
+    cache.pipeline_kwargs(['two'], 'ugly')
+    cache.pipeline_kwargs(['one'], 'ugly')
+    assert pipe.encoded == ['one', 'ugly', 'two', 'one']
+
+def test_sd_pipeline_without_pooled_embeddings():
+    class FakeSDPipeline:
+        def encode_prompt(self, prompt, device, num_images_per_prompt, do_classifier_free_guidance):
+            return torch.zeros((1, 77, 8)), None
+
+    kwargs = PromptEmbeddingCache('model', FakeSDPipeline(), 'cpu').pipeline_kwargs(['a'], 'b')
+    assert set(kwargs) == {'prompt_embeds', 'negative_prompt_embeds'}
+
+def test_pipeline_without_encoder_gets_text():
+    cache = PromptEmbeddingCache('model', object(), 'cpu')
+    assert cache.pipeline_kwargs(['a', 'b'], 'ugly') == {'prompt': ['a', 'b'], 'negative_prompt': ['ugly', 'ugly']}
@@ -0,0 +1,71 @@
+"""
+Tests for the pre-decoded background sound library.
+"""
+import os
+import shutil
+import numpy as np
+import pytest
+from unittest.mock import patch
+from pedalboard.io import AudioFile
+from services import sound_library
+from services.sound_library import SoundLibrary, PcmAudioClip
+
+pytestmark = pytest.mark.skipif(
+    shutil.which(os.environ.get('FFMPEG_BINARY', 'ffmpeg')) is None,
+    reason='ffmpeg is not installed',
+)
+
+def write_tone(path, seconds=1.0, sample_rate=22050, frequency=440):
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    tone = (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+    with AudioFile(str(path), 'w', sample_rate, 1) as f:
+        f.write(tone[np.newaxis, :])
+
+@pytest.fixture
+def library(tmp_path):
+    return SoundLibrary(str(tmp_path / 'sounds'))
+
+def test_decodes_to_stereo_44k(tmp_path, library):
+    """Sources are resampled to 44.1 kHz stereo int16 and memory-mapped."""
+    source = tmp_path / 'tone.wav'
+    write_tone(source)
+
+    pcm = library.load(str(source))
+    assert isinstance(pcm, np.memmap)
+    assert pcm.dtype == np.int16
+    assert pcm.shape[1] == 2
+    assert abs(pcm.shape[0] - 44100) < 100
+    assert np.abs(pcm).max() > 10000
+
+def test_decodes_only_once(tmp_path, library):
+    """Warm entries, and entries whose mtime changed but content did not, skip ffmpeg."""
+    source = tmp_path / 'tone.wav'
+    write_tone(source)
+    library.prepare(str(source))
+
+    with patch.object(sound_library, 'run_ffmpeg') as run_ffmpeg:
+        library.prepare(str(source))
+        os.utime(source, ns=(1, 1))
+        library.prepare(str(source))
+        SoundLibrary(library.directory).prepare(str(source))
+    run_ffmpeg.assert_not_called()
+
+def test_changed_source_is_decoded_again(tmp_path, library):
+    source = tmp_path / 'tone.wav'
+    write_tone(source, seconds=1.0)
+    library.prepare(str(source))
+
+    write_tone(source, seconds=2.0)
+    assert abs(library.load(str(source)).shape[0] - 88200) < 100
+
+def test_missing_source_raises(tmp_path, library):
+    with pytest.raises(FileNotFoundError):
+        library.prepare(str(tmp_path / 'missing.wav'))
+
+def test_pcm_clip_scales_samples():
+    """The clip returns float frames in [-1, 1] and silence outside the array."""
+    pcm = np.array([[16384, -16384], [32767, 0]], dtype=np.int16)
+    clip = PcmAudioClip(pcm, fps=2)
+    assert clip.duration == 1.0
+    np.testing.assert_allclose(clip.get_frame(0), [0.5, -0.5])
+    np.testing.assert_allclose(clip.get_frame(np.array([0.5, 5.0])), [[32767 / 32768, 0], [0, 0]])
@@ -0,0 +1,73 @@
+"""
+Tests for the still-image chapter body encoder.
+"""
+import os
+import shutil
+import numpy as np
+import pytest
+from moviepy.editor import ColorClip, VideoFileClip
+from moviepy.audio.AudioClip import AudioArrayClip
+from services import video_service
+from services.video_service import render_chapter_with_still_body
+from helpers.encoding_profiles import get_encoding_profile
+
+pytestmark = pytest.mark.skipif(
+    shutil.which(os.environ.get('FFMPEG_BINARY', 'ffmpeg')) is None,
+    reason='ffmpeg is not installed',
+)
+
+SAMPLE_RATE = 44100
+
+def tone(seconds):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return AudioArrayClip(np.stack([0.3 * np.sin(2 * np.pi * 440 * t)] * 2, axis=1), fps=SAMPLE_RATE)
+
+def render(tmp_path, body_seconds):
+    intro = ColorClip((64, 48), (0, 0, 255), duration=1).set_audio(tone(1))
+    frame = np.full((48, 64, 3), 200, dtype=np.uint8)
+    output = str(tmp_path / 'chapter.mp4')
+    render_chapter_with_still_body(intro, frame, tone(body_seconds), output)
+    return VideoFileClip(output)
+
+def test_still_body_frames_and_fades(tmp_path, monkeypatch):
+    """Repeated blocks plus a remainder give the exact length, with the fades in place."""
+    monkeypatch.setattr(video_service, 'STILL_BLOCK_FRAMES', 10)
+    clip = render(tmp_path, 5)
+    try:
+        assert abs(clip.duration - 6) < 0.1
+        assert clip.audio is not None
+        assert abs(clip.get_frame(3.5).mean() - 200) < 5
+        assert clip.get_frame(1.0).mean() < 20
+        assert clip.get_frame(5.9).mean() < 30
+        # Intro still comes first
+        assert clip.get_frame(0.5)[:, :, 2].mean() > 200
+    finally:
+        clip.close()
+
+def test_short_body_is_composited(tmp_path):
+    clip = render(tmp_path, 1.5)
+    try:
+        assert abs(clip.duration - 2.5) < 0.1
+    finally:
+        clip.close()
+
+def test_preview_profile_scales_the_render(tmp_path):
+    profile, _ = get_encoding_profile('preview')
+    intro = ColorClip((1280, 720), (0, 0, 255), duration=1).set_audio(tone(1))
+    frame = np.full((720, 1280, 3), 200, dtype=np.uint8)
+    output = str(tmp_path / 'chapter.mp4')
+    render_chapter_with_still_body(intro, frame, tone(5), output, profile)
+    clip = VideoFileClip(output)
+    try:
+        assert clip.size == [640, 360]
+        assert clip.fps == 15
+        assert abs(clip.duration - 6) < 0.1
+    finally:
+        clip.close()
+
+def test_output_is_faststart(tmp_path):
+    """The moov index comes before the media data."""
+    render(tmp_path, 3).close()
+    with open(tmp_path / 'chapter.mp4', 'rb') as f:
+        head = f.read()
+    assert head.index(b'moov') < head.index(b'mdat')
@@ -0,0 +1,55 @@
+"""
+Tests for streamed, range-aware media responses.
+"""
+import io
+from unittest.mock import patch
+from PIL import Image
+from controllers.jobs_controller import JOB_KINDS
+
+VIDEO_BYTES = bytes(range(256)) * 400
+
+def chapter_form():
+    return {'title': 'Test', 'chapter': 'Chapter 1', 'content': 'Text.'}
+
+def fake_chapter(request):
+    with open(request.form['filename'], 'wb') as f:
+        f.write(VIDEO_BYTES)
+    return request.form['filename'], None
+
+def test_job_result_supports_ranges(client, wait_for_job):
+    with patch.dict(JOB_KINDS, {'chapter': (fake_chapter, 'video/mp4', 'chapter', 'output_video.mp4')}):
+        job_id = client.post('/jobs/chapter', data=chapter_form()).get_json()['id']
+        result_url = wait_for_job(client, job_id)['result_url']
+
+    response = client.get(result_url, headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(VIDEO_BYTES)}'
+    assert response.data == VIDEO_BYTES[100:200]
+
+    full = client.get(result_url)
+    assert full.status_code == 200
+    assert full.headers['Accept-Ranges'] == 'bytes'
+    assert full.content_length == len(VIDEO_BYTES)
+
+    assert client.get(result_url, headers={'If-None-Match': full.headers['ETag']}).status_code == 304
+    assert client.get(result_url, headers={'Range': f'bytes={len(VIDEO_BYTES)}-'}).status_code == 416
+
+def test_rendered_video_is_streamed_from_disk(client, tmp_path):
+    video = tmp_path / 'video.mp4'
+    video.write_bytes(VIDEO_BYTES)
+    for result in (str(video), open(video, 'rb')):
+        with patch('controllers.media_controller.generate_chapter_video', return_value=(result, None)):
+            response = client.post('/generate-chapter', data=chapter_form())
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.content_length == len(VIDEO_BYTES)
+        assert response.data == VIDEO_BYTES
+
+def test_in_memory_result_has_an_etag(client):
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8)).save(buffer, format='JPEG')
+    with patch('controllers.media_controller.generate_thumbnail', return_value=(io.BytesIO(buffer.getvalue()), None)):
+        response = client.post('/generate-thumbnail', data={'title': 'Test'})
+    assert response.status_code == 200
+    assert response.headers['ETag']
+    assert response.data == buffer.getvalue()
@@ -0,0 +1,49 @@
+"""
+Tests for the in-memory thumbnail pipeline.
+"""
+import io
+import os
+import pytest
+from unittest.mock import patch
+from PIL import Image
+from services import image_service
+
+@pytest.fixture
+def audio_images(tmp_path):
+    """Small stand-ins for the audio wave overlays."""
+    path = tmp_path / 'audio.png'
+    Image.new('RGBA', (200, 50), (255, 0, 0, 128)).save(path)
+    with patch.dict(image_service.AUDIO_IMAGE_PATHS, {'Horror': str(path), 'Love': str(path)}):
+        yield
+
+def upload_image(mode='RGBA', size=(1920, 1080)):
+    buffer = io.BytesIO()
+    Image.new(mode, size, (200, 180, 160, 255)[:len(mode)]).save(buffer, format='PNG')
+    buffer.seek(0)
+    return buffer
+
+def test_thumbnail_is_streamed_as_jpeg(client, audio_images):
+    """The thumbnail comes back as a 1280x720 JPEG without writing any file."""
+    files_before = set(os.listdir('.'))
+    response = client.post('/generate-thumbnail', data={
+        'title': 'Test Story',
+        'brand': 'Hot Diaries',
+        'type': 'Horror',
+        'filename': 'test_thumbnail.jpg',
+        'image': (upload_image(), 'image.png', 'image/png'),
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert 'test_thumbnail.jpg' in response.headers['Content-Disposition']
+    with Image.open(io.BytesIO(response.data)) as thumbnail:
+        assert thumbnail.format == 'JPEG'
+        assert thumbnail.size == (1280, 720)
+        # Vignetted corners, untouched center
+        assert sum(thumbnail.getpixel((5, 360))) < sum(thumbnail.getpixel((640, 300)))
+    assert set(os.listdir('.')) == files_before
+
+def test_thumbnail_missing_parameters(client):
+    response = client.post('/generate-thumbnail', data={'title': 'Test Story'})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Missing required parameters'
@@ -0,0 +1,137 @@
+"""
+Tests for the on-disk TTS cache.
+"""
+import asyncio
+import pytest
+from unittest.mock import patch, MagicMock
+from helpers.disk_cache import DiskCache
+from services import audio_service
+
+def make_communicator(*args, **kwargs):
+    """Fake edge_tts.Communicate streaming the text as the audio payload, one word per second."""
+    communicator = MagicMock()
+    async def stream():
+        yield {'type': 'audio', 'data': args[0].encode()}
+        for index, word in enumerate(args[0].split()):
+            yield {'type': 'WordBoundary', 'offset': index * 10_000_000, 'duration': 5_000_000, 'text': word}
+    communicator.stream = stream
+    return communicator
+
+@pytest.fixture
+def fake_tts():
+    with patch('services.tts_client.TtsClient.communicator', side_effect=make_communicator) as communicate, \
+         patch('services.audio_service.apply_equalization') as equalize:
+        yield communicate, equalize
+
+def test_repeated_text_is_served_from_cache(tmp_path, fake_tts):
+    """The second synthesis of the same text skips edge-tts and the EQ pass."""
+    communicate, equalize = fake_tts
+    first = str(tmp_path / 'first.wav')
+    second = str(tmp_path / 'second.wav')
+
+    asyncio.run(audio_service.text_to_speech_async('Horror', 'Chapter  1', first))
+    asyncio.run(audio_service.text_to_speech_async('Horror', ' Chapter 1 ', second))
+
+    assert communicate.call_count == 1
+    assert equalize.call_count == 1
+    with open(second, 'rb') as f:
+        assert f.read() == b'Chapter 1'
+    stats = audio_service.get_tts_cache().stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+def test_word_timings_are_cached(tmp_path, fake_tts):
+    """Word boundaries come back with the audio, from edge-tts or the cache."""
+    communicate, _ = fake_tts
+    expected = [
+        {'start_time': 0.0, 'end_time': 0.5, 'text': 'The'},
+        {'start_time': 1.0, 'end_time': 1.5, 'text': 'old'},
+        {'start_time': 2.0, 'end_time': 2.5, 'text': 'house'},
+    ]
+    for name in ('a.wav', 'b.wav'):
+        path, words = asyncio.run(audio_service.text_to_speech_async('Horror', 'The old house', str(tmp_path / name), word_timings=True))
+        assert path == str(tmp_path / name)
+        assert words == expected
+    assert communicate.call_count == 1
+    assert communicate.call_args.kwargs['boundary'] == 'WordBoundary'
+
+def test_entry_without_word_timings_is_synthesized_again(tmp_path, fake_tts):
+    communicate, _ = fake_tts
+    key = audio_service.tts_cache_key(audio_service.get_voice('Horror'), 'Title', 'a.wav')
+    source = tmp_path / 'old.wav'
+    source.write_bytes(b'old')
+    audio_service.get_tts_cache().put(key, str(source))
+
+    _, words = asyncio.run(audio_service.text_to_speech_async('Horror', 'Title', str(tmp_path / 'a.wav'), word_timings=True))
+    assert communicate.call_count == 1
+    assert words == [{'start_time': 0.0, 'end_time': 0.5, 'text': 'Title'}]
+
+def test_failed_equalization_is_not_cached(tmp_path, fake_tts):
+    """A voice-over the EQ pass failed on is synthesized again next time."""
+    communicate, equalize = fake_tts
+    equalize.return_value = False
+    for name in ('a.wav', 'b.wav'):
+        asyncio.run(audio_service.text_to_speech_async('Horror', 'Title', str(tmp_path / name)))
+    assert communicate.call_count == 2
+    assert audio_service.get_tts_cache().stats()['entries'] == 0
+
+def test_cache_key_depends_on_voice(tmp_path, fake_tts):
+    """The same text with a different voice is synthesized again."""
+    communicate, _ = fake_tts
+    asyncio.run(audio_service.text_to_speech_async('Horror', 'Title', str(tmp_path / 'a.wav')))
+    asyncio.run(audio_service.text_to_speech_async('Love', 'Title', str(tmp_path / 'b.wav')))
+    assert communicate.call_count == 2
+
+def test_cache_can_be_disabled(tmp_path, fake_tts, monkeypatch):
+    """TTS_CACHE_ENABLED=False always calls edge-tts."""
+    communicate, _ = fake_tts
+    monkeypatch.setenv('TTS_CACHE_ENABLED', 'False')
+    for _ in range(2):
+        asyncio.run(audio_service.text_to_speech_async('Horror', 'Title', str(tmp_path / 'a.wav')))
+    assert communicate.call_count == 2
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    """Entries are evicted oldest-access first once the byte budget is exceeded."""
+    cache = DiskCache(str(tmp_path / 'cache'), max_bytes=25)
+    for name in ('a', 'b', 'c'):
+        source = tmp_path / f'{name}.bin'
+        source.write_bytes(b'x' * 10)
+        cache.put(name, str(source))
+        if name == 'b':
+            assert cache.get('a') is not None
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+    assert cache.stats()['evictions'] == 1
+
+def test_disk_cache_copy_of_an_evicted_entry_is_a_miss(tmp_path):
+    """copy_to() holds the entry while it copies, and misses once it is evicted."""
+    cache = DiskCache(str(tmp_path / 'cache'), max_bytes=15)
+    for name in ('a', 'b'):
+        source = tmp_path / f'{name}.bin'
+        source.write_bytes(name.encode() * 10)
+        cache.put(name, str(source), meta={'name': name})
+
+    assert cache.copy_to('a', str(tmp_path / 'copy.bin')) is None
+    assert not (tmp_path / 'copy.bin').exists()
+    assert cache.copy_to('b', str(tmp_path / 'copy.bin')) == {'name': 'b'}
+    assert (tmp_path / 'copy.bin').read_bytes() == b'b' * 10
+    assert cache.read('b') == b'b' * 10
+    assert cache.read('a') is None
+
+def test_disk_cache_index_survives_restart(tmp_path):
+    """A new cache instance picks up entries written by a previous one."""
+    source = tmp_path / 'voice.wav'
+    source.write_bytes(b'audio')
+    DiskCache(str(tmp_path / 'cache'), max_bytes=100).put('key', str(source), meta={'words': 1})
+
+    cache = DiskCache(str(tmp_path / 'cache'), max_bytes=100)
+    assert cache.get('key').endswith('key.wav')
+    assert cache.get_meta('key') == {'words': 1}
+    assert cache.stats()['bytes'] == 5
+
+def test_cache_stats_route(client):
+    """The stats route reports the TTS cache."""
+    response = client.get('/cache/stats')
+    assert response.status_code == 200
+    assert response.get_json()['tts']['entries'] == 0
@@ -0,0 +1,103 @@
+"""
+Tests for the pooled TTS client, against the local stand-in service.
+"""
+import asyncio
+import inspect
+import pytest
+import edge_tts.communicate
+from pedalboard.io import AudioFile
+from services import audio_service, tts_client
+from services.tts_client import TtsClient
+from helpers.tts_stand_in import StandInTtsServer
+
+VOICE = "en-US-AndrewMultilingualNeural"
+
+@pytest.fixture
+def stand_in():
+    with StandInTtsServer(seconds_per_word=0.25) as server:
+        yield server
+
+@pytest.fixture
+def client(stand_in):
+    client = TtsClient(max_in_flight=2, endpoint=stand_in.url)
+    yield client
+    client.shutdown()
+
+def test_synthesis_returns_audio_and_word_boundaries(tmp_path, client):
+    output = str(tmp_path / 'voice.mp3')
+    words = []
+    asyncio.run(client.synthesize(VOICE, "The old house creaked", output, words=words))
+
+    assert [word['text'] for word in words] == ["The", "old", "house", "creaked"]
+    assert [word['offset'] for word in words] == [0, 2_500_000, 5_000_000, 7_500_000]
+    with AudioFile(output) as f:
+        assert abs(f.frames / f.samplerate - 1.0) < 0.1
+    assert client.stats()['requests'] == 1
+
+def test_connector_is_reused_across_event_loops(tmp_path, client):
+    """Every asyncio.run shares the client loop and its connector."""
+    asyncio.run(client.synthesize(VOICE, "One", str(tmp_path / 'a.mp3')))
+    connector = client._connector
+    asyncio.run(client.synthesize(VOICE, "Two", str(tmp_path / 'b.mp3')))
+    assert client._connector is connector and not connector.closed
+
+def test_endpoint_is_restored_on_shutdown(tmp_path, stand_in):
+    url = edge_tts.communicate.WSS_URL
+    client = TtsClient(endpoint=stand_in.url)
+    try:
+        asyncio.run(client.synthesize(VOICE, "One", str(tmp_path / 'a.mp3')))
+        assert edge_tts.communicate.WSS_URL.startswith(stand_in.url)
+        # A second stand-in cannot take over the process while the first one is used
+        with pytest.raises(RuntimeError):
+            TtsClient(endpoint='ws://127.0.0.1:1/edge/v1').start()
+    finally:
+        client.shutdown()
+    assert edge_tts.communicate.WSS_URL == url
+
+def test_edge_tts_internals_are_as_expected():
+    """
+    The client passes its connector to Communicate and points edge-tts at the
+    stand-in through its WSS_URL constant: this fails when an edge-tts
+    release changes either, before the client silently stops honoring them.
+    """
+    assert 'connector' in inspect.signature(edge_tts.Communicate.__init__).parameters
+    assert isinstance(edge_tts.communicate.WSS_URL, str)
+    source = inspect.getsource(edge_tts.communicate)
+    assert 'connector=self.connector' in source
+    assert 'f"{WSS_URL}&ConnectionId=' in source
+
+def test_in_flight_requests_are_capped(tmp_path, stand_in, client):
+    stand_in.latency = 0.1
+
+    async def synthesize_all():
+        await asyncio.gather(*(
+            client.synthesize(VOICE, f"Sentence number {i}", str(tmp_path / f'{i}.mp3'))
+            for i in range(6)
+        ))
+
+    asyncio.run(synthesize_all())
+    assert stand_in.requests == 6
+    assert stand_in.peak_connections == 2
+    assert client.stats()['in_flight'] == 0
+
+def test_slow_service_times_out(tmp_path, stand_in):
+    stand_in.latency = 2
+    client = TtsClient(endpoint=stand_in.url, receive_timeout=30, request_timeout=0.2)
+    try:
+        with pytest.raises(TimeoutError):
+            asyncio.run(client.synthesize(VOICE, "Too slow", str(tmp_path / 'slow.mp3')))
+        assert client.stats()['timeouts'] == 1
+    finally:
+        client.shutdown()
+
+def test_narration_runs_offline_on_the_stand_in(tmp_path, client, monkeypatch):
+    monkeypatch.setattr(tts_client, '_tts_client', client)
+    output = str(tmp_path / 'narration.mp3')
+    text = "First sentence here. Second one follows. And a third."
+    _, words = asyncio.run(audio_service.narration_to_speech_async('Horror', text, output, max_chars=25, word_timings=True))
+
+    assert [word['text'] for word in words] == text.split()
+    starts = [word['start_time'] for word in words]
+    assert starts == sorted(starts)
+    with AudioFile(output) as f:
+        assert f.frames / f.samplerate > len(words) * 0.25 * 0.9
@@ -0,0 +1,56 @@
+"""
+Tests for the in-memory vignette engine.
+"""
+import cv2
+import numpy as np
+from services.vignette_service import VignetteEngine, get_vignette_mask
+
+def reference_vignette(image, intensity, blur_strength):
+    """The original per-channel implementation."""
+    rows, cols = image.shape[:2]
+    mask = np.zeros((rows, cols), dtype=np.uint8)
+    cv2.ellipse(mask, (cols // 2, rows // 2), (int(cols * intensity), int(rows * intensity)), 0, 0, 360, 255, -1)
+    mask = cv2.GaussianBlur(mask, (blur_strength, blur_strength), 0)
+    vignetted = np.copy(image)
+    for i in range(3):
+        vignetted[:, :, i] = vignetted[:, :, i] * (mask / 255)
+    return vignetted
+
+def random_image(seed=0, shape=(120, 200, 3)):
+    return np.random.default_rng(seed).integers(0, 256, shape, dtype=np.uint8)
+
+def test_exact_mask_matches_reference():
+    """With a scale of 1 the engine reproduces the original output."""
+    image = random_image()
+    mask = get_vignette_mask(200, 120, 0.45, 101, scale=1)
+    result = (image * mask).astype(np.uint8)
+    difference = np.abs(result.astype(int) - reference_vignette(image, 0.45, 101))
+    assert difference.max() <= 1
+
+def test_downscaled_mask_is_close_to_reference():
+    """The fast mask stays within a few levels of the full-resolution blur."""
+    image = np.full((360, 640, 3), 255, dtype=np.uint8)
+    result = (image * get_vignette_mask(640, 360, 0.45, 401, scale=4)).astype(np.uint8)
+    difference = np.abs(result.astype(int) - reference_vignette(image, 0.45, 401))
+    assert difference.max() <= 5
+    assert difference.mean() < 1
+
+def test_mask_is_cached_and_read_only():
+    mask = get_vignette_mask(64, 48, 0.45, 31)
+    assert mask is get_vignette_mask(64, 48, 0.45, 31)
+    assert mask.shape == (48, 64, 1)
+    assert not mask.flags.writeable
+
+def test_results_are_memoized_by_content():
+    """The same pixels are vignetted once, even from a different array object."""
+    engine = VignetteEngine(max_results=2)
+    image = random_image()
+    first = engine.apply(image, blur_strength=51)
+    second = engine.apply(image.copy(), blur_strength=51)
+    assert second is first
+    assert engine.stats() == {'entries': 1, 'hits': 1, 'misses': 1}
+
+    engine.apply(random_image(1), blur_strength=51)
+    engine.apply(random_image(2), blur_strength=51)
+    assert engine.stats()['entries'] == 2
+    assert engine.apply(image, blur_strength=51) is not first
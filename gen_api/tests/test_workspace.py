@@ -0,0 +1,124 @@
+"""
+Tests for the per-job scratch workspaces.
+"""
+import io
+import os
+import threading
+import contextvars
+import pytest
+from unittest.mock import patch
+from flask import Flask, send_file
+from controllers.jobs_controller import JOB_KINDS
+from helpers.workspace import (
+    Workspace, WorkspaceQuotaExceeded, WorkspaceClosed, current_workspace, job_workspace, request_workspace,
+    scratch_path, scratch_dir, with_workspace, check_workspace_quota,
+)
+
+def test_workspace_is_removed_on_error():
+    with pytest.raises(RuntimeError):
+        with job_workspace() as workspace:
+            path = scratch_path('content_voiceover.wav')
+            open(path, 'w').close()
+            assert os.path.dirname(path) == workspace.directory
+            raise RuntimeError('render failed')
+    assert not os.path.exists(workspace.directory)
+    assert current_workspace() is None
+
+def test_workspace_root(tmp_path):
+    with job_workspace() as workspace:
+        assert os.path.dirname(workspace.directory) == str(tmp_path / 'workspaces')
+        assert os.path.dirname(scratch_dir()) == workspace.directory
+
+def test_nested_calls_share_the_workspace():
+    @with_workspace
+    def render():
+        return current_workspace()
+
+    with job_workspace() as workspace:
+        assert render() is workspace
+    # Called on its own, the function gets a workspace of its own
+    own = render()
+    assert own is not workspace and not os.path.exists(own.directory)
+
+def test_concurrent_jobs_get_separate_paths():
+    paths = {}
+    barrier = threading.Barrier(4)
+
+    def job(index):
+        with job_workspace():
+            barrier.wait()
+            paths[index] = scratch_path('intro_voice_over.wav')
+
+    threads = [threading.Thread(target=job, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(paths.values())) == 4
+
+def test_quota(tmp_path):
+    workspace = Workspace.create(quota_bytes=1000)
+    try:
+        with open(workspace.path('audio.wav'), 'wb') as f:
+            f.write(b'\0' * 2000)
+        with pytest.raises(WorkspaceQuotaExceeded):
+            workspace.path('video.mp4')
+    finally:
+        workspace.cleanup()
+
+def test_quota_is_checked_after_writes():
+    with job_workspace() as workspace:
+        workspace.quota_bytes = 1000
+        path = scratch_path('chapter.mp4')
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 2000)
+        with pytest.raises(WorkspaceQuotaExceeded):
+            check_workspace_quota()
+
+def test_removed_workspace_hands_out_no_paths():
+    with job_workspace() as workspace:
+        context = contextvars.copy_context()
+    with pytest.raises(WorkspaceClosed):
+        context.run(scratch_path, 'late.wav')
+    assert not os.path.exists(workspace.directory)
+
+def test_request_workspace_is_streamed_back(tmp_path):
+    """Files of the workspace can still be sent once it has been removed."""
+    app = Flask(__name__)
+
+    @app.route('/render')
+    @request_workspace
+    def render():
+        path = scratch_path('output_video.mp4')
+        with open(path, 'wb') as f:
+            f.write(b'video')
+        return send_file(path)
+
+    response = app.test_client().get('/render')
+    assert os.listdir(tmp_path / 'workspaces') == []
+    assert response.data == b'video'
+    assert os.listdir(tmp_path / 'workspaces') == []
+
+def test_jobs_run_in_their_own_workspace(client, tmp_path, wait_for_job):
+    scratch = []
+
+    def fake_chapter(request):
+        path = scratch_path('content_voiceover.wav')
+        scratch.append(path)
+        with open(path, 'wb') as f:
+            f.write(b'voice')
+        with open(request.form['filename'], 'wb') as f:
+            f.write(b'video')
+        return request.form['filename'], None
+
+    with patch.dict(JOB_KINDS, {'chapter': (fake_chapter, 'video/mp4', 'chapter', 'output_video.mp4')}):
+        job_ids = [client.post('/jobs/chapter', data={
+            'chapter': 'Chapter 1',
+            'background_image': (io.BytesIO(b'image-bytes'), 'background.png', 'image/png'),
+        }, content_type='multipart/form-data').get_json()['id'] for _ in range(2)]
+        for job_id in job_ids:
+            assert wait_for_job(client, job_id)['status'] == 'succeeded'
+            assert client.get(f'/jobs/{job_id}/result').data == b'video'
+
+    assert len(set(scratch)) == 2
+    assert not any(os.path.exists(path) for path in scratch)